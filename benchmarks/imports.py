@@ -0,0 +1,62 @@
+"""
+Import time microbenchmark of the modules every ``akamai cps`` run loads.
+
+Each module is imported in a fresh interpreter with ``-X importtime`` and the
+cumulative import time of the module (its own code plus everything it pulls
+in) is reported as the median over ``--runs`` processes.
+
+    python benchmarks/imports.py --runs 20
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BIN = os.path.join(REPO, 'bin')
+
+MODULES = ['utils.emojis', 'utils.cli_logging', 'utils.parser']
+
+
+def import_time_us(module: str) -> int:
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            env=dict(os.environ, PYTHONPATH=BIN), capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1])
+    raise RuntimeError(f'{module} was not imported:\n{result.stderr}')
+
+
+def run(runs: int, modules: list) -> dict:
+    results = {'benchmark': 'imports', 'runs': runs, 'python': sys.version.split()[0], 'metrics': {}}
+    for module in modules:
+        samples = [import_time_us(module) / 1000 for _ in range(runs)]
+        results['metrics'][module] = {'median_ms': round(statistics.median(samples), 2),
+                                      'min_ms': round(min(samples), 2),
+                                      'max_ms': round(max(samples), 2)}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure import time of the CLI modules')
+    parser.add_argument('--runs', type=int, default=10, help='processes started per module')
+    parser.add_argument('--output', help='also write the results as json to this file')
+    parser.add_argument('modules', nargs='*', default=MODULES, help='modules to import')
+    args = parser.parse_args(argv)
+
+    results = run(args.runs, args.modules)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
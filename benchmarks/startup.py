@@ -0,0 +1,136 @@
+"""
+Startup benchmark of the ``akamai cps`` entry point.
+
+Measures, in fresh interpreter processes:
+
+* ``help``: wall time of ``akamai-cps.py --help``
+* ``first_request``: wall time from process spawn until the first API request
+  of ``akamai-cps.py list`` is handed to the HTTP transport
+
+The transport is replaced inside the measured process so no request leaves the
+machine, the run stops at the first request. Medians are compared against
+``STARTUP_BUDGET_MS``, ``--check`` exits non-zero when a budget is exceeded.
+
+    python benchmarks/startup.py --runs 20 --check
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BIN = os.path.join(REPO, 'bin')
+ENTRY_POINT = os.path.join(BIN, 'akamai-cps.py')
+
+# Budgets in milliseconds for the median of each measurement.
+STARTUP_BUDGET_MS = {'help': 500, 'first_request': 500}
+
+EDGERC = '''[default]
+client_secret = benchmark
+host = akab-benchmark.luna.akamaiapis.net
+access_token = akab-access-token
+client_token = akab-client-token
+'''
+
+DRIVER = '''
+import runpy
+import sys
+import time
+
+sys.path.insert(0, {bin!r})
+sys.argv = [{entry_point!r}] + {argv!r}
+
+import requests.adapters
+
+
+class FirstRequest(Exception):
+    pass
+
+
+def send(self, request, **kwargs):
+    print(repr(time.time()), file=sys.__stderr__)
+    raise FirstRequest(request.url)
+
+
+requests.adapters.HTTPAdapter.send = send
+try:
+    runpy.run_path({entry_point!r}, run_name='__main__')
+except FirstRequest:
+    pass
+'''
+
+
+def sandbox() -> tempfile.TemporaryDirectory:
+    """Working directory and home with a throw-away .edgerc, logs and caches"""
+    tmp = tempfile.TemporaryDirectory()
+    with open(os.path.join(tmp.name, '.edgerc'), 'w') as f:
+        f.write(EDGERC)
+    # the logging config is looked up relative to the working directory
+    os.symlink(BIN, os.path.join(tmp.name, 'bin'))
+    return tmp
+
+
+def measure_help(env: dict, cwd: str) -> float:
+    started = time.time()
+    subprocess.run([sys.executable, ENTRY_POINT, '--help'], env=env, cwd=cwd,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return (time.time() - started) * 1000
+
+
+def measure_first_request(env: dict, cwd: str) -> float:
+    driver = DRIVER.format(bin=BIN, entry_point=ENTRY_POINT, argv=['list'])
+    started = time.time()
+    result = subprocess.run([sys.executable, '-c', driver], env=env, cwd=cwd,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    for line in result.stderr.splitlines():
+        try:
+            return (float(line) - started) * 1000
+        except ValueError:
+            continue
+    raise RuntimeError(f'no API request was issued:\n{result.stderr}')
+
+
+def run(runs: int) -> dict:
+    with sandbox() as tmp:
+        env = dict(os.environ, HOME=tmp, AKAMAI_CLI_CACHE_DIR=tmp)
+        samples = {'help': [], 'first_request': []}
+        for _ in range(runs):
+            samples['help'].append(measure_help(env, tmp))
+            samples['first_request'].append(measure_first_request(env, tmp))
+
+    results = {'benchmark': 'startup', 'runs': runs, 'python': sys.version.split()[0], 'metrics': {}}
+    for name, values in samples.items():
+        median = statistics.median(values)
+        results['metrics'][name] = {'median_ms': round(median, 1),
+                                    'min_ms': round(min(values), 1),
+                                    'max_ms': round(max(values), 1),
+                                    'budget_ms': STARTUP_BUDGET_MS[name],
+                                    'within_budget': median <= STARTUP_BUDGET_MS[name]}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure akamai cps startup time')
+    parser.add_argument('--runs', type=int, default=10, help='processes started per measurement')
+    parser.add_argument('--output', help='also write the results as json to this file')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 when a budget is exceeded')
+    args = parser.parse_args(argv)
+
+    results = run(args.runs)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.check and not all(metric['within_budget'] for metric in results['metrics'].values()):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
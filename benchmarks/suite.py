@@ -0,0 +1,252 @@
+"""
+Benchmark suite of the ``akamai cps`` hot paths.
+
+Runs without network against a synthetic account of ``--enrollments``
+enrollments (``tests/cli-cps/fake_server.py``), each measurement is repeated
+``--runs`` times in this process:
+
+* ``setup``: list the contracts and enrollments from the local fake server over
+  https and build the enrollment cache with ``setup``'s ``refresh_contract``
+* ``lookup_by_id`` / ``lookup_by_cn`` / ``lookup_by_san``: one cache look up
+* ``certificate_parse``: parse every production certificate PEM, ``certificate_parse_memoized``
+  does it again with every certificate already decoded
+* ``enrollment_model``: decode every enrollment into an ``Enrollment``, with the
+  memory held per decoded enrollment next to the one of the raw json
+* ``audit_row``: render the audit row of every enrollment
+* ``export_csv`` / ``export_xlsx`` / ``export_json``: write the audit report
+* ``startup`` and ``imports``: ``benchmarks/startup.py`` and ``benchmarks/imports.py``,
+  skipped with ``--skip-startup``
+
+The results are written as json to ``--output``. With ``--baseline`` every
+median is compared against the results of an earlier run, ``--check`` exits
+non-zero when one of them is more than ``--tolerance`` slower.
+
+    python benchmarks/suite.py --enrollments 2000 --output bench.json --baseline last-release.json --check
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[1:1] = [os.path.join(REPO, 'bin'), os.path.join(REPO, 'bin', '_delete'), os.path.join(REPO, 'tests', 'cli-cps')]
+
+import imports  # noqa: E402
+import startup  # noqa: E402
+import utils.certificates as certificates  # noqa: E402
+from akamai_apis import request_memo  # noqa: E402
+from akamai_apis.cps import Cps  # noqa: E402
+from akamai_apis.models import Enrollment  # noqa: E402
+from cpsApiWrapper import certificate  # noqa: E402
+from fake_server import FakeCpsServer  # noqa: E402
+from fake_server import SyntheticAccount  # noqa: E402
+from utils.audit import AUDIT_COLUMNS  # noqa: E402
+from utils.audit import audit_row  # noqa: E402
+from utils.enrollment_cache import contract_ids_of  # noqa: E402
+from utils.enrollment_cache import EnrollmentCache  # noqa: E402
+from utils.enrollment_cache import refresh_contract  # noqa: E402
+from utils.report import CsvReport  # noqa: E402
+from utils.report import XlsxReport  # noqa: E402
+
+LOOKUPS = 1000
+DEFAULT_TOLERANCE = 0.25
+
+
+def package_version() -> str:
+    with open(os.path.join(REPO, 'cli.json')) as f:
+        return json.load(f)['commands'][0]['version']
+
+
+def timed(function, runs: int, per: int = 1) -> list:
+    """Milliseconds of each of ``runs`` calls, divided by ``per`` operations per call"""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - started) * 1000 / per)
+    return samples
+
+
+def stats(samples: list, **extra) -> dict:
+    return {'median_ms': round(statistics.median(samples), 4), 'min_ms': round(min(samples), 4),
+            'max_ms': round(max(samples), 4), **extra}
+
+
+class Fixtures:
+    """Synthetic account served over https, and the responses the commands would read from it"""
+
+    def __init__(self, enrollments: int, contracts: int, tmp: str):
+        self.tmp = tmp
+        self.account = SyntheticAccount(contracts=contracts, enrollments=enrollments)
+        self.server = FakeCpsServer(self.account, tls=True).start()
+        self.enrollments = [self.account.enrollment(enrollment_id) for enrollment_id in self.account.enrollment_ids]
+        self.pems = [deployment['certificate'] for deployment in
+                     (self.account.deployment(enrollment_id, 'production') for enrollment_id in self.account.enrollment_ids)
+                     if deployment is not None]
+        self.expirations = {enrollment_id: self.account.not_valid_after(enrollment_id) for enrollment_id in self.account.enrollment_ids}
+        self.cache = EnrollmentCache(os.path.join(tmp, 'setup'))
+        self.edgerc = os.path.join(tmp, 'edgerc')
+        self.server.write_edgerc(self.edgerc)
+
+    def close(self):
+        self.server.stop()
+
+    def setup(self):
+        """Runs setup's per-contract step: contracts, then one enrollment listing per contract merged into the cache"""
+        cps_object = Cps(logging.getLogger('benchmark'), argparse.Namespace(edgerc=self.edgerc, section='default',
+                                                                            account_switch_key=None, rate_limit=None))
+        # every run lists the account again instead of reading the memo of the previous one
+        cps_object.s.memo = request_memo.reset()
+        contract_ids = contract_ids_of(cps_object.get_contracts().json())
+        with self.cache as enrollment_cache:
+            enrollment_cache.clear()
+            enrollment_cache.retain_contracts(contract_ids)
+            for contract_id in contract_ids:
+                refresh_contract(enrollment_cache, cps_object.list_enrollments, contract_id)
+
+    def lookups(self, find, keys: list):
+        with self.cache as enrollment_cache:
+            for key in keys:
+                find(enrollment_cache, key)
+
+    def certificates(self, memoized: bool = False):
+        if not memoized:
+            certificates.default_decoder().clear()
+        for pem in self.pems:
+            certificate(pem).expiration_date
+
+    def models(self) -> list:
+        return [Enrollment.from_json(enrollment, self.account.contract_of(enrollment['id'])) for enrollment in self.enrollments]
+
+    def memory_per_enrollment(self, decode) -> int:
+        """Bytes still held per enrollment after ``decode`` turned every response body into a record"""
+        bodies = [json.dumps(enrollment) for enrollment in self.enrollments]
+        tracemalloc.start()
+        try:
+            held = [decode(body) for body in bodies]
+            size = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        del held
+        return size // len(bodies)
+
+    def audit_rows(self) -> list:
+        return [audit_row(enrollment, self.account.contract_of(enrollment['id']), enrollment['id'],
+                          self.expirations[enrollment['id']]) for enrollment in self.enrollments]
+
+    def export_csv(self, rows: list):
+        with CsvReport(os.path.join(self.tmp, 'audit.csv'), AUDIT_COLUMNS) as report:
+            for row in rows:
+                report.write(row)
+
+    def export_xlsx(self, rows: list):
+        with XlsxReport(os.path.join(self.tmp, 'audit.xlsx'), AUDIT_COLUMNS) as report:
+            for row in rows:
+                report.write(row)
+
+    def export_json(self):
+        with open(os.path.join(self.tmp, 'audit.json'), 'w') as f:
+            f.write(json.dumps([dict(enrollment, contractId=self.account.contract_of(enrollment['id']))
+                                for enrollment in self.enrollments], indent=4))
+
+
+def run(runs: int, enrollments: int, contracts: int, skip_startup: bool = False) -> dict:
+    results = {'benchmark': 'suite', 'version': package_version(), 'runs': runs, 'enrollments': enrollments,
+               'contracts': contracts, 'python': sys.version.split()[0],
+               'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'), 'metrics': {}}
+    metrics = results['metrics']
+    ca_bundle = os.environ.get('REQUESTS_CA_BUNDLE')
+    with tempfile.TemporaryDirectory() as tmp:
+        fixtures = Fixtures(enrollments, contracts, tmp)
+        # requests prefers the environment over session.verify
+        os.environ['REQUESTS_CA_BUNDLE'] = fixtures.server.ca_file
+        try:
+            metrics['setup'] = stats(timed(fixtures.setup, runs), per='run')
+
+            ids = [fixtures.account.enrollment_ids[i * len(fixtures.enrollments) // LOOKUPS] for i in range(LOOKUPS)]
+            cns = [fixtures.account.enrollment(enrollment_id)['csr']['cn'] for enrollment_id in ids]
+            sans = [fixtures.account.enrollment(enrollment_id)['csr']['sans'][-1] for enrollment_id in ids]
+            for name, find, keys in [('lookup_by_id', EnrollmentCache.find_by_id, ids),
+                                     ('lookup_by_cn', EnrollmentCache.find_by_hostname, cns),
+                                     ('lookup_by_san', EnrollmentCache.find_by_hostname, sans)]:
+                metrics[name] = stats(timed(lambda: fixtures.lookups(find, keys), runs, LOOKUPS), per='lookup')
+
+            per = f'{len(fixtures.pems)} certificates'
+            metrics['certificate_parse'] = stats(timed(fixtures.certificates, runs), per=per)
+            metrics['certificate_parse_memoized'] = stats(timed(lambda: fixtures.certificates(memoized=True), runs), per=per)
+            metrics['enrollment_model'] = stats(
+                timed(fixtures.models, runs), per=f'{enrollments} enrollments',
+                bytes_per_enrollment=fixtures.memory_per_enrollment(lambda body: Enrollment.from_json(json.loads(body))),
+                json_bytes_per_enrollment=fixtures.memory_per_enrollment(json.loads))
+            metrics['audit_row'] = stats(timed(fixtures.audit_rows, runs), per=f'{enrollments} rows')
+            rows = fixtures.audit_rows()
+            metrics['export_csv'] = stats(timed(lambda: fixtures.export_csv(rows), runs), per=f'{enrollments} rows')
+            metrics['export_xlsx'] = stats(timed(lambda: fixtures.export_xlsx(rows), runs), per=f'{enrollments} rows')
+            metrics['export_json'] = stats(timed(fixtures.export_json, runs), per=f'{enrollments} enrollments')
+        finally:
+            fixtures.close()
+            if ca_bundle is None:
+                os.environ.pop('REQUESTS_CA_BUNDLE', None)
+            else:
+                os.environ['REQUESTS_CA_BUNDLE'] = ca_bundle
+
+    if not skip_startup:
+        for name, metric in startup.run(runs)['metrics'].items():
+            metrics[f'startup_{name}'] = metric
+        for module, metric in imports.run(runs, imports.MODULES)['metrics'].items():
+            metrics[f'import_{module}'] = metric
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Metrics whose median is more than ``tolerance`` slower than in the baseline"""
+    regressions = []
+    for name, metric in results['metrics'].items():
+        previous = baseline.get('metrics', {}).get(name)
+        if not previous or not previous.get('median_ms'):
+            continue
+        ratio = metric['median_ms'] / previous['median_ms']
+        metric['baseline_median_ms'] = previous['median_ms']
+        metric['change'] = round(ratio - 1, 3)
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the hot paths of the CLI against synthetic fixtures')
+    parser.add_argument('--runs', type=int, default=5, help='repetitions per measurement')
+    parser.add_argument('--enrollments', type=int, default=1000, help='size of the synthetic account')
+    parser.add_argument('--contracts', type=int, default=4)
+    parser.add_argument('--skip-startup', action='store_true', help='skip the process based startup and import benchmarks')
+    parser.add_argument('--output', help='also write the results as json to this file')
+    parser.add_argument('--baseline', help='results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='allowed slowdown, 0.25 is 25%%')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 when a metric regressed')
+    args = parser.parse_args(argv)
+
+    results = run(args.runs, args.enrollments, args.contracts, args.skip_startup)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results['regressions'] = regressions
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.check and (regressions or not all(metric.get('within_budget', True) for metric in results['metrics'].values())):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
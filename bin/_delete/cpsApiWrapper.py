@@ -14,8 +14,8 @@ from __future__ import annotations
 import datetime
 import json
 
-from cryptography import x509
-from cryptography.hazmat.backends import default_backend
+from akamai_apis.response_cache import NO_CACHE
+from utils.certificates import decode
 
 class cps:
     def __init__(self, access_hostname, account_switch_key):
@@ -118,7 +118,7 @@ class cps:
             update_enrollment_url, data=data, headers=headers)
         return update_enrollment_response
 
-    def list_enrollments(self, session, contractId='optional'):
+    def list_enrollments(self, session, contractId='optional', extra_headers=None):
         """
         Function to List Enrollments
 
@@ -126,6 +126,8 @@ class cps:
         -----------
         session : <string>
             An EdgeGrid Auth akamai session object
+        extra_headers : <dict>
+            Optional additional request headers, e.g. If-None-Match for conditional requests
 
         Returns
         -------
@@ -149,11 +151,14 @@ class cps:
             account_key_url = self.account_switch_key.translate(self.account_switch_key.maketrans('&','?'))
             list_enrollments_url = list_enrollments_url + account_key_url
 
+        if extra_headers:
+            headers.update(extra_headers)
+
         list_enrollments_response = session.get(
             list_enrollments_url, headers=headers)
         return list_enrollments_response
 
-    def get_enrollment(self, session, enrollmentId):
+    def get_enrollment(self, session, enrollmentId, fresh=False):
         """
         Function to Get an Enrollment
 
@@ -161,6 +166,8 @@ class cps:
         -----------
         session : <string>
             An EdgeGrid Auth akamai session object
+        fresh : <bool>
+            Read the live enrollment, bypassing the request memo and the response cache
 
         Returns
         -------
@@ -180,6 +187,9 @@ class cps:
             account_key_url = self.account_switch_key.translate(self.account_switch_key.maketrans('&','?'))
             get_enrollment_url = get_enrollment_url + account_key_url
 
+        if fresh:
+            headers.update(NO_CACHE)
+
         get_enrollment_response = session.get(get_enrollment_url, headers=headers)
         return get_enrollment_response
 
@@ -308,7 +318,7 @@ class cps:
             delete_enrollment_url, headers=headers)
         return delete_enrollment_response
 
-    def get_certificate(self, session, enrollmentId, network='production'):
+    def get_certificate(self, session, enrollmentId, network='production', fresh=False):
         """
         Function to Get a Certificate
 
@@ -316,6 +326,8 @@ class cps:
         -----------
         session : <string>
             An EdgeGrid Auth akamai session object
+        fresh : <bool>
+            Read the live deployment, bypassing the request memo and the response cache
 
         Returns
         -------
@@ -336,6 +348,9 @@ class cps:
             account_key_url = self.account_switch_key.translate(self.account_switch_key.maketrans('&','?'))
             get_certificate_url = get_certificate_url + account_key_url
 
+        if fresh:
+            headers.update(NO_CACHE)
+
         get_certificate_response = session.get(get_certificate_url, headers=headers)
         return get_certificate_response
 
@@ -426,27 +441,18 @@ class cps:
         return custom_response
 
 # Below class encapsulates the certificate members, this is done to
-# decode a certificate into its members or fields
+# decode a certificate into its members or fields. Decoding is memoized by utils.certificates
 class certificate:
     def __init__(self, certificate):
-        self.cert = x509.load_pem_x509_certificate(certificate.encode(), default_backend())
-
-        self.oids = x509.oid.ExtensionOID()
-        try:
-            self.ext = self.cert.extensions.get_extension_for_oid(self.oids.SUBJECT_ALTERNATIVE_NAME)
-            self.sanList = []
-            self.sanList = str(self.ext.value.get_values_for_type(x509.DNSName)).replace(',',
-                      '').replace('[', '').replace(']', '')
-        except Exception:
-            #Not every certificate will have SAN
-            pass
-
-        self.expiration = str(self.cert.not_valid_after.date()) + ' ' + str(self.cert.not_valid_after.time()) + ' UTC'
-
-        for attribute in self.cert.subject:
-            self.subject = attribute.value
-
-        self.not_valid_before = str(self.cert.not_valid_before.date()) + ' ' + str(self.cert.not_valid_before.time()) + ' UTC'
-
-        for attribute in self.cert.issuer:
-            self.issuer = attribute.value
+        decoded = decode(certificate)
+        self.cert = decoded.cert
+
+        #Not every certificate will have SAN
+        if decoded.sans is not None:
+            self.sanList = ' '.join(f"'{san}'" for san in decoded.sans)
+
+        self.expiration = f'{decoded.not_valid_after:%Y-%m-%d %H:%M:%S} UTC'
+        self.expiration_date = decoded.not_valid_after
+        self.subject = decoded.subject
+        self.not_valid_before = f'{decoded.not_valid_before:%Y-%m-%d %H:%M:%S} UTC'
+        self.issuer = decoded.issuer
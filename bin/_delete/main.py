@@ -19,33 +19,72 @@ Initiators: vbhat@akamai.com, aetsai@akamai.com, mkilmer@akamai.com
 from __future__ import annotations
 
 import argparse
+import atexit
 import configparser
 import csv
 import datetime
+import functools
 import json
 import logging
 import os
 import sys
 from urllib.parse import urlparse
 
-import requests
+import utils.certificates as certificates
 import utils.cli_logging as log
 import utils.emojis as emoji
 import utils.utility as utils
 import yaml
-from akamai.edgegrid import EdgeGridAuth
 from akamai.edgegrid import EdgeRc
+from akamai_apis import instrumentation
+from akamai_apis import request_memo
+from akamai_apis import response_cache
 from akamai_apis.auth import AkamaiSession
+from akamai_apis.auth import shared_session
+from akamai_apis.defaults import DEFAULT_POOL_SIZE
+from akamai_apis.defaults import DEFAULT_RATE_LIMIT
 from akamai_apis.idm import IdentityAccessManagement
+from akamai_apis.models import Deployment
 from cpsApiWrapper import certificate
 from cpsApiWrapper import cps
 from headers import headers
 from prettytable import PrettyTable
+from rich.console import Console
+from rich.live import Live
+from rich.progress import Progress
+from rich.table import Table
+from utils.audit import AUDIT_CHANGE_COLUMNS
+from utils.audit import AUDIT_COLUMNS
+from utils.audit import audit_row
+from utils.checkpoint import CheckpointJournal
+from utils.enrollment_cache import contract_ids_of
+from utils.enrollment_cache import EnrollmentCache
+from utils.enrollment_cache import refresh_contract
+from utils.expirations import bucket
+from utils.expirations import DEFAULT_WINDOW
+from utils.expirations import DeploymentIndex
+from utils.expirations import parse_window
+from utils.expirations import utcnow
+from utils.fanout import DEFAULT_CONCURRENCY
+from utils.fanout import FanOut
 from utils.parser import AkamaiParser as parser
-from xlsxwriter.workbook import Workbook
+from utils.report import CsvReport
+from utils.report import NdjsonReport
+from utils.report import STDOUT
+from utils.report import XlsxReport
+from utils.snapshot import Snapshot
+from utils.snapshot import SnapshotError
+from utils.snapshot import SnapshotWriter
+from utils.status_dashboard import pending_change_id
+from utils.status_dashboard import read_enrollment_ids
+from utils.status_dashboard import StatusDashboard
+from utils.status_dashboard import summarize
+from utils.watch import ChangeWatcher
+from utils.watch import WATCH_COMPLETE
 
 
 logger = log.setup_logger()
+console = Console(stderr=True)
 
 
 
@@ -54,7 +93,7 @@ PACKAGE_VERSION = '2.0.0'
 
 
 
-def init_config(edgerc_file, section):
+def init_config(edgerc_file, section, pool_maxsize=DEFAULT_POOL_SIZE, rate_limit=DEFAULT_RATE_LIMIT):
     if not edgerc_file:
         if not os.getenv('AKAMAI_EDGERC'):
             edgerc_file = os.path.join(os.path.expanduser('~'), '.edgerc')
@@ -75,8 +114,8 @@ def init_config(edgerc_file, section):
         edgerc = EdgeRc(edgerc_file)
         base_url = edgerc.get(section, 'host')
 
-        session = requests.Session()
-        session.auth = EdgeGridAuth.from_edgerc(edgerc, section)
+        # Keep-alive session shared by every command and worker thread for this section, --rate-limit caps its request rate
+        session = shared_session(edgerc_file, section, pool_maxsize, rate_limit)
 
         return base_url, session
     except configparser.NoSectionError:
@@ -120,11 +159,16 @@ def cli():
     actions['setup'] = create_sub_command(
         subparsers,
         'setup',
-        'Initial setup to download all necessary enrollment info ')
+        'Initial setup to download all necessary enrollment info ',
+        [{'name': 'incremental', 'help': 'Refresh only the contracts that changed since the last setup'},
+         {'name': 'contract-max-age', 'help': 'With --incremental, skip the contracts listed less than this many seconds ago',
+          'type': int}])
 
     actions['list'] = create_sub_command(
         subparsers, 'list', 'List all enrollments',
-        [{'name': 'show-expiration', 'help': 'shows expiration date of the enrollment'}],
+        [{'name': 'show-expiration', 'help': 'shows expiration date of the enrollment'},
+         {'name': 'concurrency', 'help': 'Number of certificates fetched in parallel', 'type': int,
+          'default': DEFAULT_CONCURRENCY}],
         None)
 
     actions['retrieve-enrollment'] = create_sub_command(
@@ -154,7 +198,13 @@ def cli():
         subparsers, 'status', 'Get any current change status for an enrollment',
         [{'name': 'enrollment-id', 'help': 'enrollment-id of the enrollment'},
          {'name': 'cn', 'help': 'Common Name of certificate'},
-         {'name': 'validation-type', 'help': 'Use http or dns'}],
+         {'name': 'validation-type', 'help': 'Use http or dns'},
+         {'name': 'all-pending', 'help': 'Show the change status of every enrollment with a pending change'},
+         {'name': 'enrollment-ids', 'help': 'File listing the enrollment-ids to show the change status of'},
+         {'name': 'concurrency', 'help': 'Number of change statuses fetched in parallel', 'type': int,
+          'default': DEFAULT_CONCURRENCY},
+         {'name': 'watch', 'help': 'Keep polling the change status until the change completes, fails, is cancelled or needs input'},
+         {'name': 'watch-timeout', 'help': 'Stop watching after this many seconds', 'type': int}],
          None)
 
     actions['create'] = create_sub_command(
@@ -192,11 +242,15 @@ def cli():
 
     actions['audit'] = create_sub_command(
         subparsers, 'audit', 'Generate a report in csv format by default. Can also use --json/xlsx',
-        [{'name': 'output-file', 'help': 'Name of the outputfile to be saved to'},
+        [{'name': 'output-file', 'help': 'Name of the outputfile to be saved to, - streams csv to stdout'},
          {'name': 'json', 'help': 'Output format is json'},
          {'name': 'xlsx', 'help': 'Output format is xlsx'},
          {'name': 'csv', 'help': 'Output format is csv'},
-         {'name': 'include-change-details', 'help': 'Add additional details of pending certificates'}])
+         {'name': 'ndjson', 'help': 'Output format is ndjson, one object per enrollment. An existing file is resumed'},
+         {'name': 'include-change-details', 'help': 'Add additional details of pending certificates'},
+         {'name': 'resume', 'help': 'Continue an interrupted audit from its checkpoint journal'},
+         {'name': 'concurrency', 'help': 'Number of enrollments fetched in parallel', 'type': int,
+          'default': DEFAULT_CONCURRENCY}])
 
     actions['proceed'] = create_sub_command(
         subparsers, 'proceed', 'Proceed to deploy certificate',
@@ -210,12 +264,40 @@ def cli():
 
     actions['sbd-audit'] = create_sub_command(
         subparsers, 'sbd-audit', 'list all sbd enabled certificates for an account',
-       [{'name': 'output-file', 'help': 'Name of the outputfile to be saved to'},
+       [{'name': 'output-file', 'help': 'Name of the outputfile to be saved to, - streams csv to stdout'},
          {'name': 'json', 'help': 'Output format is json'},
          {'name': 'xlsx', 'help': 'Output format is xlsx'},
          {'name': 'csv', 'help': 'Output format is csv'},
          {'name': 'include-change-details', 'help': 'Add additional details of pending certificates'}])
 
+    actions['snapshot'] = create_sub_command(
+        subparsers, 'snapshot', 'Store every enrollment and production deployment in a local snapshot for query',
+        [{'name': 'snapshot-file', 'help': 'Snapshot to write, defaults to snapshot/snapshot.db in the cache directory'},
+         {'name': 'concurrency', 'help': 'Number of enrollments fetched in parallel', 'type': int,
+          'default': DEFAULT_CONCURRENCY}])
+
+    actions['query'] = create_sub_command(
+        subparsers, 'query', 'Filter, sort and aggregate the local snapshot without calling the API',
+        [{'name': 'snapshot-file', 'help': 'Snapshot to read, defaults to snapshot/snapshot.db in the cache directory'},
+         {'name': 'columns', 'help': 'Comma separated columns to show'},
+         {'name': 'where', 'help': "SQL condition, e.g. \"days_left < 30 AND validation = 'dv'\""},
+         {'name': 'sort', 'help': 'Comma separated columns to sort by, append :desc for descending order'},
+         {'name': 'group-by', 'help': 'Comma separated columns to count enrollments by'},
+         {'name': 'limit', 'help': 'Show at most this many rows', 'type': int},
+         {'name': 'sql', 'help': 'Run a read-only SQL statement on the snapshot instead'},
+         {'name': 'show-columns', 'help': 'List the columns of the snapshot'},
+         {'name': 'json', 'help': 'Output format is json'},
+         {'name': 'csv', 'help': 'Output format is csv'}])
+
+    actions['expiring'] = create_sub_command(
+        subparsers, 'expiring', 'List production certificates expiring soon, by week and contract',
+        [{'name': 'within', 'help': 'Window to look ahead, e.g. 30d, 4w or 12h (default: ' + DEFAULT_WINDOW + ')',
+          'default': DEFAULT_WINDOW},
+         {'name': 'refresh', 'help': 'Fetch every production certificate again instead of the cached expirations'},
+         {'name': 'json', 'help': 'Output format is json'},
+         {'name': 'concurrency', 'help': 'Number of certificates fetched in parallel', 'type': int,
+          'default': DEFAULT_CONCURRENCY}])
+
     args = parser.parse_args()
 
     if len(sys.argv) <= 1:
@@ -231,9 +313,12 @@ def cli():
             parser.print_help()
         return 0
 
-    if args.command not in ['setup', 'sbd-audit']:
+    if args.command not in ['setup', 'sbd-audit', 'query']:
         confirm_setup(args)
 
+    configure_cache(args)
+    configure_profiler(args)
+
     # Override log level if user wants to run in debug mode
     # Set Log Level to DEBUG, INFO, WARNING, ERROR, CRITICAL
     if args.debug:
@@ -266,7 +351,9 @@ def create_sub_command(
             del arg['name']
             if name == 'force' or name == 'force-renewal' or name == 'show-expiration' or name == 'json' \
             or name == 'yaml' or name == 'yml' or name == 'leaf' or name == 'csv' or name == 'xlsx' \
-            or name == 'chain' or name == 'info' or name == 'allow-duplicate-cn' or name == 'include-change-details':
+            or name == 'chain' or name == 'info' or name == 'allow-duplicate-cn' or name == 'include-change-details' \
+            or name == 'incremental' or name == 'ndjson' or name == 'resume' or name == 'all-pending' \
+            or name == 'watch' or name == 'show-columns' or name == 'refresh':
                 optional.add_argument(
                     '--' + name,
                     required=False,
@@ -294,6 +381,31 @@ def create_sub_command(
         help='DEBUG mode to generate additional logs for troubleshooting',
         action='store_true')
 
+    optional.add_argument(
+        '--rate-limit',
+        help='Maximum API requests per second, 0 disables throttling (default: ' + str(DEFAULT_RATE_LIMIT) + ')',
+        type=float,
+        default=DEFAULT_RATE_LIMIT)
+
+    optional.add_argument(
+        '--no-cache',
+        help='Do not read or write the local API response cache',
+        action='store_true')
+
+    optional.add_argument(
+        '--max-age',
+        help='Reuse cached API responses younger than this many seconds',
+        type=int)
+
+    optional.add_argument(
+        '--profile',
+        help='Print API call counts, retries and p50/p95/p99 latency per endpoint at exit',
+        action='store_true')
+
+    optional.add_argument(
+        '--profile-output',
+        help='Write the raw request samples of --profile to this JSON file')
+
     optional.add_argument(
         '--account-key',
         '--accountkey',
@@ -303,10 +415,68 @@ def create_sub_command(
     return action
 
 
+def configure_cache(args):
+    """
+    Configure the local response cache used for read-only CPS API calls
+
+    Parameters
+    -----------
+    args : <string>
+        Default args parameter, honours --no-cache and --max-age
+    Returns
+    -------
+    None
+    """
+    response_cache.configure(os.path.join(get_cache_dir(), 'cache'),
+                             enabled=not args.no_cache, max_age=args.max_age)
+
+
+def configure_profiler(args):
+    """
+    Record every API request of the command when --profile or --profile-output is given, the summary
+    is printed (and the samples written) when the command exits
+
+    Parameters
+    -----------
+    args : <string>
+        Default args parameter, honours --profile and --profile-output
+    Returns
+    -------
+    None
+    """
+    profile_output = getattr(args, 'profile_output', None)
+    if getattr(args, 'profile', False) or profile_output:
+        instrumentation.configure()
+        atexit.register(report_profile, args.command, profile_output)
+
+
+def report_profile(command, profile_output=None):
+    """
+    Print the per endpoint API call summary to stderr, and write the raw samples when asked to
+
+    Parameters
+    -----------
+    command : <string>
+        Name of the command that ran
+    profile_output : <string>
+        JSON file for the raw request samples, optional
+    Returns
+    -------
+    None
+    """
+    profiler = instrumentation.current()
+    if profiler is None:
+        return
+    print('\nAPI profile of ' + str(command) + ':\n' + profiler.format_summary(), file=sys.stderr)
+    if profile_output:
+        profiler.dump(profile_output, command)
+        print('Request samples written to ' + profile_output, file=sys.stderr)
+
+
 def check_enrollment_id(args):
     """
     Utility function that returns a sample enrollment object for later processing
-    It refreshes the local cache file if enrollment not found the first time and retries the check.
+    It incrementally refreshes the local cache file if enrollment not found the first time and retries the check.
 
     Parameters
     -----------
@@ -320,7 +490,8 @@ def check_enrollment_id(args):
 
     enrollmentResult = check_enrollment_id_in_cache(args)
     if enrollmentResult['found'] is False:
-        setup(args, invoker='check_enrollment_id')
+        # Only re-list the contracts that changed instead of re-scanning the whole account
+        setup(args, invoker='check_enrollment_id', incremental=True)
         enrollmentResult = check_enrollment_id_in_cache(args)
 
     return enrollmentResult
@@ -328,7 +499,8 @@ def check_enrollment_id(args):
 
 def check_enrollment_id_in_cache(args):
     """
-    Utility function that returns a sample enrollment object for later processing
+    Utility function that returns a sample enrollment object for later processing. Looks the enrollment up in
+    the indexed local cache by enrollment-id, or by common name (CN) or any SAN hostname.
 
     Parameters
     -----------
@@ -339,62 +511,48 @@ def check_enrollment_id_in_cache(args):
     -------
     enrollmentResult : local object that stores if enrollment was found and enrollmentId
     """
-    enrollments_json_content = []
-    enrollmentsPath = os.path.join('setup')
-    for root, dirs, files in os.walk(enrollmentsPath):
-        local_enrollments_file = 'enrollments.json'
-        if local_enrollments_file in files:
-            with open(os.path.join(enrollmentsPath, local_enrollments_file)) as enrollmentsFileHandler:
-                enrollments_string_content = enrollmentsFileHandler.read()
-            enrollments_json_content = json.loads(enrollments_string_content)
-        else:
-            root_logger.info(
-                'Unable to find enrollments.json file. Please run \'setup\'')
-            exit(-1)
-
     # initialize a dummy object for return
     enrollmentResult = {}
     enrollmentResult['found'] = False
     enrollmentResult['enrollmentId'] = 0000
-    # enrollment-id argument was NOT passed and trying to find enrollment-id by cn (common name)
-    if not args.enrollment_id:
-        # Check if duplicate CNs exists
-        enrollmentCount = 0
-        for every_enrollment_info in enrollments_json_content:
-            if every_enrollment_info['cn'] == args.cn or 'sans' in every_enrollment_info and args.cn in every_enrollment_info['sans']:
-                enrollmentCount += 1
-            else:
-                pass
-        # Error out if multiple CNs are present
-        if enrollmentCount > 1:
-            print('')
-            root_logger.info(
-                'More than 1 enrollment found for same CN. Please use --enrollment-id as input')
-            exit(0)
+
+    # A missing cache is treated as a cache miss, so the caller can refresh it
+    enrollment_cache = EnrollmentCache(os.path.join(get_cache_dir(), 'setup'))
+    if not enrollment_cache.exists():
+        return enrollmentResult
+
+    with enrollment_cache:
+        # enrollment-id argument was NOT passed and trying to find enrollment-id by cn (common name) or SAN
+        if not args.enrollment_id:
+            matching_enrollments = enrollment_cache.find_by_hostname(args.cn)
+            # Error out if multiple CNs are present
+            if len(matching_enrollments) > 1:
+                print('')
+                root_logger.info(
+                    'More than 1 enrollment found for same CN. Please use --enrollment-id as input')
+                exit(0)
+            elif len(matching_enrollments) == 1:
+                enrollmentResult['enrollmentId'] = matching_enrollments[0]['enrollmentId']
+                enrollmentResult['cn'] = matching_enrollments[0]['cn']
+                enrollmentResult['found'] = True
+        # check by enrollment-id argument
         else:
-            for every_enrollment_info in enrollments_json_content:
-                if every_enrollment_info['cn'] == args.cn or 'sans' in every_enrollment_info and args.cn in every_enrollment_info['sans']:
-                    enrollmentResult['enrollmentId'] = every_enrollment_info['enrollmentId']
-                    enrollmentResult['cn'] = every_enrollment_info['cn']
-                    enrollmentResult['found'] = True
-                    break
-    # check by enrollment-id argument
-    else:
-        for every_enrollment_info in enrollments_json_content:
-            if str(every_enrollment_info['enrollmentId']) == str(args.enrollment_id):
+            every_enrollment_info = enrollment_cache.find_by_id(args.enrollment_id)
+            if every_enrollment_info is not None:
                 # enrollment-id is passed as argument
                 enrollmentResult['enrollmentId'] = args.enrollment_id
                 enrollmentResult['cn'] = every_enrollment_info['cn']
                 enrollmentResult['found'] = True
-                break
 
     return enrollmentResult
 
 
-def setup(args, invoker='default'):
+def setup(args, invoker='default', incremental=None):
     """
-    Should be run one-time initially in order to create a local enrollment.json file that can serve as local cache for
-    enrollment-id and common name (CN) look ups
+    Should be run one-time initially in order to create a local enrollments.db file that can serve as indexed local
+    cache for enrollment-id, common name (CN) and SAN look ups. In incremental mode the existing cache is kept, contracts are
+    revalidated with their stored ETag/Last-Modified values and only the contracts that changed are re-listed and
+    merged into the cache.
 
     Parameters
     -----------
@@ -402,6 +560,8 @@ def setup(args, invoker='default'):
         Default args parameter (usually no argument specified)
     invoker: <string>
         Description if called from another method
+    incremental: <bool>
+        Refresh the existing cache instead of rebuilding it (defaults to --incremental)
 
     Returns
     -------
@@ -409,19 +569,18 @@ def setup(args, invoker='default'):
     """
 
     # Create the wrapper object to make calls
-    base_url, session = init_config(args.edgerc, args.section)
+    base_url, session = init_config(args.edgerc, args.section, rate_limit=args.rate_limit)
     cps_object = cps(base_url,args.account_key)
-    enrollmentOutput = []
-    contracts_path = os.path.join('setup')
-    contracts_file_present = False
     contracts_json_content = []
-    enrollmentsPath = os.path.join('setup')
+    enrollmentsPath = os.path.join(get_cache_dir(), 'setup')
+    if incremental is None:
+        incremental = getattr(args, 'incremental', False)
+    max_age = getattr(args, 'contract_max_age', None) if incremental else None
 
-    # Delete the enrollments.json file before we start
-    if os.path.exists(os.path.join(enrollmentsPath,'enrollments.json')):
-        os.remove(os.path.join(enrollmentsPath,'enrollments.json'))
-    if not os.path.exists(enrollmentsPath):
-        os.makedirs(enrollmentsPath)
+    # Start from the existing cache when refreshing incrementally, otherwise rebuild it from scratch
+    enrollment_cache = EnrollmentCache(enrollmentsPath).open()
+    if not incremental:
+        enrollment_cache.clear()
 
     # invoker == default is first time user runs setup vs. running setup after another action had been completed
     if invoker == 'default':
@@ -431,56 +590,46 @@ def setup(args, invoker='default'):
     contractIds = cps_object.get_contracts(session)
 
     if contractIds.status_code == 200:
-        contracts = contractIds.json()
-        for contractId in contracts:
-            if contractId.startswith('ctr_'):
-                contractId = contractId.split('_')[1]
-            contracts_json_content.append(contractId)
+        contracts_json_content = contract_ids_of(contractIds.json())
     else:
         root_logger.info('Invalid API Response (' + str(contractIds.status_code) + '): Unable to fetch contracts')
         root_logger.info(json.dumps(contractIds.json(), indent=4))
         exit(-1)
 
+    # Contracts removed from the account are dropped from the cache
+    enrollment_cache.retain_contracts(contracts_json_content)
+
     # Looping through each contract to get enrollments for each contract
     for contractId in contracts_json_content:
+        if enrollment_cache.is_fresh(contractId, max_age):
+            root_logger.debug('Skipping recently refreshed contract: ' + contractId)
+            continue
         if invoker == 'default':
             print('')
             root_logger.info(
                 'Processing Enrollments for contract: ' + contractId)
-        enrollments_response = cps_object.list_enrollments(
-            session, contractId)
-        if enrollments_response.status_code == 200:
-            enrollments_json = enrollments_response.json()
-            totalEnrollments = len(enrollments_json['enrollments'])
+        enrollments_response = refresh_contract(enrollment_cache, functools.partial(cps_object.list_enrollments, session), contractId, incremental)
+        if enrollments_response.status_code == 304:
+            # Nothing changed since the last fetch, the cached enrollments are kept
+            if invoker == 'default':
+                root_logger.info('No changes since last setup.')
+        elif enrollments_response.status_code == 200:
             if invoker == 'default':
-                root_logger.info(str(totalEnrollments) +
+                root_logger.info(str(len(enrollments_response.json()['enrollments'])) +
                                  ' total enrollments found.')
-            # create a local enrollments json object that contains key info for each enrollment
-            if (totalEnrollments > 0):
-                for every_enrollment in enrollments_json['enrollments']:
-                    enrollmentInfo = {}
-                    if 'csr' in every_enrollment:
-                        enrollmentInfo['cn'] = every_enrollment['csr']['cn']
-                        enrollmentInfo['contractId'] = contractId
-                        enrollmentInfo['enrollmentId'] = int(
-                            every_enrollment['location'].split('/')[-1])
-                        enrollmentOutput.append(enrollmentInfo)
-
         else:
             root_logger.info('Invalid API Response (' + str(enrollments_response.status_code) + '): Unable to get enrollments for contract')
             pass
             # Cannot exit here as there might be other contracts to loop through which might have enrollments
 
-    # Write the created enrollments json object to the file
-    with open(os.path.join(enrollmentsPath, 'enrollments.json'), 'a') as enrollmentsFile:
-        enrollmentsFile.write(
-            json.dumps(enrollmentOutput, indent=4))
+    # Commit the refreshed enrollments to the local cache
+    enrollment_cache.close()
 
     # If this was a first time setup, output where the enrollment.json file is located
     if invoker == 'default':
         print('')
         root_logger.info('Enrollments details are stored in ' + '"' +
-                         os.path.join(enrollmentsPath, 'enrollments.json') + '".')
+                         enrollment_cache.db_file + '".')
         print('Run \'list\' to see all enrollments.')
         print('')
 
@@ -941,9 +1090,169 @@ def get_status(session, cps_object, enrollmentId, cn):
         exit(-1)
 
 
+def fetch_change_summary(cps_object, session, enrollment_info):
+    """
+    Helper method that returns the dashboard row of one enrollment, without exiting when there is no pending change
+
+    Parameters
+    -----------
+    cps_object: <object>
+        Local CPS Object that has relevant http response
+    session : <object
+        An Edgegrid Auth (Akamai) object
+    enrollment_info : <dict>
+        enrollmentId and cn of the enrollment, with pendingChanges when taken from the enrollments list
+    Returns
+    -------
+    row : <dict>
+        Change status summary of the enrollment
+    """
+    enrollmentId = enrollment_info['enrollmentId']
+    cn = enrollment_info.get('cn', '')
+    changeId = None
+    try:
+        pending_changes = enrollment_info.get('pendingChanges')
+        if pending_changes is None:
+            enrollment_details = cps_object.get_enrollment(session, enrollmentId)
+            if enrollment_details.status_code != 200:
+                return summarize(enrollmentId, cn, error='Invalid API Response (' + str(enrollment_details.status_code) + '): Unable to get enrollment details')
+            enrollment_details_json = enrollment_details.json()
+            cn = enrollment_details_json.get('csr', {}).get('cn', cn)
+            pending_changes = enrollment_details_json.get('pendingChanges', [])
+
+        changeId = pending_change_id(pending_changes)
+        if changeId is None:
+            return summarize(enrollmentId, cn)
+        change_status_response = cps_object.get_change_status(session, enrollmentId, changeId)
+        if change_status_response.status_code != 200:
+            return summarize(enrollmentId, cn, changeId, error='Invalid API Response (' + str(change_status_response.status_code) + '): Unable to determine change status')
+        return summarize(enrollmentId, cn, changeId, change_status_response.json())
+    except Exception as err:
+        # A request that failed after its retries or an unreadable response is one row, the dashboard carries on
+        return summarize(enrollmentId, cn, changeId, error=type(err).__name__ + ': ' + str(err))
+
+def status_batch(args):
+    """
+    Status action for many enrollments. Every enrollment with a pending change (--all-pending) and/or the
+    enrollments listed in a file (--enrollment-ids) are fetched concurrently and shown in one table grouped by
+    change state and allowed input, refreshed as the change statuses come in.
+
+    Parameters
+    -----------
+    args : <string>
+        Default args parameter (--all-pending and/or --enrollment-ids)
+    Returns
+    -------
+    None
+    """
+    base_url, session = init_config(args.edgerc, args.section, args.concurrency, args.rate_limit)
+    cps_object = cps(base_url,args.account_key)
+    enrollments = {}
+
+    if args.all_pending:
+        # One list call tells which enrollments have a pending change and where to find it
+        enrollments_response = cps_object.list_enrollments(session)
+        if enrollments_response.status_code != 200:
+            root_logger.info('Invalid API Response (' + str(enrollments_response.status_code) + '): Could not list enrollments.')
+            exit(-1)
+        for every_enrollment in enrollments_response.json()['enrollments']:
+            if every_enrollment.get('pendingChanges'):
+                enrollmentId = int(every_enrollment['location'].split('/')[-1])
+                enrollments[enrollmentId] = {'enrollmentId': enrollmentId,
+                                             'cn': every_enrollment.get('csr', {}).get('cn', ''),
+                                             'pendingChanges': every_enrollment['pendingChanges']}
+
+    if args.enrollment_ids:
+        try:
+            enrollment_ids = read_enrollment_ids(args.enrollment_ids)
+        except FileNotFoundError:
+            root_logger.info('Filename: ' + args.enrollment_ids + ' is not found. Exiting...')
+            exit(-1)
+        except ValueError as err:
+            root_logger.info('Invalid enrollment-id in ' + args.enrollment_ids + ': ' + str(err))
+            exit(-1)
+        for enrollmentId in enrollment_ids:
+            enrollments.setdefault(enrollmentId, {'enrollmentId': enrollmentId, 'cn': ''})
+
+    if not enrollments:
+        root_logger.info('There are no enrollments with pending changes.')
+        exit(0)
+
+    enrollment_infos = [enrollments[enrollmentId] for enrollmentId in sorted(enrollments)]
+    dashboard = StatusDashboard('CPS change status', total=len(enrollment_infos))
+    engine = FanOut(concurrency=args.concurrency, name='status')
+    with Live(dashboard, console=console, refresh_per_second=4):
+        for row in engine.map(lambda enrollment_info: fetch_change_summary(cps_object, session, enrollment_info),
+                              enrollment_infos):
+            dashboard.add(row)
+    root_logger.debug('Status throughput: ' + engine.summary(unit='enrollments'))
+
+
+def status_watch(args, cps_object, session, enrollmentId, changeId):
+    """
+    Poll the change status of an enrollment until the change completes, fails, is cancelled or waits for input.
+    Only the change status is requested per poll, the interval grows while the change stays in the same state
+    and starts short again when it moves on. Exits with the watch exit code of the final state.
+
+    Parameters
+    -----------
+    args : <string>
+        Default args parameter (--watch, optionally --watch-timeout)
+    cps_object: <object>
+        Local CPS Object that has relevant http response
+    session : <object
+        An Edgegrid Auth (Akamai) object
+    enrollmentId : <int>
+        Enrollment Id of certificate/Enrollment
+    changeId : <int>
+        Id of the pending change to watch
+    Returns
+    -------
+    None
+    """
+    def poll():
+        change_status_response = cps_object.get_change_status(session, enrollmentId, changeId)
+        if change_status_response.status_code == 404:
+            # The change is gone, it either completed or was removed outside of the watch
+            # status read the enrollment when it started, ask for the live one
+            enrollment_details = cps_object.get_enrollment(session, enrollmentId, fresh=True)
+            if enrollment_details.status_code == 200 and changeId not in [pending_change_id([change]) for change in
+                                                                          enrollment_details.json().get('pendingChanges', [])]:
+                return {'statusInfo': {'state': 'complete', 'status': 'complete',
+                                       'description': 'The change is no longer pending'}, 'allowedInput': []}
+        if change_status_response.status_code != 200:
+            root_logger.info('Invalid API Response (' + str(change_status_response.status_code) + '): Unable to determine change status details. Please try again or contact an Akamai representative.')
+            exit(-1)
+        return change_status_response.json()
+
+    last_status = {}
+
+    def on_update(change_status_json, next_poll_in):
+        status_info = change_status_json.get('statusInfo') or {}
+        if status_info != last_status.get('statusInfo'):
+            root_logger.info('Change ' + str(changeId) + ': state = ' + str(status_info.get('state')) +
+                             ', status = ' + str(status_info.get('status')) + ' - ' + str(status_info.get('description', '')))
+            last_status['statusInfo'] = status_info
+        if next_poll_in is not None:
+            spinner.update('Watching change ' + str(changeId) + ', next check in ' + str(round(next_poll_in)) + 's')
+
+    root_logger.info('Watching change ' + str(changeId) + ' of enrollment-id ' + str(enrollmentId) + ', press Ctrl+C to stop')
+    watcher = ChangeWatcher(poll, timeout=args.watch_timeout)
+    with console.status('Watching change ' + str(changeId)) as spinner:
+        code, change_status_json = watcher.watch(on_update)
+
+    state = (change_status_json.get('statusInfo') or {}).get('state')
+    if code == WATCH_COMPLETE:
+        root_logger.info('The change is complete.')
+    else:
+        root_logger.info('Stopped watching in state ' + str(state) + ' after ' + str(watcher.polls) + ' checks. Run \'status\' for details.')
+    exit(code)
+
+
 def status(args):
     """
     Main status action for reviewing current status of a certificate.
+    Use --all-pending or --enrollment-ids to review many enrollments at once.
 
     Parameters
     -----------
@@ -953,12 +1262,15 @@ def status(args):
     -------
     None
     """
+    # proceed re-uses status, its arguments have no batch options
+    if getattr(args, 'all_pending', False) or getattr(args, 'enrollment_ids', None):
+        return status_batch(args)
     if not args.cn and not args.enrollment_id:
         root_logger.info('common Name (--cn) or enrollment-id (--enrollment-id) is mandatory')
         exit(-1)
     cn = args.cn
     enrollmentsPath = os.path.join('setup')
-    base_url, session = init_config(args.edgerc, args.section)
+    base_url, session = init_config(args.edgerc, args.section, rate_limit=args.rate_limit)
     cps_object = cps(base_url,args.account_key)
 
     # check local setup file to find enrollmentId necessary for CPS API calls
@@ -970,14 +1282,22 @@ def status(args):
         root_logger.info('Enrollment not found. Please double check common name (CN) or enrollment-id.')
         exit(0)
 
+    # get_status reads the same enrollment again, the request memo answers it without a second call
     enrollment_details = cps_object.get_enrollment(session, enrollmentId)
-    root_logger.debug(json.dumps(enrollment_details.json(),indent=4))
     if enrollment_details.status_code != 200:
         root_logger.info('Unable to fetch enrollment details')
         root_logger.info(json.dumps(enrollment_details.json(),indent=4))
         exit(-1)
+    root_logger.debug(json.dumps(enrollment_details.json(),indent=4))
 
     validation_type = str(enrollment_details.json()['validationType'])
+    if getattr(args, 'watch', False):
+        # Resolve the pending change once, then only its status is polled
+        changeId = pending_change_id(enrollment_details.json().get('pendingChanges', []))
+        if changeId is None:
+            root_logger.info('The certificate is active, there are no current pending changes.')
+            exit(0)
+        status_watch(args, cps_object, session, enrollmentId, changeId)
     # Get the actual change status information
     change_status_response = get_status(session, cps_object, enrollmentId, cn)
 
@@ -1063,6 +1383,60 @@ def proceed(args):
     status(args)
 
 
+def fetch_expiration(cps_object, session, enrollmentId):
+    """
+    Helper method that returns the production expiration date of an enrollment
+
+    Parameters
+    -----------
+    cps_object: <object>
+        Local CPS Object that has relevant http response
+    session : <object
+        An Edgegrid Auth (Akamai) object
+    enrollmentId : <string>
+        Enrollment Id of certificate/Enrollment
+    Returns
+    -------
+    expiration : <string>
+        Expiration date of the production certificate, empty if it is not deployed
+    """
+    certResponse = cps_object.get_certificate(session, enrollmentId)
+    if certResponse.status_code == 200:
+        return certificate(certResponse.json()['certificate']).expiration
+    root_logger.debug('Reason: ' + json.dumps(certResponse.json(), indent=4))
+    return ''
+
+
+def prefetch_expirations(cps_object, session, enrollment_ids, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Fetch the production expiration date of many enrollments concurrently, showing a progress bar
+
+    Parameters
+    -----------
+    cps_object: <object>
+        Local CPS Object that has relevant http response
+    session : <object
+        An Edgegrid Auth (Akamai) object
+    enrollment_ids : <list>
+        Enrollment Ids to look up
+    concurrency : <int>
+        Number of certificates fetched in parallel
+    Returns
+    -------
+    expirations : <dict>
+        Expiration date keyed by enrollment Id
+    """
+    engine = FanOut(concurrency=concurrency, name='list')
+    with Progress(console=console, transient=True) as progress:
+        task = progress.add_task('Fetching production expiration dates', total=len(enrollment_ids))
+        results = engine.map(lambda enrollmentId: fetch_expiration(cps_object, session, enrollmentId),
+                             enrollment_ids,
+                             on_complete=lambda: progress.advance(task))
+        expirations = dict(zip(enrollment_ids, results))
+    root_logger.debug('Expiration prefetch: ' + engine.summary(unit='certificates'))
+    return expirations
+
+
 def list(args):
     """
     Method for handling list action. This method is responsible to list/display all enrollments.
@@ -1081,7 +1455,7 @@ def list(args):
     _idm = IdentityAccessManagement(_auth)
 
 
-    base_url, session = init_config(args.edgerc, args.section)
+    base_url, session = init_config(args.edgerc, args.section, args.concurrency, args.rate_limit)
     cps_object = cps(base_url,args.account_key)
     contract_id_set = set()
     try:
@@ -1104,14 +1478,17 @@ def list(args):
             # Find number of groups using len function
             totalEnrollments = len(enrollments_json['enrollments'])
             count = 0
+            expirations = {}
+            if args.show_expiration:
+                # Prefetch all production certificates concurrently before building the table
+                enrollment_ids = [every_enrollment['location'].split('/')[-1]
+                                  for every_enrollment in enrollments_json['enrollments'] if 'csr' in every_enrollment]
+                expirations = prefetch_expirations(cps_object, session, enrollment_ids, args.concurrency)
             for every_enrollment in enrollments_json['enrollments']:
                 if 'csr' in every_enrollment:
                     count = count + 1
                     rowData = []
                     cn = every_enrollment['csr']['cn']
-                    if args.show_expiration:
-                        root_logger.info('Processing ' + str(count) + ' of ' + str(
-                            totalEnrollments) + ': Common Name (CN): ' + cn)
                     if 'sans' in every_enrollment['csr'] and every_enrollment['csr']['sans'] is not None:
                         if (len(every_enrollment['csr']['sans']) > 1):
                             cn = cn + \
@@ -1144,24 +1521,15 @@ def list(args):
                             rowData.append('No')
 
                 if args.show_expiration:
-                    # if showing expiriation date, need to get it from the certificate itself
-                    certResponse = cps_object.get_certificate(
-                        session, enrollmentId)
-                    expiration = ''
-                    if certResponse.status_code == 200:
-                        certificate_details = certificate(certResponse.json()['certificate'])
-                        expiration = certificate_details.expiration
-                    else:
-                        root_logger.debug(
-                            'Reason: ' + json.dumps(certResponse.json(), indent=4))
-                    rowData.append(expiration)
+                    # expiration date was prefetched from the production certificate
+                    rowData.append(expirations.get(enrollmentId, ''))
                 table.add_row(rowData)
             print(table)
             print('')
             print('** means enrollment has existing pending changes')
             print('')
         else:
-            root_logger.info('Invalid API Response (' + str(enrollments_response.status_code) + '): Could not list enrollments. Please ensure you have run \'setup\' to populate the local enrollments.json file')
+            root_logger.info('Invalid API Response (' + str(enrollments_response.status_code) + '): Could not list enrollments. Please ensure you have run \'setup\' to populate the local enrollments cache')
     except FileNotFoundError:
         print('')
         root_logger.info('Filename: ' + fileName +
@@ -1170,10 +1538,152 @@ def list(args):
         exit(1)
 
 
+def fetch_audit_details(cps_object, session, every_enrollment_info, include_change_details=False):
+    """
+    Fetch every CPS resource the audit needs for one enrollment. This runs on a worker thread of the
+    audit fan-out engine, so it only issues requests and leaves logging and output to the caller.
+
+    Parameters
+    -----------
+    cps_object: <object>
+        Local CPS Object that has relevant http response
+    session : <object
+        An Edgegrid Auth (Akamai) object
+    every_enrollment_info : <dict>
+        Enrollment entry from the local enrollments cache
+    include_change_details : <bool>
+        Also fetch change status and change history of pending changes
+    Returns
+    -------
+    audit_details : <dict>
+        Responses keyed by enrollment, certificate, change_id, change_status and change_history
+    """
+    enrollmentId = every_enrollment_info['enrollmentId']
+    audit_details = {}
+    audit_details['enrollment'] = cps_object.get_enrollment(session, enrollmentId)
+    if audit_details['enrollment'].status_code != 200:
+        return audit_details
+
+    enrollment_details_json = audit_details['enrollment'].json()
+    audit_details['certificate'] = cps_object.get_certificate(session, enrollmentId)
+    if audit_details['certificate'].status_code == 200:
+        # Parse on the worker, the row is rendered from the memoized certificate
+        certificates.decode(audit_details['certificate'].json()['certificate'])
+
+    pending_changes = enrollment_details_json.get('pendingChanges', [])
+    if include_change_details and len(pending_changes) > 0:
+        change_id = int(pending_changes[0]['location'].split('/')[-1])
+        audit_details['change_id'] = change_id
+        audit_details['change_status'] = cps_object.get_change_status(session, enrollmentId, change_id)
+        if audit_details['change_status'].status_code == 200 and \
+                enrollment_details_json['validationType'] in ['ov', 'ev']:
+            audit_details['change_history'] = cps_object.get_change_history(session, enrollmentId)
+
+    return audit_details
+
+
+def pending_order_id(change_history_response, geotrustOrderId):
+    """
+    Find the GeoTrust order id of the incomplete change in the change history of an enrollment
+
+    Parameters
+    -----------
+    change_history_response : <object>
+        Change history response of the enrollment
+    geotrustOrderId : <string>
+        Value returned when no incomplete change carries an order id
+    Returns
+    -------
+    geotrustOrderId : <string>
+        The order id of the pending change
+    """
+    for each_change in change_history_response.json()['changes']:
+        if each_change.get('status') == 'incomplete':
+            root_logger.debug(json.dumps(each_change, indent=4))
+            try:
+                if 'geotrustOrderId' in each_change.get('primaryCertificateOrderDetails', {}):
+                    geotrustOrderId = str(each_change['primaryCertificateOrderDetails']['geotrustOrderId'])
+            except:
+                root_logger.info('Unable to fetch details of Pending Change.')
+    return geotrustOrderId
+
+
+def open_report(args, output_file, xlsxFile, title_line, ndjson_file=None):
+    """
+    Pick the streaming report writer of the requested output format, xlsx rows go straight
+    into the workbook, ndjson writes one object per enrollment and every other format keeps the csv report
+
+    Parameters
+    -----------
+    args : <string>
+        Default args parameter
+    output_file : <string>
+        Target file of the csv report, '-' for stdout
+    xlsxFile : <string>
+        Target file of the xlsx format
+    title_line : <list>
+        Column names of the report
+    ndjson_file : <string>
+        Target file of the ndjson format, resumed when it exists
+    Returns
+    -------
+    report : <object>
+        CsvReport, XlsxReport or NdjsonReport, used as context manager
+    """
+    if getattr(args, 'ndjson', False):
+        return NdjsonReport(ndjson_file, resume=True)
+    if args.xlsx:
+        return XlsxReport(xlsxFile, title_line)
+    return CsvReport(output_file, title_line)
+
+
+def write_audit_output(args, output_file, xlsxFile, json_file, final_json_array, ndjson_file=None):
+    """
+    Report where the audit output was written, and write the json format once all rows are collected
+
+    Parameters
+    -----------
+    args : <string>
+        Default args parameter
+    output_file : <string>
+        The csv report, '-' when it was streamed to stdout
+    xlsxFile : <string>
+        Target file of the xlsx format
+    json_file : <string>
+        Target file of the json format
+    final_json_array : <list>
+        Enrollment details collected for the json format
+    ndjson_file : <string>
+        Target file of the ndjson format
+    Returns
+    -------
+    None
+    """
+    if getattr(args, 'ndjson', False):
+        if ndjson_file != STDOUT:
+            console.print()
+            root_logger.info('Done! Output file written here: ' + ndjson_file)
+    elif args.xlsx:
+        # Rows were written straight into the workbook
+        root_logger.info('\nDone! Output file written here: ' + xlsxFile)
+    elif args.json:
+        root_logger.info('\nDone! Output file written here: ' + json_file)
+        with open(os.path.join(json_file), 'w') as f:
+            f.write(json.dumps(final_json_array, indent=4))
+            #os.remove(output_file)
+    elif output_file != STDOUT:
+        #Default is csv format
+        console.print()
+        root_logger.info('Done! Output file written here: ' + output_file)
+
+
 def audit(args):
     """
     Method for handling audit action. This method generates an audit report of the account or
-    all enrollments. The default output format is csv, and it is configurable to xlsx or json
+    all enrollments. The default output format is csv, and it is configurable to xlsx, json or ndjson.
+    Use '-' as output file to stream the csv or ndjson report to stdout. Finished enrollments are
+    checkpointed in a journal next to the output file, --resume continues an interrupted audit from it.
+    An existing ndjson report is resumed, enrollments already in it are skipped
 
     Parameters
     -----------
@@ -1193,38 +1703,65 @@ def audit(args):
         output_file_name = 'CPSAudit_' + str(timestamp) + '.csv'
         output_file = os.path.join('audit', output_file_name)
 
-    enrollmentsPath = os.path.join('setup')
+    if output_file == STDOUT and (args.xlsx or args.json):
+        root_logger.info('Only csv and ndjson formats can be streamed to stdout, please specify --output-file')
+        exit(-1)
+
+    enrollmentsPath = os.path.join(get_cache_dir(), 'setup')
 
     xlsxFile = output_file.replace('.csv', '').replace('.xlsx', '').replace('.xls', '') + '.xlsx'
     json_file = output_file.replace('.csv', '').replace('.json', '') + '.json'
+    if output_file == STDOUT or output_file.endswith(('.ndjson', '.jsonl')):
+        ndjson_file = output_file
+    else:
+        ndjson_file = output_file.replace('.csv', '') + '.ndjson'
     final_json_array = []
 
-    with open(output_file, 'w') as fileHandler:
-        title_line = 'Contract,Enrollment ID,Common Name (CN),SAN(S),Status,Expiration (In Production),Validation,Type,\
-        Test on Staging,Admin Name, Admin Email, Admin Phone, Tech Name, Tech Email, Tech Phone, \
-        Geography, Secure Network, Must-Have Ciphers, Preferred Ciphers, Disallowed TLS Versions, \
-        SNI Only, Country, State, Organization, Organization Unit'
-
-        if args.include_change_details:
-            title_line = title_line + ', Change Status Details, Order ID'
+    title_line = [*AUDIT_COLUMNS]
+    if args.include_change_details:
+        title_line.extend(AUDIT_CHANGE_COLUMNS)
 
-        #Add a newline character
-        title_line = title_line + '\n'
-        fileHandler.write(title_line)
-
-    base_url, session = init_config(args.edgerc, args.section)
+    base_url, session = init_config(args.edgerc, args.section, args.concurrency, args.rate_limit)
     cps_object = cps(base_url,args.account_key)
-    for root, dirs, files in os.walk(enrollmentsPath):
-        local_enrollments_file = 'enrollments.json'
-        if local_enrollments_file in files:
-            with open(os.path.join(enrollmentsPath, local_enrollments_file)) as enrollmentsFileHandler:
-                enrollments_string_content = enrollmentsFileHandler.read()
-            print('')
-            root_logger.info('Generating CPS audit file...')
-            enrollments_json_content = json.loads(enrollments_string_content)
-            enrollmentTotal = len(enrollments_json_content)
-            count = 0
-            for every_enrollment_info in enrollments_json_content:
+    enrollment_cache = EnrollmentCache(enrollmentsPath)
+    if not enrollment_cache.exists():
+        root_logger.info("Unable to find local cache. Please run 'setup' again")
+        exit(0)
+    with enrollment_cache:
+        enrollments_json_content = enrollment_cache.enrollments()
+    console.print()
+    root_logger.info('Generating CPS audit file...')
+    journal = None
+    if not args.ndjson and output_file != STDOUT:
+        #Completed enrollments are checkpointed next to the output file, ndjson reports are their own checkpoint
+        journal = CheckpointJournal((xlsxFile if args.xlsx else output_file) + '.journal', title_line)
+        journal.open(resume=args.resume)
+    with open_report(args, output_file, xlsxFile, title_line, ndjson_file) as report:
+        completed = set()
+        if args.ndjson and report.completed:
+            #Resume an interrupted ndjson audit, enrollments already written are not fetched again
+            root_logger.info('Skipping ' + str(len(report.completed)) + ' enrollments already in ' + ndjson_file)
+            completed = report.completed
+        elif journal is not None and journal.entries:
+            #Replay the enrollments finished before the interruption, only the missing ones are fetched
+            root_logger.info('Resuming from checkpoint, ' + str(len(journal.entries)) + ' enrollments already audited')
+            for entry in journal.entries:
+                report.write(entry['row'])
+                if args.json and 'record' in entry:
+                    final_json_array.append(entry['record'])
+            completed = journal.completed
+        if completed:
+            enrollments_json_content = [every_enrollment_info for every_enrollment_info in enrollments_json_content
+                                        if every_enrollment_info['enrollmentId'] not in completed]
+        enrollmentTotal = len(enrollments_json_content)
+        count = 0
+        # Fetch all per-enrollment resources concurrently, rows are still rendered in cache order
+        engine = FanOut(concurrency=args.concurrency, name='audit')
+        audit_results = engine.map(lambda enrollment_info: fetch_audit_details(cps_object, session, enrollment_info,
+                                                                               args.include_change_details),
+                                   enrollments_json_content)
+        try:
+            for every_enrollment_info, audit_details in zip(enrollments_json_content, audit_results):
                 #Set a default value for pending_detail
                 pending_detail = 'Not Applicable'
                 geotrustOrderId = 'Not Applicable'
@@ -1234,8 +1771,7 @@ def audit(args):
                 commonName = every_enrollment_info['cn']
                 root_logger.info('Processing ' + str(count) + ' of ' +
                                  str(enrollmentTotal) + ': Common Name (CN): ' + commonName)
-                enrollment_details = cps_object.get_enrollment(
-                    session, enrollmentId)
+                enrollment_details = audit_details['enrollment']
 
                 if enrollment_details.status_code == 200:
                     enrollment_details_json = enrollment_details.json()
@@ -1244,148 +1780,69 @@ def audit(args):
                     enrollment_json_info = enrollment_details_json
                     enrollment_json_info['contractId'] = contract_id
 
-                    certResponse = cps_object.get_certificate(
-                        session, enrollmentId)
+                    certResponse = audit_details['certificate']
                     expiration = ''
                     if certResponse.status_code == 200:
                         certificate_details = certificate(certResponse.json()['certificate'])
-                        expiration = certificate_details.expiration
+                        expiration = certificate_details.expiration_date
                     else:
                         root_logger.debug(
                             'Reason: ' + json.dumps(certResponse.json(), indent=4))
-                    sanCount = len(enrollment_details_json['csr']['sans'])
-                    sanList = str(enrollment_details_json['csr']['sans']).replace(
-                        ',', '').replace('[', '').replace(']', '')
-                    if sanCount <= 1:
-                        sanList = ''
-                    changeManagement = str(
-                        enrollment_details_json['changeManagement'])
-                    if changeManagement.lower() == 'true':
-                        changeManagement = 'yes'
-                    else:
-                        changeManagement = 'no'
-                    disallowedTlsVersions = str(enrollment_details_json['networkConfiguration']['disallowedTlsVersions']).replace(
-                        ',', '').replace('[', '').replace(']', '')
-                    Status = 'UNKNOWN'
-                    adminName = str(enrollment_details_json['adminContact']['firstName']) + \
-                        ' ' + str(enrollment_details_json['adminContact']['lastName'])
-                    techName = str(enrollment_details_json['techContact']['firstName']) + \
-                        ' ' + str(enrollment_details_json['techContact']['lastName'])
-                    if 'pendingChanges' in enrollment_details_json and len(enrollment_details_json['pendingChanges']) == 0:
-                        Status = 'ACTIVE'
-                    elif 'pendingChanges' in enrollment_details_json and len(enrollment_details_json['pendingChanges']) > 0:
-                        Status = 'IN-PROGRESS'
-                        if args.include_change_details:
-                            #Fetch additional details and populate the details column
-                            change_id = int(enrollment_details_json['pendingChanges'][0]['location'].split('/')[-1])
-                            change_status_response = cps_object.get_change_status(session, enrollmentId, change_id)
-                            if change_status_response.status_code == 200:
-                                pending_detail = change_status_response.json()['statusInfo']['description']
-                                if enrollment_details_json['validationType'] == 'ov' or enrollment_details_json['validationType'] == 'ev':
-                                    #Fetch the OrderId and populate it
-                                    change_history_response = cps_object.get_change_history(session, enrollmentId)
-                                    for each_change in change_history_response.json()['changes']:
-                                        if 'status' in each_change:
-                                            if each_change['status'] == 'incomplete':
-                                                print(json.dumps(each_change, indent=4))
-                                                try:
-                                                    if 'primaryCertificateOrderDetails' in each_change:
-                                                        if 'geotrustOrderId' in each_change['primaryCertificateOrderDetails']:
-                                                            geotrustOrderId = str(each_change['primaryCertificateOrderDetails']['geotrustOrderId'])
-                                                        else:
-                                                            pass
-                                                    else:
-                                                        pass
-                                                except:
-                                                    root_logger.info('Unable to fetch details of Pending Change.')
-                                                    pass
-                                            else:
-                                                pass
-                                        else:
-                                            pass
-
-                            else:
-                                print('')
-                                root_logger.info('Unable to determine change status for enrollment ' + str(enrollmentId) + ' with change Id ' + str(change_id))
-
-
-                    #root_logger.info(json.dumps(enrollment_details_json, indent=4))
-                    if enrollment_details_json['networkConfiguration']['sniOnly'] is not None:
-                        sniInfo = enrollment_details_json['networkConfiguration']['sniOnly']
+                    if args.include_change_details and len(enrollment_details_json.get('pendingChanges', [])) > 0:
+                        #Additional details were fetched by the fan-out engine
+                        change_id = audit_details['change_id']
+                        change_status_response = audit_details['change_status']
+                        if change_status_response.status_code == 200:
+                            pending_detail = change_status_response.json()['statusInfo']['description']
+                            if enrollment_details_json['validationType'] == 'ov' or enrollment_details_json['validationType'] == 'ev':
+                                #Fetch the OrderId and populate it
+                                geotrustOrderId = pending_order_id(audit_details['change_history'], geotrustOrderId)
+                        else:
+                            console.print()
+                            root_logger.info('Unable to determine change status for enrollment ' + str(enrollmentId) + ' with change Id ' + str(change_id))
+
+                    change_details = [pending_detail, geotrustOrderId] if args.include_change_details else None
+                    if args.ndjson:
+                        #One compact object per enrollment, written as soon as it is fetched
+                        enrollment_json_info['enrollmentId'] = enrollmentId
+                        if certResponse.status_code == 200:
+                            enrollment_json_info['productionDeployment'] = certResponse.json()
+                        if change_details is not None:
+                            enrollment_json_info['changeStatusDetails'], enrollment_json_info['orderId'] = change_details
+                        report.write(enrollment_json_info)
                     else:
-                        sniInfo = ''
-
-                    output_content = contract_id + ',' + str(enrollmentId) + ', ' + enrollment_details_json['csr']['cn'] + ', ' + sanList + ', ' + Status + ', ' \
-                      + expiration + ', ' + enrollment_details_json['validationType'] + ', ' \
-                      + enrollment_details_json['certificateType'] + ', ' \
-                      + changeManagement + ',' + adminName + ',' + \
-                      str(enrollment_details_json['adminContact']['email']) + ', ' \
-                      + str(enrollment_details_json['adminContact']['phone']) + ', ' + techName + ',' \
-                      + str(enrollment_details_json['techContact']['email']) + ', ' + \
-                      str(enrollment_details_json['techContact']['phone']) + ',' \
-                      + str(enrollment_details_json['networkConfiguration']['geography']) + ',' + \
-                      str(enrollment_details_json['networkConfiguration']['secureNetwork']) + ',' \
-                      + str(enrollment_details_json['networkConfiguration']['mustHaveCiphers']) + ',' + \
-                      str(enrollment_details_json['networkConfiguration']['preferredCiphers']) + ',' \
-                      + disallowedTlsVersions + \
-                      ',' + str(sniInfo) + ',' \
-                      + str(enrollment_details_json['csr']['c']) + ',' + str(enrollment_details_json['csr']['st']) + ',' \
-                      + str(enrollment_details_json['csr']['o']) + ',' + str(enrollment_details_json['csr']['ou'])
-
-                    if args.include_change_details:
-                        #Adding geotrustOrderId to all, as we have initialized to Not Applicable in general
-                        output_content = output_content + ',' + pending_detail + ',' + geotrustOrderId
-
-                    #Add a newline character
-                    output_content = output_content + '\n'
-
-                    with open(output_file, 'a') as fileHandler:
-                        fileHandler.write(output_content)
-                    #if json format is of interest
+                        row = audit_row(enrollment_details_json, contract_id, enrollmentId, expiration, change_details)
+                        report.write(row)
+                    #if json format is of interest, reuse the production deployment fetched above
                     if args.json:
-                        deployment_details = cps_object.get_certificate(session, enrollmentId)
-                        if deployment_details.status_code == 200:
-                            enrollment_json_info['productionDeployment'] = deployment_details.json()
+                        if certResponse.status_code == 200:
+                            enrollment_json_info['productionDeployment'] = certResponse.json()
                         else:
                             root_logger.debug(
-                                'Invalid API Response (' + str(deployment_details.status_code) + '): Unable to fetch deployment/Certificate details in production for enrollment-id: ' + str(enrollmentId))
+                                'Invalid API Response (' + str(certResponse.status_code) + '): Unable to fetch deployment/Certificate details in production for enrollment-id: ' + str(enrollmentId))
                         #Populate the final list
                         final_json_array.append(enrollment_json_info)
+                    if journal is not None:
+                        journal.record(enrollmentId, row, enrollment_json_info if args.json else None)
 
                 else:
                     root_logger.info(
                         'Invalid API Response (' + str(enrollment_details.status_code) + '): Unable to fetch Enrollment/Certificate details in production for enrollment-id: ' + str(enrollmentId))
                     root_logger.info(
                         'Reason: ' + json.dumps(enrollment_details.json(), indent=4))
-                    print('\n')
-
-            if args.xlsx:
-                root_logger.info('\nDone! Output file written here: ' + xlsxFile)
-                # Merge CSV files into XLSX
-                workbook = Workbook(os.path.join(xlsxFile))
-                worksheet = workbook.add_worksheet('Certificate')
-                with open(os.path.join(output_file), encoding='utf8') as f:
-                    reader = csv.reader(f)
-                    for r, row in enumerate(reader):
-                        for c, col in enumerate(row):
-                            worksheet.write(r, c, col)
-                workbook.close()
-                # Delete the csv file at the end
-                if output_file.endswith('csv'):
-                    os.remove(output_file)
-            elif args.json:
-                root_logger.info('\nDone! Output file written here: ' + json_file)
-                with open(os.path.join(json_file), 'w') as f:
-                    f.write(json.dumps(final_json_array, indent=4))
-                    #os.remove(output_file)
-            else:
-                #Default is csv format
-                print('')
-                root_logger.info('Done! Output file written here: ' + output_file)
+                    console.print('\n')
+        except KeyboardInterrupt:
+            if journal is not None:
+                journal.close()
+                console.print()
+                root_logger.info('Audit interrupted. Run it again with --resume to continue from ' + journal.path)
+            exit(1)
 
-        else:
-            root_logger.info("Unable to find local cache. Please run 'setup' again")
-            exit(0)
+    if journal is not None:
+        journal.discard()
+    console.print()
+    root_logger.info('Audit throughput: ' + engine.summary(unit='enrollments'))
+    write_audit_output(args, output_file, xlsxFile, json_file, final_json_array, ndjson_file)
 
 
 def create(args):
@@ -1407,20 +1864,13 @@ def create(args):
 
     try:
         if not args.contract_id:
-            # Fetch the contractId from setup/enrollments.json file
+            # Fetch the contractId from the local enrollments cache
             #Commenting out till papi access is resolved
             contract_id_list = set()
-            enrollmentsPath = os.path.join('setup')
-            for root, dirs, files in os.walk(enrollmentsPath):
-                local_enrollments_file = 'enrollments.json'
-                if local_enrollments_file in files:
-                    with open(os.path.join(enrollmentsPath, local_enrollments_file)) as enrollmentsFileHandler:
-                        enrollments_string_content = enrollmentsFileHandler.read()
-                    # root_logger.info(policyStringContent)
-                    enrollments_json_content = json.loads(enrollments_string_content)
-                    for every_enrollment_info in enrollments_json_content:
-                        contractId = every_enrollment_info['contractId']
-                        contract_id_list.add(contractId)
+            enrollment_cache = EnrollmentCache(os.path.join(get_cache_dir(), 'setup'))
+            if enrollment_cache.exists():
+                with enrollment_cache:
+                    contract_id_list.update(enrollment_cache.contract_ids())
 
             #Validate number of contracts
             if len(contract_id_list) > 1  or len(contract_id_list) == 0 :
@@ -1435,7 +1885,7 @@ def create(args):
                     root_logger.info('Multiple contracts exist, please specify --contract-id to use for new enrollment')
 
 
-                base_url, session = init_config(args.edgerc, args.section)
+                base_url, session = init_config(args.edgerc, args.section, rate_limit=args.rate_limit)
                 cps_object = cps(base_url,args.account_key)
                 contractIds = cps_object.get_contracts(session)
 
@@ -1497,7 +1947,7 @@ def create(args):
         if decision == 'Y' or decision == 'y':
             root_logger.info(
                 'Uploading certificate information and creating enrollment..')
-            base_url, session = init_config(args.edgerc, args.section)
+            base_url, session = init_config(args.edgerc, args.section, rate_limit=args.rate_limit)
             cps_object = cps(base_url,args.account_key)
             # Send a request to create enrollment using wrapper function
             create_enrollmentResponse = cps_object.create_enrollment(
@@ -1561,7 +2011,7 @@ def update(args):
             'common name (--cn) or enrollment-id (--enrollment-id) is mandatory')
         exit(-1)
     cn = args.cn
-    base_url, session = init_config(args.edgerc, args.section)
+    base_url, session = init_config(args.edgerc, args.section, rate_limit=args.rate_limit)
     cps_object = cps(base_url,args.account_key)
 
     enrollmentResult = check_enrollment_id(args)
@@ -1665,7 +2115,7 @@ def cancel(args):
             'common name (--cn) or enrollment-id (--enrollment-id) is mandatory')
         exit(-1)
     cn = args.cn
-    base_url, session = init_config(args.edgerc, args.section)
+    base_url, session = init_config(args.edgerc, args.section, rate_limit=args.rate_limit)
     cps_object = cps(base_url,args.account_key)
 
     enrollmentResult = check_enrollment_id(args)
@@ -1756,7 +2206,7 @@ def delete(args):
             'common name (--cn) or enrollment-id (--enrollment-id) is mandatory')
         exit(-1)
     cn = args.cn
-    base_url, session = init_config(args.edgerc, args.section)
+    base_url, session = init_config(args.edgerc, args.section, rate_limit=args.rate_limit)
     cps_object = cps(base_url,args.account_key)
 
     enrollmentResult = check_enrollment_id(args)
@@ -1853,7 +2303,7 @@ def retrieve_enrollment(args):
             'common Name (--cn) or enrollment-id (--enrollment-id) is mandatory')
         exit(-1)
 
-    base_url, session = init_config(args.edgerc, args.section)
+    base_url, session = init_config(args.edgerc, args.section, rate_limit=args.rate_limit)
     cps_object = cps(base_url,args.account_key)
 
     enrollmentResult = check_enrollment_id(args)
@@ -1914,7 +2364,7 @@ def retrieve_deployed(args):
         root_logger.info('Please specify Either --leaf --chain or --info or --json')
         exit(-1)
 
-    base_url, session = init_config(args.edgerc, args.section)
+    base_url, session = init_config(args.edgerc, args.section, rate_limit=args.rate_limit)
     cps_object = cps(base_url,args.account_key)
 
     enrollmentResult = check_enrollment_id(args)
@@ -1934,8 +2384,8 @@ def retrieve_deployed(args):
         network = 'staging'
     root_logger.info('Fetching ' + network + ' certificate for enrollment ' + str(enrollmentId))
     deployment_details = cps_object.get_certificate(session, enrollmentId, network)
-    certificate_details = certificate(deployment_details.json()['certificate'])
     if deployment_details.status_code == 200:
+        certificate_details = certificate(deployment_details.json()['certificate'])
         if args.chain:
             print(deployment_details.json()['certificate'])
             print(deployment_details.json()['trustChain'])
@@ -1987,7 +2437,8 @@ def confirm_setup(args):
 def sbd_audit(args):
     """
     Method for handling sbd-audit action. This method generates an audit report of the account or
-    all sbd enabled certificates. The default output format is csv, and it is configurable to xlsx or json
+    all sbd enabled certificates. The default output format is csv, and it is configurable to xlsx or json.
+    Use '-' as output file to stream the csv report to stdout
 
     Parameters
     -----------
@@ -2007,194 +2458,319 @@ def sbd_audit(args):
         output_file_name = f'SBDAudit_{str(timestamp)}.csv'
         output_file = os.path.join('audit', output_file_name)
 
-
+    if output_file == STDOUT and (args.xlsx or args.json):
+        root_logger.info('Only csv format can be streamed to stdout, please specify --output-file')
+        exit(-1)
 
     xlsxFile = f"{output_file.replace('.csv', '').replace('.xlsx', '').replace('.xls', '')}.xlsx"
     json_file = f"{output_file.replace('.csv', '').replace('.json', '')}.json"
     final_json_array = []
+    enrollmentsPath = os.path.join(get_cache_dir(), 'setup')
 
-    with open(output_file, 'w') as fileHandler:
-        title_line = 'hostname,commonName,issuer,issued_date,expiry_date,san_list,serial_number,days_until_expiration,\
-        papi_staging,papi_production'
-
-        #Add a newline character
-        title_line = title_line + '\n'
-        fileHandler.write(title_line)
+    # Rows are audit rows, the header has to describe them
+    title_line = [*AUDIT_COLUMNS]
+    if args.include_change_details:
+        title_line.extend(AUDIT_CHANGE_COLUMNS)
 
-    base_url, session = init_config(args.edgerc, args.section)
+    base_url, session = init_config(args.edgerc, args.section, rate_limit=args.rate_limit)
     cps_object = cps(base_url,args.account_key)
-    for root, dirs, files in os.walk(enrollmentsPath):
-        local_enrollments_file = 'enrollments.json'
-        if local_enrollments_file in files:
-            with open(os.path.join(enrollmentsPath, local_enrollments_file)) as enrollmentsFileHandler:
-                enrollments_string_content = enrollmentsFileHandler.read()
-            print('')
-            root_logger.info('Generating SBD audit file...')
-            enrollments_json_content = json.loads(enrollments_string_content)
-            enrollmentTotal = len(enrollments_json_content)
-            count = 0
-            for every_enrollment_info in enrollments_json_content:
-                #Set a default value for pending_detail
-                pending_detail = 'Not Applicable'
-                geotrustOrderId = 'Not Applicable'
-                count = count + 1
-                contract_id = every_enrollment_info['contractId']
-                enrollmentId = every_enrollment_info['enrollmentId']
-                commonName = every_enrollment_info['cn']
-                root_logger.info('Processing ' + str(count) + ' of ' +
-                                 str(enrollmentTotal) + ': Common Name (CN): ' + commonName)
-                enrollment_details = cps_object.get_enrollment(
-                    session, enrollmentId)
-
-                if enrollment_details.status_code == 200:
-                    enrollment_details_json = enrollment_details.json()
-
-                    #Update the final json array if the output format is json. used at the end
-                    enrollment_json_info = enrollment_details_json
-                    enrollment_json_info['contractId'] = contract_id
+    enrollment_cache = EnrollmentCache(enrollmentsPath)
+    if not enrollment_cache.exists():
+        root_logger.info("Unable to find local cache. Please run 'setup' again")
+        exit(0)
+    with enrollment_cache:
+        enrollments_json_content = enrollment_cache.enrollments()
+    console.print()
+    root_logger.info('Generating SBD audit file...')
+    enrollmentTotal = len(enrollments_json_content)
+    count = 0
+    with open_report(args, output_file, xlsxFile, title_line) as report:
+        for every_enrollment_info in enrollments_json_content:
+            #Set a default value for pending_detail
+            pending_detail = 'Not Applicable'
+            geotrustOrderId = 'Not Applicable'
+            count = count + 1
+            contract_id = every_enrollment_info['contractId']
+            enrollmentId = every_enrollment_info['enrollmentId']
+            commonName = every_enrollment_info['cn']
+            root_logger.info('Processing ' + str(count) + ' of ' +
+                             str(enrollmentTotal) + ': Common Name (CN): ' + commonName)
+            audit_details = fetch_audit_details(cps_object, session, every_enrollment_info, args.include_change_details)
+            enrollment_details = audit_details['enrollment']
+
+            if enrollment_details.status_code == 200:
+                enrollment_details_json = enrollment_details.json()
+
+                #Update the final json array if the output format is json. used at the end
+                enrollment_json_info = enrollment_details_json
+                enrollment_json_info['contractId'] = contract_id
+
+                certResponse = audit_details['certificate']
+                expiration = ''
+                if certResponse.status_code == 200:
+                    certificate_details = certificate(certResponse.json()['certificate'])
+                    expiration = certificate_details.expiration_date
+                else:
+                    root_logger.debug(
+                        'Reason: ' + json.dumps(certResponse.json(), indent=4))
+                if args.include_change_details and len(enrollment_details_json.get('pendingChanges', [])) > 0:
+                    change_id = audit_details['change_id']
+                    change_status_response = audit_details['change_status']
+                    if change_status_response.status_code == 200:
+                        pending_detail = change_status_response.json()['statusInfo']['description']
+                        if enrollment_details_json['validationType'] == 'ov' or enrollment_details_json['validationType'] == 'ev':
+                            #Fetch the OrderId and populate it
+                            geotrustOrderId = pending_order_id(audit_details['change_history'], geotrustOrderId)
+                    else:
+                        console.print()
+                        root_logger.info('Unable to determine change status for enrollment ' + str(enrollmentId) + ' with change Id ' + str(change_id))
 
-                    certResponse = cps_object.get_certificate(
-                        session, enrollmentId)
-                    expiration = ''
+                change_details = [pending_detail, geotrustOrderId] if args.include_change_details else None
+                report.write(audit_row(enrollment_details_json, contract_id, enrollmentId, expiration, change_details))
+                #if json format is of interest, reuse the production deployment fetched above
+                if args.json:
                     if certResponse.status_code == 200:
-                        certificate_details = certificate(certResponse.json()['certificate'])
-                        expiration = certificate_details.expiration
+                        enrollment_json_info['productionDeployment'] = certResponse.json()
                     else:
                         root_logger.debug(
-                            'Reason: ' + json.dumps(certResponse.json(), indent=4))
-                    sanCount = len(enrollment_details_json['csr']['sans'])
-                    sanList = str(enrollment_details_json['csr']['sans']).replace(
-                        ',', '').replace('[', '').replace(']', '')
-                    if sanCount <= 1:
-                        sanList = ''
-                    changeManagement = str(
-                        enrollment_details_json['changeManagement'])
-                    if changeManagement.lower() == 'true':
-                        changeManagement = 'yes'
-                    else:
-                        changeManagement = 'no'
-                    disallowedTlsVersions = str(enrollment_details_json['networkConfiguration']['disallowedTlsVersions']).replace(
-                        ',', '').replace('[', '').replace(']', '')
-                    Status = 'UNKNOWN'
-                    adminName = str(enrollment_details_json['adminContact']['firstName']) + \
-                        ' ' + str(enrollment_details_json['adminContact']['lastName'])
-                    techName = str(enrollment_details_json['techContact']['firstName']) + \
-                        ' ' + str(enrollment_details_json['techContact']['lastName'])
-                    if 'pendingChanges' in enrollment_details_json and len(enrollment_details_json['pendingChanges']) == 0:
-                        Status = 'ACTIVE'
-                    elif 'pendingChanges' in enrollment_details_json and len(enrollment_details_json['pendingChanges']) > 0:
-                        Status = 'IN-PROGRESS'
-                        if args.include_change_details:
-                            #Fetch additional details and populate the details column
-                            change_id = int(enrollment_details_json['pendingChanges'][0]['location'].split('/')[-1])
-                            change_status_response = cps_object.get_change_status(session, enrollmentId, change_id)
-                            if change_status_response.status_code == 200:
-                                pending_detail = change_status_response.json()['statusInfo']['description']
-                                if enrollment_details_json['validationType'] == 'ov' or enrollment_details_json['validationType'] == 'ev':
-                                    #Fetch the OrderId and populate it
-                                    change_history_response = cps_object.get_change_history(session, enrollmentId)
-                                    for each_change in change_history_response.json()['changes']:
-                                        if 'status' in each_change:
-                                            if each_change['status'] == 'incomplete':
-                                                print(json.dumps(each_change, indent=4))
-                                                try:
-                                                    if 'primaryCertificateOrderDetails' in each_change:
-                                                        if 'geotrustOrderId' in each_change['primaryCertificateOrderDetails']:
-                                                            geotrustOrderId = str(each_change['primaryCertificateOrderDetails']['geotrustOrderId'])
-                                                        else:
-                                                            pass
-                                                    else:
-                                                        pass
-                                                except:
-                                                    root_logger.info('Unable to fetch details of Pending Change.')
-                                                    pass
-                                            else:
-                                                pass
-                                        else:
-                                            pass
-
-                            else:
-                                print('')
-                                root_logger.info('Unable to determine change status for enrollment ' + str(enrollmentId) + ' with change Id ' + str(change_id))
-
-
-                    #root_logger.info(json.dumps(enrollment_details_json, indent=4))
-                    if enrollment_details_json['networkConfiguration']['sniOnly'] is not None:
-                        sniInfo = enrollment_details_json['networkConfiguration']['sniOnly']
-                    else:
-                        sniInfo = ''
-
-                    output_content = contract_id + ',' + str(enrollmentId) + ', ' + enrollment_details_json['csr']['cn'] + ', ' + sanList + ', ' + Status + ', ' \
-                      + expiration + ', ' + enrollment_details_json['validationType'] + ', ' \
-                      + enrollment_details_json['certificateType'] + ', ' \
-                      + changeManagement + ',' + adminName + ',' + \
-                      str(enrollment_details_json['adminContact']['email']) + ', ' \
-                      + str(enrollment_details_json['adminContact']['phone']) + ', ' + techName + ',' \
-                      + str(enrollment_details_json['techContact']['email']) + ', ' + \
-                      str(enrollment_details_json['techContact']['phone']) + ',' \
-                      + str(enrollment_details_json['networkConfiguration']['geography']) + ',' + \
-                      str(enrollment_details_json['networkConfiguration']['secureNetwork']) + ',' \
-                      + str(enrollment_details_json['networkConfiguration']['mustHaveCiphers']) + ',' + \
-                      str(enrollment_details_json['networkConfiguration']['preferredCiphers']) + ',' \
-                      + disallowedTlsVersions + \
-                      ',' + str(sniInfo) + ',' \
-                      + str(enrollment_details_json['csr']['c']) + ',' + str(enrollment_details_json['csr']['st']) + ',' \
-                      + str(enrollment_details_json['csr']['o']) + ',' + str(enrollment_details_json['csr']['ou'])
-
-                    if args.include_change_details:
-                        #Adding geotrustOrderId to all, as we have initialized to Not Applicable in general
-                        output_content = output_content + ',' + pending_detail + ',' + geotrustOrderId
-
-                    #Add a newline character
-                    output_content = output_content + '\n'
-
-                    with open(output_file, 'a') as fileHandler:
-                        fileHandler.write(output_content)
-                    #if json format is of interest
-                    if args.json:
-                        deployment_details = cps_object.get_certificate(session, enrollmentId)
-                        if deployment_details.status_code == 200:
-                            enrollment_json_info['productionDeployment'] = deployment_details.json()
-                        else:
-                            root_logger.debug(
-                                'Invalid API Response (' + str(deployment_details.status_code) + '): Unable to fetch deployment/Certificate details in production for enrollment-id: ' + str(enrollmentId))
-                        #Populate the final list
-                        final_json_array.append(enrollment_json_info)
+                            'Invalid API Response (' + str(certResponse.status_code) + '): Unable to fetch deployment/Certificate details in production for enrollment-id: ' + str(enrollmentId))
+                    #Populate the final list
+                    final_json_array.append(enrollment_json_info)
 
-                else:
-                    root_logger.info(
-                        'Invalid API Response (' + str(enrollment_details.status_code) + '): Unable to fetch Enrollment/Certificate details in production for enrollment-id: ' + str(enrollmentId))
-                    root_logger.info(
-                        'Reason: ' + json.dumps(enrollment_details.json(), indent=4))
-                    print('\n')
-
-            if args.xlsx:
-                root_logger.info('\nDone! Output file written here: ' + xlsxFile)
-                # Merge CSV files into XLSX
-                workbook = Workbook(os.path.join(xlsxFile))
-                worksheet = workbook.add_worksheet('Certificate')
-                with open(os.path.join(output_file), encoding='utf8') as f:
-                    reader = csv.reader(f)
-                    for r, row in enumerate(reader):
-                        for c, col in enumerate(row):
-                            worksheet.write(r, c, col)
-                workbook.close()
-                # Delete the csv file at the end
-                if output_file.endswith('csv'):
-                    os.remove(output_file)
-            elif args.json:
-                root_logger.info('\nDone! Output file written here: ' + json_file)
-                with open(os.path.join(json_file), 'w') as f:
-                    f.write(json.dumps(final_json_array, indent=4))
-                    #os.remove(output_file)
             else:
-                #Default is csv format
-                print('')
-                root_logger.info('Done! Output file written here: ' + output_file)
+                root_logger.info(
+                    'Invalid API Response (' + str(enrollment_details.status_code) + '): Unable to fetch Enrollment/Certificate details in production for enrollment-id: ' + str(enrollmentId))
+                root_logger.info(
+                    'Reason: ' + json.dumps(enrollment_details.json(), indent=4))
+                console.print('\n')
+
+    write_audit_output(args, output_file, xlsxFile, json_file, final_json_array)
+
+
+def comma_separated(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else None
+
+
+def get_snapshot_file(args):
+    return getattr(args, 'snapshot_file', None) or os.path.join(get_cache_dir(), 'snapshot', 'snapshot.db')
+
+
+def snapshot(args):
+    """
+    Method for handling snapshot action. This method fetches every enrollment of the local cache and its
+    production deployment concurrently and stores them, with the columns of the audit report, in a local
+    SQLite snapshot that the query action reads offline. The previous snapshot is replaced once the new one is complete
+
+    Parameters
+    -----------
+    args : <string>
+        Default args parameter (usually no argument specified)
+    Returns
+    -------
+    None
+    """
+    snapshot_file = get_snapshot_file(args)
+    base_url, session = init_config(args.edgerc, args.section, args.concurrency, args.rate_limit)
+    cps_object = cps(base_url,args.account_key)
+    enrollment_cache = EnrollmentCache(os.path.join(get_cache_dir(), 'setup'))
+    if not enrollment_cache.exists():
+        root_logger.info("Unable to find local cache. Please run 'setup' again")
+        exit(0)
+    with enrollment_cache:
+        enrollments_json_content = enrollment_cache.enrollments()
+
+    failed = 0
+    engine = FanOut(concurrency=args.concurrency, name='snapshot')
+    with SnapshotWriter(snapshot_file) as writer, Progress(console=console, transient=True) as progress:
+        task = progress.add_task('Fetching enrollments and deployments', total=len(enrollments_json_content))
+        results = engine.map(lambda enrollment_info: fetch_audit_details(cps_object, session, enrollment_info),
+                             enrollments_json_content,
+                             on_complete=lambda: progress.advance(task))
+        for every_enrollment_info, audit_details in zip(enrollments_json_content, results):
+            enrollmentId = every_enrollment_info['enrollmentId']
+            enrollment_details = audit_details['enrollment']
+            if enrollment_details.status_code != 200:
+                failed += 1
+                root_logger.debug('Invalid API Response (' + str(enrollment_details.status_code) + '): Unable to fetch enrollment-id: ' + str(enrollmentId))
+                continue
+            certResponse = audit_details['certificate']
+            deployment = certResponse.json() if certResponse.status_code == 200 else None
+            writer.add(enrollment_details.json(), every_enrollment_info['contractId'], enrollmentId, deployment)
+        writer.meta['section'] = args.section
+
+    root_logger.info('Snapshot of ' + str(writer.rows) + ' enrollments written to ' + snapshot_file)
+    if failed:
+        root_logger.info(str(failed) + ' enrollments could not be fetched, run snapshot again to include them')
+    root_logger.debug('Snapshot throughput: ' + engine.summary(unit='enrollments'))
+
+
+def query(args):
+    """
+    Method for handling query action. This method filters, sorts and aggregates the local snapshot without
+    calling the API. Conditions are SQL expressions on the snapshot columns, --show-columns lists them
+
+    Parameters
+    -----------
+    args : <string>
+        Default args parameter (usually no argument specified)
+    Returns
+    -------
+    None
+    """
+    snapshot_file = get_snapshot_file(args)
+    try:
+        with Snapshot(snapshot_file) as snapshot_db:
+            if args.show_columns:
+                columns, rows = ['column'], [[column] for column in snapshot_db.columns()]
+            elif args.sql:
+                columns, rows = snapshot_db.query(args.sql)
+            else:
+                columns, rows = snapshot_db.select(comma_separated(args.columns), args.where, comma_separated(args.sort),
+                                                   comma_separated(args.group_by),
+                                                   args.limit)
+            meta = snapshot_db.meta()
+    except SnapshotError as err:
+        root_logger.info(str(err))
+        if not os.path.isfile(snapshot_file):
+            root_logger.info("Run 'snapshot' to create it")
+        exit(1)
+
+    if args.json:
+        print(json.dumps([dict(zip(columns, row)) for row in rows], indent=4))
+    elif args.csv:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(columns)
+        writer.writerows(rows)
+    else:
+        table = Table(caption=f"{len(rows)} rows, snapshot of {meta.get('created')} UTC")
+        for column in columns:
+            table.add_column(column, overflow='fold')
+        for row in rows:
+            table.add_row(*['' if value is None else str(value) for value in row])
+        Console().print(table)
+
+
+def fetch_not_after(cps_object, session, enrollmentId):
+    """
+    Helper method that returns the expiration of the production certificate of an enrollment
+
+    Parameters
+    -----------
+    cps_object: <object>
+        Local CPS Object that has relevant http response
+    session : <object
+        An Edgegrid Auth (Akamai) object
+    enrollmentId : <int>
+        Enrollment Id of certificate/Enrollment
+    Returns
+    -------
+    result : <tuple>
+        Status code of the deployment response and the notAfter datetime (UTC), None when not deployed
+    """
+    # Only enrollments the deployment index considers stale get here, a deployment cached
+    # by the response cache could hide a renewal, so the live deployment is read
+    certResponse = cps_object.get_certificate(session, enrollmentId, fresh=True)
+    if certResponse.status_code == 200:
+        return certResponse.status_code, Deployment.from_json(certResponse.json(), enrollmentId).not_valid_after
+    return certResponse.status_code, None
+
+
+def expiring(args):
+    """
+    Method for handling expiring action. This method lists the production certificates expiring within
+    --within, grouped by week and contract. Expirations are kept in a local deployment index, only the
+    certificates not indexed yet or whose cached expiration falls inside the window are fetched again
+
+    Parameters
+    -----------
+    args : <string>
+        Default args parameter (usually no argument specified)
+    Returns
+    -------
+    None
+    """
+    try:
+        window = parse_window(args.within)
+    except ValueError as err:
+        root_logger.info(str(err))
+        exit(1)
+    now = utcnow()
+    until = now + window
+
+    enrollment_cache = EnrollmentCache(os.path.join(get_cache_dir(), 'setup'))
+    if not enrollment_cache.exists():
+        root_logger.info("Unable to find local cache. Please run 'setup' again")
+        exit(0)
+    with enrollment_cache:
+        enrollments_json_content = enrollment_cache.enrollments()
+
+    failed = 0
+    with DeploymentIndex(os.path.join(get_cache_dir(), 'setup')) as index:
+        index.retain(enrollments_json_content)
+        stale = enrollments_json_content if args.refresh else index.stale(enrollments_json_content, until)
+        root_logger.debug(str(len(stale)) + ' of ' + str(len(enrollments_json_content)) + ' production certificates to fetch')
+        if stale:
+            base_url, session = init_config(args.edgerc, args.section, args.concurrency, args.rate_limit)
+            cps_object = cps(base_url,args.account_key)
+            engine = FanOut(concurrency=args.concurrency, name='expiring')
+            with Progress(console=console, transient=True) as progress:
+                task = progress.add_task('Fetching production certificates', total=len(stale))
+                results = engine.map(lambda enrollment_info: fetch_not_after(cps_object, session, enrollment_info['enrollmentId']),
+                                     stale,
+                                     on_complete=lambda: progress.advance(task))
+                for every_enrollment_info, (status_code, not_after) in zip(stale, results):
+                    if status_code in (200, 404):
+                        index.update(every_enrollment_info, not_after)
+                    else:
+                        failed += 1
+                        root_logger.debug('Invalid API Response (' + str(status_code) + '): Unable to fetch certificate of enrollment-id: '
+                                          + str(every_enrollment_info['enrollmentId']))
+            root_logger.debug('Expiring throughput: ' + engine.summary(unit='certificates'))
+        buckets = bucket(index.expiring(until), now)
+
+    if args.json:
+        weeks = {}
+        for week, contracts in buckets.items():
+            weeks[week] = {contract_id: [dict(every_certificate, expiration=f"{every_certificate['expiration']:%Y-%m-%d %H:%M:%S}",
+                                              daysLeft=(every_certificate['expiration'] - now).days)
+                                         for every_certificate in certificates_of_contract]
+                           for contract_id, certificates_of_contract in contracts.items()}
+        print(json.dumps({'within': args.within, 'until': f'{until:%Y-%m-%d %H:%M:%S}', 'weeks': weeks}, indent=4))
+    else:
+        contract_ids = sorted({contract_id for contracts in buckets.values() for contract_id in contracts})
+        summary = Table(title=f'Production certificates expiring by {until:%Y-%m-%d}')
+        summary.add_column('Week of')
+        for contract_id in contract_ids:
+            summary.add_column(contract_id, justify='right')
+        summary.add_column('Total', justify='right')
+        details = Table()
+        for column in ['Week of', 'Contract', 'Enrollment ID', 'Common Name', 'Expiration (UTC)', 'Days left']:
+            details.add_column(column)
+        total = 0
+        for week, contracts in buckets.items():
+            counts = [len(contracts.get(contract_id, [])) for contract_id in contract_ids]
+            total += sum(counts)
+            summary.add_row(week, *[str(count) if count else '' for count in counts], str(sum(counts)))
+            for contract_id, certificates_of_contract in sorted(contracts.items()):
+                for every_certificate in certificates_of_contract:
+                    details.add_row(week, contract_id, str(every_certificate['enrollmentId']), every_certificate['cn'],
+                                    f"{every_certificate['expiration']:%Y-%m-%d %H:%M}",
+                                    str((every_certificate['expiration'] - now).days))
+        out = Console()
+        if total:
+            out.print(summary)
+            out.print(details)
+        root_logger.info(str(total) + ' production certificates expire within ' + args.within)
+    if failed:
+        root_logger.info(str(failed) + ' certificates could not be fetched, their last known expiration was used where there is one')
+
+
+def log_api_calls():
+    """
+    Log how many API calls the command made per endpoint, and how many were answered from the request memo
+    """
+    root_logger.debug('API calls of this command:\n' + request_memo.current().summary())
 
-        else:
-            root_logger.info("Unable to find local cache. Please run 'setup' again")
-            exit(0)
 
 def get_prog_name():
     prog = os.path.basename(sys.argv[0])
@@ -2211,7 +2787,10 @@ def get_cache_dir():
 
 if __name__ == '__main__':
     args = parser.get_args(args=None if sys.argv[1:] else ['--help'])
+    atexit.register(log_api_calls)
 
+    configure_cache(args)
+    configure_profiler(args)
 
     if args.command == 'list':
         list(args)
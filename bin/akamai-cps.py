@@ -1,38 +1,811 @@
 from __future__ import annotations
 
+import atexit
+import datetime
+import json
+import os
 import sys
 
-from akamai_apis.cps import Cps
-from akamai_apis.idm import IdentityAccessManagement
-from rich.console import Console
 from utils import cli_logging as lg
+from utils.enrollment_cache import contract_ids_of
+from utils.enrollment_cache import EnrollmentCache
+from utils.enrollment_cache import refresh_contract
+from utils.fanout import DEFAULT_CONCURRENCY
 from utils.parser import AkamaiParser as Parser
-from utils.utility import utility
 
-console = Console(stderr=True)
+# the enrollment fields of the list table
+LIST_FIELDS = ('cn', 'sans', 'validation_type', 'certificate_type', 'change_management', 'pending_changes')
 
 
+# rich, the API classes and requests are imported by the command that needs them,
+# parsing the command line and printing help stay cheap.
 def build_class_objects(logger, args):
+    """
+    The account name look up runs in the background while the command issues its first
+    CPS request, call result() on the returned future where the name is shown
+    """
+    from akamai_apis.cps import Cps
+    from akamai_apis.idm import IdentityAccessManagement
+    from utils.utility import utility
+
     idm = IdentityAccessManagement(logger, args)
-    account_name = idm()
+    account = idm.search_account_async()
     cps = Cps(logger, args)
     util = utility(logger)
-    return (account_name, cps, util)
+    return (account, cps, util)
+
+
+def cache_dir() -> str:
+    return os.getenv('AKAMAI_CLI_CACHE_DIR', os.curdir)
+
+
+def enrollment_cache() -> EnrollmentCache:
+    return EnrollmentCache(os.path.join(cache_dir(), 'setup'))
+
+
+def setup(args, logger, incremental=None, quiet=False):
+    """
+    Download the enrollments, CNs and SANs of every contract into the local enrollment cache.
+    Incrementally the cache is kept and only the contracts that changed are listed again,
+    ``quiet`` logs the progress at debug level for commands that refresh the cache on a miss.
+    """
+    from akamai_apis.cps import Cps
+
+    cps = Cps(logger, args)
+    if incremental is None:
+        incremental = args.incremental
+    max_age = getattr(args, 'contract_max_age', None) if incremental else None
+    log = logger.debug if quiet else logger.info
+
+    log(f'Trying to get contract details from [{cps.section}] section of {cps.edgerc_file}')
+    response = cps.get_contracts()
+    if response.status_code != 200:
+        logger.error(f'Invalid API Response ({response.status_code}): Unable to fetch contracts')
+        return 1
+
+    failed = 0
+    contract_ids = contract_ids_of(response.json())
+    with enrollment_cache() as cache:
+        if not incremental:
+            cache.clear()
+        # contracts removed from the account are dropped from the cache
+        cache.retain_contracts(contract_ids)
+        for contract_id in contract_ids:
+            if cache.is_fresh(contract_id, max_age):
+                logger.debug(f'Skipping recently refreshed contract: {contract_id}')
+                continue
+            response = refresh_contract(cache, cps.list_enrollments, contract_id, incremental)
+            if response.status_code == 304:
+                log(f'Contract {contract_id}: no changes since last setup')
+            elif response.status_code == 200:
+                log(f"Contract {contract_id}: {len(response.json()['enrollments'])} enrollments")
+            else:
+                # the other contracts may still have enrollments
+                failed += 1
+                logger.error(f'Invalid API Response ({response.status_code}): Unable to get enrollments of contract {contract_id}')
+
+    log(f'Enrollments details are stored in "{cache.db_file}"')
+    if not quiet:
+        logger.info("Run 'list' to see all enrollments")
+    return 1 if failed else None
+
+
+def find_in_cache(cn=None, enrollment_id=None) -> list:
+    """Cached enrollments with the enrollment-id, or whose CN or one of whose SANs is ``cn``"""
+    cache = enrollment_cache()
+    # a missing cache is a cache miss, the caller refreshes it
+    if not cache.exists():
+        return []
+    with cache:
+        if enrollment_id:
+            enrollment = cache.find_by_id(enrollment_id)
+            return [enrollment] if enrollment is not None else []
+        return cache.find_by_hostname(cn)
+
+
+def check_enrollment_id(args, logger, cn=None, enrollment_id=None) -> dict | None:
+    """
+    Look the enrollment up in the local cache by enrollment-id, or by CN or SAN hostname.
+    A miss refreshes the cache incrementally and looks again. Returns the cache entry
+    (cn, contractId, enrollmentId), None after logging why when there is no single match.
+    """
+    if not cn and not enrollment_id:
+        logger.error('common Name (--cn) or enrollment-id (--enrollment-id) is mandatory')
+        return None
+
+    found = find_in_cache(cn, enrollment_id)
+    if not found:
+        logger.debug(f'{enrollment_id or cn} not found in the local cache, refreshing it')
+        # only re-list the contracts that changed instead of re-scanning the whole account
+        setup(args, logger, incremental=True, quiet=True)
+        found = find_in_cache(cn, enrollment_id)
+
+    if len(found) > 1:
+        logger.error('More than 1 enrollment found for same CN. Please use --enrollment-id as input')
+        return None
+    if not found:
+        logger.error('Enrollment not found. Please double check common name (CN) or enrollment-id.')
+        return None
+    return found[0]
+
+
+def fetch_deployment(cps, logger, enrollment_id) -> dict | None:
+    """Production deployment (json) of the enrollment, None when it is not deployed"""
+    response = cps.get_certificate(enrollment_id)
+    if response.status_code == 200:
+        return response.json()
+    logger.debug(f'No production certificate for enrollment-id {enrollment_id} ({response.status_code})')
+    return None
+
+
+def prefetch_expirations(cps, logger, console, enrollment_ids, concurrency=DEFAULT_CONCURRENCY) -> dict:
+    """Production expiration date keyed by enrollment-id, the certificates are fetched in parallel"""
+    from utils.certificates import default_decoder
+    from utils.fanout import FanOut
+
+    engine = FanOut(concurrency=concurrency, name='list')
+    with lg.progress_bar(console, 'Fetching production expiration dates', total=len(enrollment_ids)) as advance:
+        deployments = [*engine.map(lambda enrollment_id: fetch_deployment(cps, logger, enrollment_id), enrollment_ids,
+                                   on_complete=advance)]
+    logger.debug(f"Expiration prefetch: {engine.summary(unit='certificates')}")
+    certificates = default_decoder().decode_deployments(deployments, concurrency)
+    return {enrollment_id: f'{certificate.not_valid_after:%Y-%m-%d %H:%M:%S} UTC'
+            for enrollment_id, certificate in zip(enrollment_ids, certificates) if certificate is not None}
+
+
+def list_row(enrollment) -> list:
+    """Enrollment ID, CN (SAN count), certificate type, in progress and test on staging first cells of an enrollment"""
+    cn = f'{enrollment.cn} ({len(enrollment.sans)})' if len(enrollment.sans) > 1 else enrollment.cn
+    certificate_type = enrollment.validation_type
+    if certificate_type != 'third-party':
+        certificate_type = f'{certificate_type} {enrollment.certificate_type}'
+    if enrollment.pending_changes:
+        return [f'*{enrollment.id}*', cn, certificate_type, '*Yes*', 'Yes' if enrollment.change_management else 'No']
+    return [enrollment.id, cn, certificate_type, 'No', 'Yes' if enrollment.change_management else 'No']
 
 
 def list(args, logger):
-    account_name, cps, util = build_class_objects(logger, args)
-    header_msg = f'\nAccount: {account_name}\n'
+    account, cps, util = build_class_objects(logger, args)
+    response = cps.list_enrollments()
+    header_msg = f'\nAccount: {account.result()}\n'
     header_title = 'CPS CLI: [i]List Enrollments[/i]'
+    console = lg.get_console()
     lg.console_panel(console, header_msg, header_title, align='center')
     console.print()
+    if response.status_code != 200:
+        logger.error(f'Invalid API Response ({response.status_code}): Could not list enrollments')
+        return 1
+
+    from akamai_apis.models import Enrollment
+    from prettytable import PrettyTable
+
+    enrollments = [Enrollment.from_json(enrollment, fields=LIST_FIELDS)
+                   for enrollment in response.json()['enrollments'] if 'csr' in enrollment]
+    columns = ['Enrollment ID', 'Common Name (SAN Count)', 'Certificate Type', '*In-Progress*', 'Test on Staging First']
+    expirations = None
+    if args.show_expiration:
+        columns.append('Expiration')
+        logger.info('Fetching list with production expiration dates. Please wait...')
+        expirations = prefetch_expirations(cps, logger, console, [enrollment.id for enrollment in enrollments], args.concurrency)
+
+    table = PrettyTable(columns)
+    table.align = 'l'
+    for enrollment in enrollments:
+        row = list_row(enrollment)
+        if expirations is not None:
+            row.append(expirations.get(enrollment.id, ''))
+        table.add_row(row)
+    print(table)
+    print('\n** means enrollment has existing pending changes\n')
+
+
+def retrieve_enrollment(args, logger):
+    enrollment = check_enrollment_id(args, logger, args.cn, args.enrollment_id)
+    if enrollment is None:
+        return 1
+
+    from akamai_apis.cps import Cps
+
+    logger.info(f"Getting details for {enrollment['cn']} with enrollment-id: {enrollment['enrollmentId']}")
+    response = Cps(logger, args).get_enrollment(enrollment['enrollmentId'])
+    if response.status_code != 200:
+        logger.error(f'Invalid API Response ({response.status_code}): Unable to fetch enrollment details')
+        return 1
+
+    if args.yaml:
+        import yaml
+        print(yaml.dump(response.json(), default_flow_style=False))
+    else:
+        print(json.dumps(response.json(), indent=4))
+
+
+def show_change_status(change_status_json: dict, logger):
+    from akamai_apis.models import Change
+
+    change = Change.from_json(change_status_json)
+    logger.info(f'Current State = {change.state}')
+    logger.info(f'Current Status = {change.status}')
+    logger.info(f'Description = {change.description}')
+    if change.state == 'error':
+        # nothing the user can do, the change probably has to be cancelled and started over
+        if change.error:
+            logger.info(f"Error Code = {change.error.get('code')}")
+            logger.info(f"Error Description = {change.error.get('description')}")
+        logger.error('There is an error and cannot proceed. Please cancel and try again or contact an Akamai representative.')
+    elif change.next_input:
+        logger.info(f"Waiting for input: {change.next_input}, run 'proceed' once it is provided")
+    else:
+        logger.info('Changes are in-progress and any user input steps are not required at this time or not ready yet. '
+                    'Please check back later...')
+
+
+def status_watch(args, logger, cps, enrollment_id, change_id) -> int:
+    """
+    Poll the change status until the change completes, fails, is cancelled or waits for input, only the
+    change status is requested per poll. Returns the watch exit code of the final state, 1 when the
+    change status cannot be read.
+    """
+    from contextlib import nullcontext
+    from utils.status_dashboard import pending_change_id
+    from utils.watch import ChangeWatcher
+    from utils.watch import WATCH_COMPLETE
+    from utils.watch import WatchError
+
+    def poll():
+        response = cps.get_change_status(enrollment_id, change_id)
+        if response.status_code == 404:
+            # the change is gone, it either completed or was removed outside of the watch.
+            # status read the enrollment when it started, ask for the live one
+            enrollment = cps.get_enrollment(enrollment_id, fresh=True)
+            if enrollment.status_code == 200 and change_id not in [pending_change_id([change]) for change in
+                                                                   enrollment.json().get('pendingChanges') or []]:
+                return {'statusInfo': {'state': 'complete', 'status': 'complete',
+                                       'description': 'The change is no longer pending'}, 'allowedInput': []}
+        if response.status_code != 200:
+            raise WatchError(f'Invalid API Response ({response.status_code}): Unable to determine change status details')
+        return response.json()
+
+    last_status = {}
+
+    def on_update(change_status_json, next_poll_in):
+        status_info = change_status_json.get('statusInfo') or {}
+        if status_info != last_status.get('statusInfo'):
+            logger.info(f"Change {change_id}: state = {status_info.get('state')}, status = {status_info.get('status')}"
+                        f" - {status_info.get('description', '')}")
+            last_status['statusInfo'] = status_info
+        if spinner is not None and next_poll_in is not None:
+            spinner.update(f'Watching change {change_id}, next check in {round(next_poll_in)}s')
+
+    logger.info(f'Watching change {change_id} of enrollment-id {enrollment_id}, press Ctrl+C to stop')
+    watcher = ChangeWatcher(poll, timeout=args.watch_timeout)
+    # plain output has no spinner, every state change is logged
+    with nullcontext() if lg.is_plain() else lg.get_console().status(f'Watching change {change_id}') as spinner:
+        try:
+            code, change_status_json = watcher.watch(on_update)
+        except WatchError as err:
+            logger.error(err)
+            return 1
+
+    if code == WATCH_COMPLETE:
+        logger.info('The change is complete.')
+    else:
+        state = (change_status_json.get('statusInfo') or {}).get('state')
+        logger.info(f"Stopped watching in state {state} after {watcher.polls} checks. Run 'status' for details.")
+    return code
+
+
+def status_batch(args, logger):
+    """
+    Change status of every enrollment with a pending change (--all-pending) and/or of the enrollments
+    listed in a file (--enrollment-ids), fetched on a fan-out of --concurrency workers. One table groups
+    them by change state and allowed input, redrawn as the change statuses come in on a terminal.
+    """
+    from akamai_apis.cps import Cps
+    from utils.fanout import FanOut
+    from utils.status_dashboard import fetch_change_summary
+    from utils.status_dashboard import read_enrollment_ids
+    from utils.status_dashboard import StatusDashboard
+
+    cps = Cps(logger, args)
+    enrollments = {}
+    if args.all_pending:
+        # one list call tells which enrollments have a pending change and where to find it
+        response = cps.list_enrollments()
+        if response.status_code != 200:
+            logger.error(f'Invalid API Response ({response.status_code}): Could not list enrollments')
+            return 1
+        for enrollment in response.json()['enrollments']:
+            if enrollment.get('pendingChanges'):
+                enrollment_id = int(enrollment['location'].split('/')[-1])
+                enrollments[enrollment_id] = {'enrollmentId': enrollment_id, 'cn': (enrollment.get('csr') or {}).get('cn', ''),
+                                              'pendingChanges': enrollment['pendingChanges']}
+    if args.enrollment_ids:
+        try:
+            enrollment_ids = read_enrollment_ids(args.enrollment_ids)
+        except FileNotFoundError:
+            logger.error(f'Filename: {args.enrollment_ids} is not found')
+            return 1
+        except ValueError as err:
+            logger.error(f'Invalid enrollment-id in {args.enrollment_ids}: {err}')
+            return 1
+        for enrollment_id in enrollment_ids:
+            enrollments.setdefault(enrollment_id, {'enrollmentId': enrollment_id, 'cn': ''})
+    if not enrollments:
+        logger.info('There are no enrollments with pending changes.')
+        return None
+
+    enrollment_infos = [enrollments[enrollment_id] for enrollment_id in sorted(enrollments)]
+    dashboard = StatusDashboard('CPS change status', total=len(enrollment_infos))
+    engine = FanOut(concurrency=args.concurrency, name='status')
+    rows = engine.map(lambda enrollment_info: fetch_change_summary(cps, enrollment_info), enrollment_infos)
+    if lg.is_plain():
+        for row in rows:
+            dashboard.add(row)
+        print(dashboard.text())
+    else:
+        from rich.live import Live
+
+        with Live(dashboard, console=lg.get_console(), refresh_per_second=4):
+            for row in rows:
+                dashboard.add(row)
+    logger.debug(f"Status throughput: {engine.summary(unit='enrollments')}")
+
+
+def status(args, logger):
+    """
+    Change status of the pending change of an enrollment. The enrollment is read once to find
+    its pending change, then only the change status is requested, once or with --watch until the
+    change stops (the exit code tells how). --all-pending and --enrollment-ids show the change
+    status of many enrollments at once.
+    """
+    if args.all_pending or args.enrollment_ids:
+        return status_batch(args, logger)
+    entry = check_enrollment_id(args, logger, args.cn, args.enrollment_id)
+    if entry is None:
+        return 1
+
+    from akamai_apis.cps import Cps
+    from utils.status_dashboard import pending_change_id
+
+    cps = Cps(logger, args)
+    enrollment_id = entry['enrollmentId']
+    logger.info(f"Getting enrollment for {entry['cn']} with enrollment-id: {enrollment_id}")
+    response = cps.get_enrollment(enrollment_id)
+    if response.status_code != 200:
+        logger.error(f'Invalid API Response ({response.status_code}): Unable to get enrollment details')
+        return 1
+    change_id = pending_change_id(response.json().get('pendingChanges'))
+    if change_id is None:
+        logger.info('The certificate is active, there are no current pending changes.')
+        return None
+    if args.watch:
+        # the pending change is resolved once, then only its status is polled
+        return status_watch(args, logger, cps, enrollment_id, change_id)
+
+    logger.info(f'Getting change status for changeId: {change_id}')
+    response = cps.get_change_status(enrollment_id, change_id)
+    if response.status_code != 200:
+        logger.error(f'Invalid API Response ({response.status_code}): Unable to determine change status details')
+        return 1
+    show_change_status(response.json(), logger)
+
+
+def audit_output_file(args) -> str:
+    """--output-file, by default a timestamped csv file in the audit directory"""
+    if args.output_file:
+        return args.output_file
+    os.makedirs('audit', exist_ok=True)
+    return os.path.join('audit', f'CPSAudit_{datetime.datetime.now():%Y%m%d_%H%M%S}.csv')
+
+
+def audit(args, logger):
+    """
+    Audit report of every enrollment of the local cache, csv by default, xlsx with --xlsx and json with --json.
+    The enrollments are fetched on a fan-out of --concurrency workers and the rows are written
+    in cache order as they come in, straight into the workbook for xlsx. --ndjson writes one
+    object per enrollment instead. An output file of - streams the csv or ndjson report to stdout.
+    Finished enrollments of a csv, xlsx or json report are checkpointed in a journal next to the
+    output file, --resume continues an interrupted audit from it. An ndjson report is its own
+    checkpoint, --resume skips the enrollments already in it.
+    """
+    from akamai_apis.cps import Cps
+    from utils.audit import AUDIT_CHANGE_COLUMNS
+    from utils.audit import AUDIT_COLUMNS
+    from utils.audit import audit_row
+    from utils.audit import change_details
+    from utils.audit import fetch_audit_details
+    from utils.audit import NOT_APPLICABLE
+    from utils.certificates import decode
+    from utils.checkpoint import CheckpointJournal
+    from utils.fanout import FanOut
+    from utils.report import CsvReport
+    from utils.report import NdjsonReport
+    from utils.report import STDOUT
+    from utils.report import XlsxReport
+
+    if args.ndjson and (args.json or args.xlsx):
+        logger.error('--ndjson cannot be combined with --json or --xlsx, run the audit once per format')
+        return 1
+    if args.resume and not args.output_file:
+        # the default output file is timestamped, a new run would never find the interrupted one
+        logger.error('--resume needs the --output-file of the interrupted audit')
+        return 1
+    output_file = audit_output_file(args)
+    if output_file == STDOUT and (args.xlsx or args.json):
+        logger.error('Only the csv and ndjson formats can be streamed to stdout, please specify --output-file')
+        return 1
+    xlsx_file = f"{output_file.removesuffix('.csv').removesuffix('.xlsx').removesuffix('.xls')}.xlsx"
+    json_file = f"{output_file.removesuffix('.csv').removesuffix('.json')}.json"
+    if output_file == STDOUT or output_file.endswith(('.ndjson', '.jsonl')):
+        ndjson_file = output_file
+    else:
+        ndjson_file = f"{output_file.removesuffix('.csv')}.ndjson"
+
+    cache = enrollment_cache()
+    if not cache.exists():
+        logger.error("Unable to find local cache. Please run 'setup' again")
+        return 1
+    with cache:
+        enrollments = cache.enrollments()
+
+    header = [*AUDIT_COLUMNS]
+    if args.include_change_details:
+        header.extend(AUDIT_CHANGE_COLUMNS)
+
+    cps = Cps(logger, args)
+    logger.info('Generating CPS audit file...')
+    engine = FanOut(concurrency=args.concurrency, name='audit')
+    records = []
+    failed = 0
+    if args.ndjson:
+        report = NdjsonReport(ndjson_file, resume=args.resume)
+    elif args.xlsx:
+        # constant memory workbook, every row is flushed to disk once the next one starts
+        report = XlsxReport(xlsx_file, header)
+    else:
+        report = CsvReport(output_file, header)
+    journal = None
+    if not args.ndjson and output_file != STDOUT:
+        journal = CheckpointJournal(f'{xlsx_file if args.xlsx else output_file}.journal', header)
+        journal.open(resume=args.resume)
+    with report:
+        completed = set()
+        if args.ndjson and report.completed:
+            # enrollments already written by the interrupted run are not fetched again
+            logger.info(f'Skipping {len(report.completed)} enrollments already in {ndjson_file}')
+            completed = report.completed
+        elif journal is not None and journal.entries:
+            # replay the enrollments finished before the interruption, only the missing ones are fetched
+            logger.info(f'Resuming from checkpoint, {len(journal.entries)} enrollments already audited')
+            for journal_entry in journal.entries:
+                report.write(journal_entry['row'])
+                if args.json and 'record' in journal_entry:
+                    records.append(journal_entry['record'])
+            completed = journal.completed
+        if completed:
+            enrollments = [entry for entry in enrollments if entry['enrollmentId'] not in completed]
+        try:
+            results = engine.map(lambda entry: fetch_audit_details(cps, entry['enrollmentId'], args.include_change_details),
+                                 enrollments)
+            for count, (entry, audit_details) in enumerate(zip(enrollments, results), start=1):
+                enrollment_id = entry['enrollmentId']
+                logger.info(f"Processing {count} of {len(enrollments)}: Common Name (CN): {entry['cn']}")
+                response = audit_details['enrollment']
+                if response.status_code != 200:
+                    failed += 1
+                    logger.error(f'Invalid API Response ({response.status_code}): '
+                                 f'Unable to fetch enrollment details for enrollment-id: {enrollment_id}')
+                    continue
+
+                enrollment = response.json()
+                enrollment['contractId'] = entry['contractId']
+                certificate = audit_details['certificate']
+                expiration = ''
+                if certificate.status_code == 200:
+                    deployment = certificate.json()
+                    expiration = decode(deployment['certificate']).not_valid_after
+                    # the json format reuses the production deployment fetched for the row
+                    enrollment['productionDeployment'] = deployment
+                else:
+                    logger.debug(f'Invalid API Response ({certificate.status_code}): '
+                                 f'no production certificate for enrollment-id: {enrollment_id}')
+
+                details = None
+                if args.include_change_details:
+                    details = change_details(audit_details)
+                    if details is None:
+                        logger.warning(f'Unable to determine change status for enrollment {enrollment_id} '
+                                       f"with change Id {audit_details['change_id']}")
+                        details = [NOT_APPLICABLE, NOT_APPLICABLE]
+                if args.ndjson:
+                    # one compact object per enrollment, written as soon as it is fetched
+                    enrollment['enrollmentId'] = enrollment_id
+                    if details is not None:
+                        enrollment['changeStatusDetails'], enrollment['orderId'] = details
+                    report.write(enrollment)
+                else:
+                    row = audit_row(enrollment, entry['contractId'], enrollment_id, expiration, details)
+                    report.write(row)
+                if args.json:
+                    records.append(enrollment)
+                if journal is not None:
+                    journal.record(enrollment_id, row, enrollment if args.json else None)
+        except KeyboardInterrupt:
+            if journal is not None:
+                journal.close()
+                logger.error(f'Audit interrupted. Run it again with --resume to continue from {journal.path}')
+            elif args.ndjson and ndjson_file != STDOUT:
+                logger.error(f'Audit interrupted. Run it again with --resume to continue {ndjson_file}')
+            return 1
+
+    logger.info(f"Audit throughput: {engine.summary(unit='enrollments')}")
+    if args.json:
+        with open(json_file, 'w') as f:
+            json.dump(records, f, indent=4)
+        logger.info(f'Done! Output file written here: {json_file}')
+    if args.xlsx:
+        logger.info(f'Done! Output file written here: {xlsx_file}')
+    elif args.ndjson:
+        if ndjson_file != STDOUT:
+            logger.info(f'Done! Output file written here: {ndjson_file}')
+    elif not args.json and output_file != STDOUT:
+        logger.info(f'Done! Output file written here: {output_file}')
+    # the report is complete
+    if journal is not None:
+        journal.discard()
+    return 1 if failed else None
+
+
+def comma_separated(value) -> list | None:
+    return [item.strip() for item in value.split(',') if item.strip()] if value else None
+
+
+def snapshot_file(args) -> str:
+    """--snapshot-file, by default snapshot/snapshot.db in the cache directory"""
+    return args.snapshot_file or os.path.join(cache_dir(), 'snapshot', 'snapshot.db')
+
+
+def snapshot(args, logger):
+    """
+    Every enrollment of the local cache and its production deployment, fetched on a fan-out of
+    --concurrency workers and stored with the columns of the audit report in a local SQLite
+    snapshot that query reads offline. The previous snapshot is replaced once the new one is complete.
+    """
+    from akamai_apis.cps import Cps
+    from utils.audit import fetch_audit_details
+    from utils.fanout import FanOut
+    from utils.snapshot import SnapshotWriter
+
+    cache = enrollment_cache()
+    if not cache.exists():
+        logger.error("Unable to find local cache. Please run 'setup' again")
+        return 1
+    with cache:
+        enrollments = cache.enrollments()
+
+    cps = Cps(logger, args)
+    db_file = snapshot_file(args)
+    failed = 0
+    engine = FanOut(concurrency=args.concurrency, name='snapshot')
+    with SnapshotWriter(db_file) as writer, \
+            lg.progress_bar(lg.get_console(), 'Fetching enrollments and deployments', total=len(enrollments)) as advance:
+        # the certificates are decoded on the workers, the rows reuse the memoized certificates
+        results = engine.map(lambda entry: fetch_audit_details(cps, entry['enrollmentId']), enrollments, on_complete=advance)
+        for entry, audit_details in zip(enrollments, results):
+            enrollment_id = entry['enrollmentId']
+            response = audit_details['enrollment']
+            if response.status_code != 200:
+                failed += 1
+                logger.debug(f'Invalid API Response ({response.status_code}): Unable to fetch enrollment-id: {enrollment_id}')
+                continue
+            certificate = audit_details['certificate']
+            deployment = certificate.json() if certificate.status_code == 200 else None
+            writer.add(response.json(), entry['contractId'], enrollment_id, deployment)
+        writer.meta['section'] = args.section
+
+    logger.info(f'Snapshot of {writer.rows} enrollments written to {db_file}')
+    logger.debug(f"Snapshot throughput: {engine.summary(unit='enrollments')}")
+    if failed:
+        logger.error(f'{failed} enrollments could not be fetched, run snapshot again to include them')
+        return 1
+
+
+def query(args, logger):
+    """
+    Filter, sort and aggregate the local snapshot without calling the API. Conditions are
+    SQL expressions on the snapshot columns, --show-columns lists them.
+    """
+    from utils.snapshot import Snapshot
+    from utils.snapshot import SnapshotError
+
+    db_file = snapshot_file(args)
+    try:
+        with Snapshot(db_file) as db:
+            if args.show_columns:
+                columns, rows = ['column'], [[column] for column in db.columns()]
+            elif args.sql:
+                columns, rows = db.query(args.sql)
+            else:
+                columns, rows = db.select(comma_separated(args.columns), args.where, comma_separated(args.sort),
+                                          comma_separated(args.group_by), args.limit)
+            meta = db.meta()
+    except SnapshotError as err:
+        logger.error(str(err))
+        if not os.path.isfile(db_file):
+            logger.error("Run 'snapshot' to create it")
+        return 1
+
+    caption = f"{len(rows)} rows, snapshot of {meta.get('created')} UTC"
+    if args.json:
+        print(json.dumps([dict(zip(columns, row)) for row in rows], indent=4))
+    elif args.csv:
+        import csv
+
+        writer = csv.writer(sys.stdout)
+        writer.writerow(columns)
+        writer.writerows(rows)
+    elif lg.is_plain():
+        from prettytable import PrettyTable
+
+        table = PrettyTable(columns)
+        table.align = 'l'
+        for row in rows:
+            table.add_row(['' if value is None else value for value in row])
+        print(table)
+        print(caption)
+    else:
+        from rich.console import Console
+        from rich.table import Table
+
+        table = Table(caption=caption)
+        for column in columns:
+            table.add_column(column, overflow='fold')
+        for row in rows:
+            table.add_row(*['' if value is None else str(value) for value in row])
+        # the rows are the output of the command, the logging console writes to stderr
+        Console().print(table)
+
+
+def fetch_not_after(cps, enrollment_id) -> tuple:
+    """Status code of the production deployment and its notAfter (UTC), None when it is not deployed"""
+    from akamai_apis.models import Deployment
+
+    # only enrollments the deployment index considers stale get here, a deployment kept
+    # by the response cache could hide a renewal, so the live deployment is read
+    response = cps.get_certificate(enrollment_id, fresh=True)
+    if response.status_code == 200:
+        return response.status_code, Deployment.from_json(response.json(), enrollment_id).not_valid_after
+    return response.status_code, None
+
+
+def expiring(args, logger):
+    """
+    Production certificates expiring within --within, grouped by week and contract. Expirations are
+    kept in a local deployment index, only the certificates not indexed yet, expiring inside the window
+    or indexed too long ago are fetched again, on a fan-out of --concurrency workers.
+    """
+    from utils.expirations import bucket
+    from utils.expirations import DeploymentIndex
+    from utils.expirations import parse_window
+    from utils.expirations import utcnow
+
+    try:
+        window = parse_window(args.within)
+    except ValueError as err:
+        logger.error(str(err))
+        return 1
+    now = utcnow()
+    until = now + window
+
+    cache = enrollment_cache()
+    if not cache.exists():
+        logger.error("Unable to find local cache. Please run 'setup' again")
+        return 1
+    with cache:
+        enrollments = cache.enrollments()
+
+    failed = 0
+    with DeploymentIndex(os.path.join(cache_dir(), 'setup')) as index:
+        index.retain(enrollments)
+        stale = enrollments if args.refresh else index.stale(enrollments, until)
+        logger.debug(f'{len(stale)} of {len(enrollments)} production certificates to fetch')
+        if stale:
+            from akamai_apis.cps import Cps
+            from utils.fanout import FanOut
+
+            cps = Cps(logger, args)
+            engine = FanOut(concurrency=args.concurrency, name='expiring')
+            with lg.progress_bar(lg.get_console(), 'Fetching production certificates', total=len(stale)) as advance:
+                results = engine.map(lambda entry: fetch_not_after(cps, entry['enrollmentId']), stale, on_complete=advance)
+                for entry, (status_code, not_after) in zip(stale, results):
+                    if status_code in (200, 404):
+                        index.update(entry, not_after)
+                    else:
+                        failed += 1
+                        logger.debug(f'Invalid API Response ({status_code}): '
+                                     f"Unable to fetch certificate of enrollment-id: {entry['enrollmentId']}")
+            logger.debug(f"Expiring throughput: {engine.summary(unit='certificates')}")
+        buckets = bucket(index.expiring(until), now)
+
+    if args.json:
+        weeks = {week: {contract_id: [dict(certificate, expiration=f"{certificate['expiration']:%Y-%m-%d %H:%M:%S}",
+                                           daysLeft=(certificate['expiration'] - now).days)
+                                      for certificate in certificates]
+                        for contract_id, certificates in contracts.items()}
+                 for week, contracts in buckets.items()}
+        print(json.dumps({'within': args.within, 'until': f'{until:%Y-%m-%d %H:%M:%S}', 'weeks': weeks}, indent=4))
+    else:
+        contract_ids = sorted({contract_id for contracts in buckets.values() for contract_id in contracts})
+        summary_columns = ['Week of', *contract_ids, 'Total']
+        details_columns = ['Week of', 'Contract', 'Enrollment ID', 'Common Name', 'Expiration (UTC)', 'Days left']
+        summary_rows, details_rows = [], []
+        for week, contracts in buckets.items():
+            counts = [len(contracts.get(contract_id, [])) for contract_id in contract_ids]
+            summary_rows.append([week, *[str(count) if count else '' for count in counts], str(sum(counts))])
+            for contract_id, certificates in sorted(contracts.items()):
+                for certificate in certificates:
+                    details_rows.append([week, contract_id, str(certificate['enrollmentId']), certificate['cn'],
+                                         f"{certificate['expiration']:%Y-%m-%d %H:%M}", str((certificate['expiration'] - now).days)])
+        title = f'Production certificates expiring by {until:%Y-%m-%d}'
+        if details_rows and lg.is_plain():
+            from prettytable import PrettyTable
+
+            print(title)
+            summary = PrettyTable(summary_columns)
+            details = PrettyTable(details_columns)
+            for table, rows in ((summary, summary_rows), (details, details_rows)):
+                table.align = 'l'
+                for row in rows:
+                    table.add_row(row)
+                print(table)
+        elif details_rows:
+            from rich.console import Console
+            from rich.table import Table
+
+            summary = Table(title=title)
+            summary.add_column('Week of')
+            for column in summary_columns[1:]:
+                summary.add_column(column, justify='right')
+            details = Table()
+            for column in details_columns:
+                details.add_column(column)
+            for table, rows in ((summary, summary_rows), (details, details_rows)):
+                for row in rows:
+                    table.add_row(*row)
+                Console().print(table)
+        logger.info(f'{len(details_rows)} production certificates expire within {args.within}')
+    if failed:
+        logger.error(f'{failed} certificates could not be fetched, their last known expiration was used where there is one')
+        return 1
+
+
+def report_profile(profiler, command, profile_output=None):
+    print(f'\nAPI profile of {command}:\n{profiler.format_summary()}', file=sys.stderr)
+    if profile_output:
+        profiler.dump(profile_output, command)
+        print(f'Request samples written to {profile_output}', file=sys.stderr)
+
+
+commands = {'setup': setup, 'list': list, 'retrieve-enrollment': retrieve_enrollment, 'status': status,
+            'audit': audit, 'snapshot': snapshot, 'query': query, 'expiring': expiring}
 
 
 if __name__ == '__main__':
     args = Parser.get_args(args=None if sys.argv[1:] else ['--help'])
     account_switch_key, section, edgerc = args.account_switch_key, args.section, args.edgerc
 
+    lg.use_plain_output(args.plain or not sys.stderr.isatty())
     logger = lg.setup_logger(args)
+    from akamai_apis import idm
+    from akamai_apis import instrumentation
+    from akamai_apis import request_memo
+    from akamai_apis import response_cache
+    atexit.register(lambda: logger.debug(f'API calls of this command:\n{request_memo.current().summary()}'))
+    if args.profile or args.profile_output:
+        atexit.register(report_profile, instrumentation.configure(), args.command, args.profile_output)
+    response_cache.configure(os.path.join(cache_dir(), 'cache'), enabled=not args.no_cache, max_age=args.max_age)
+    idm.configure(os.path.join(cache_dir(), 'idm'), enabled=not args.no_cache)
 
-    if args.command == 'list':
-        done = list(args, logger)
+    if args.command in commands:
+        # a command returns its exit code, None when it succeeded
+        sys.exit(commands[args.command](args, logger))
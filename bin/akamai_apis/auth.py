@@ -1,14 +1,306 @@
 from __future__ import annotations
 
 import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from datetime import timezone
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 
 import requests
 from akamai.edgegrid import EdgeGridAuth
 from akamai.edgegrid import EdgeRc
+from akamai_apis import instrumentation
+from akamai_apis import request_memo
+from akamai_apis.defaults import DEFAULT_MAX_RETRIES
+from akamai_apis.defaults import DEFAULT_POOL_SIZE
+from akamai_apis.defaults import DEFAULT_RATE_LIMIT
+from akamai_apis.request_memo import RequestMemo
+from akamai_apis.response_cache import default_cache
+from akamai_apis.response_cache import ResponseCache
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every request of a session.
+
+    ``rate`` tokens are added per second up to ``capacity``. A falsy rate disables
+    throttling, but ``block_until`` still pauses every caller, which is how a
+    rate-limit response from one worker holds back the whole fan-out.
+    """
+
+    def __init__(self, rate: float | None = None, capacity: float | None = None,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate or 1.0)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Take a token without waiting, returns 0 on success or the seconds to wait before trying again"""
+        with self.lock:
+            now = self.clock()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if not self.rate:
+                return 0.0
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # tolerate float rounding so a refill never ends up waiting for a fraction of a token
+            if self.tokens >= 1 - 1e-9:
+                self.tokens = max(0.0, self.tokens - 1)
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            self.sleep(wait)
+
+    async def acquire_async(self):
+        """acquire() for coroutines, waits on the event loop instead of blocking the thread"""
+        import asyncio
+
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def block_for(self, seconds: float):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+
+class RequestScheduler:
+    """
+    Sends requests through a shared token bucket and retries throttled or failed ones.
+
+    HTTP 429 is retried for every method, honouring ``Retry-After`` and
+    ``Akamai-RateLimit-Next``. Server errors and connection errors are only
+    retried for idempotent methods, with exponential backoff and full jitter.
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+    def __init__(self, rate_limit: float | None = DEFAULT_RATE_LIMIT,
+                 max_retries: int | None = DEFAULT_MAX_RETRIES,
+                 backoff_base: float | None = 0.5, backoff_max: float | None = 60.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.bucket = TokenBucket(rate_limit, clock=clock, sleep=sleep)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sleep = sleep
+        self.retries = 0
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @staticmethod
+    def _seconds_until(value: str) -> float | None:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            try:
+                when = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+    def retry_delay(self, response, attempt: int) -> float:
+        for header in ('Retry-After', 'Akamai-RateLimit-Next'):
+            if response.headers.get(header):
+                delay = self._seconds_until(response.headers[header])
+                if delay is not None:
+                    return min(self.backoff_max, delay)
+        return self.backoff(attempt)
+
+    def observe(self, response):
+        """Pause ahead of time when the account has no requests left in the current window"""
+        if response.headers.get('Akamai-RateLimit-Remaining') == '0' and response.headers.get('Akamai-RateLimit-Next'):
+            delay = self._seconds_until(response.headers['Akamai-RateLimit-Next'])
+            if delay:
+                self.bucket.block_for(min(self.backoff_max, delay))
+
+    def _retry(self, method: str, attempt: int, response=None, error: Exception | None = None):
+        """Return (throttled, reason, delay) when the request should be sent again, None when it is final"""
+        idempotent = method.upper() in self.IDEMPOTENT_METHODS
+        if error is not None:
+            if not idempotent or attempt >= self.max_retries:
+                return None
+            return False, type(error).__name__, self.backoff(attempt)
+        self.observe(response)
+        status = response.status_code
+        throttled = status == 429
+        if status not in self.RETRY_STATUSES or attempt >= self.max_retries or not (throttled or idempotent):
+            return None
+        return throttled, f'HTTP {status}', self.retry_delay(response, attempt)
+
+    def _log_retry(self, method: str, url: str, attempt: int, reason: str, delay: float):
+        self.retries += 1
+        logger.warning(f'{reason} for {method.upper()} {url}, retry {attempt} of {self.max_retries} in {delay:.1f}s')
+
+    def send(self, method: str, url: str, send):
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                response = send()
+            except (requests.ConnectionError, requests.Timeout) as err:
+                # a read timeout is not a ConnectionError, the server may just be slow under load
+                retry = self._retry(method, attempt, error=err)
+                if retry is None:
+                    raise
+            else:
+                retry = self._retry(method, attempt, response)
+                if retry is None:
+                    return response
+
+            throttled, reason, delay = retry
+            attempt += 1
+            self._log_retry(method, url, attempt, reason, delay)
+            if throttled:
+                # hold back every worker sharing this session, not only this one
+                self.bucket.block_for(delay)
+            else:
+                self.sleep(delay)
+
+    async def send_async(self, method: str, url: str, send, connection_errors: tuple = (ConnectionError,)):
+        """send() for coroutines, ``send`` is a coroutine function and waits happen on the event loop"""
+        import asyncio
+
+        attempt = 0
+        while True:
+            await self.bucket.acquire_async()
+            try:
+                response = await send()
+            except connection_errors as err:
+                retry = self._retry(method, attempt, error=err)
+                if retry is None:
+                    raise
+            else:
+                retry = self._retry(method, attempt, response)
+                if retry is None:
+                    return response
+
+            throttled, reason, delay = retry
+            attempt += 1
+            self._log_retry(method, url, attempt, reason, delay)
+            if throttled:
+                self.bucket.block_for(delay)
+            else:
+                await asyncio.sleep(delay)
+
+
+class ScheduledSession(requests.Session):
+    """
+    requests.Session that sends every request through a RequestScheduler.
+
+    GETs are answered from the invocation's RequestMemo when the same resource
+    was already fetched, and counted in it when they go out. Requests that go
+    out are recorded by the profiler when ``--profile`` turned it on. When a
+    ResponseCache is attached, GETs of read-only endpoints are answered from it
+    and any write request drops the cached responses of its enrollment.
+    """
+
+    def __init__(self, scheduler: RequestScheduler | None = None, cache: ResponseCache | None = None,
+                 memo: RequestMemo | None = None):
+        super().__init__()
+        self.scheduler = scheduler or RequestScheduler()
+        self.response_cache = cache
+        self.memo = memo
+
+    def _send(self, method, url, *args, **kwargs):
+        if self.memo is not None:
+            self.memo.count(method, url)
+
+        def send(attempt=None):
+            def request():
+                if attempt is not None:
+                    attempt()
+                return super(ScheduledSession, self).request(method, url, *args, **kwargs)
+            return self.scheduler.send(method, url, request)
+
+        profiler = instrumentation.current()
+        return send() if profiler is None else profiler.measure(method, url, send)
+
+    def _fetch(self, method, url, *args, **kwargs):
+        if self.response_cache is not None:
+            if method.upper() == 'GET' and not args:
+                return self.response_cache.get(url, kwargs, lambda cache_kwargs: self._send(method, url, **cache_kwargs))
+            if method.upper() != 'GET':
+                self.response_cache.invalidate(url)
+        return self._send(method, url, *args, **kwargs)
+
+    def request(self, method, url, *args, **kwargs):
+        if self.memo is not None:
+            if method.upper() == 'GET' and not args:
+                return self.memo.get(url, kwargs, lambda: self._fetch(method, url, **kwargs))
+            if method.upper() != 'GET':
+                self.memo.invalidate(url)
+        return self._fetch(method, url, *args, **kwargs)
+
+
+def _mount_pool(session: requests.Session, pool_maxsize: int):
+    adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.pool_maxsize = pool_maxsize
+
+
+def shared_session(edgerc_file: str | None = None, section: str | None = None,
+                   pool_maxsize: int | None = DEFAULT_POOL_SIZE,
+                   rate_limit: float | None = DEFAULT_RATE_LIMIT) -> requests.Session:
+    """
+    Return the process wide keep-alive session for a credentials section.
+
+    Every API class built for the same .edgerc section reuses one connection pool
+    and one request scheduler, so concurrent requests share TLS connections and
+    stay under the account rate limit together. All sessions share the
+    invocation's request memo. The session uses the response
+    cache configured with ``response_cache.configure``. Without ``edgerc_file`` an
+    unauthenticated session is returned. Asking for a larger pool than the
+    current one grows it; the rate limit is fixed when the session is created.
+    """
+    pool_maxsize = max(1, int(pool_maxsize or DEFAULT_POOL_SIZE))
+    key = (edgerc_file, section)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = ScheduledSession(RequestScheduler(rate_limit), memo=request_memo.current())
+            session.headers['Connection'] = 'keep-alive'
+            if edgerc_file:
+                session.auth = EdgeGridAuth.from_edgerc(EdgeRc(edgerc_file), section)
+            _mount_pool(session, pool_maxsize)
+            _sessions[key] = session
+        elif pool_maxsize > session.pool_maxsize:
+            _mount_pool(session, pool_maxsize)
+        session.response_cache = default_cache()
+    return session
+
 
 class AkamaiSession:
 
@@ -17,7 +309,8 @@ class AkamaiSession:
                         'Accept': 'application/json',
                         'Content-Type': 'application/json'}
 
-        self.edgerc = EdgeRc(f'{str(Path.home())}/.edgerc')
+        self.edgerc_file = getattr(args, 'edgerc', None) or os.getenv('AKAMAI_EDGERC') or f'{str(Path.home())}/.edgerc'
+        self.edgerc = EdgeRc(self.edgerc_file)
         self.section = args.section if args.section else 'default'
         self.host = self.edgerc.get(self.section, 'host')
         self.host = f'https://{self.host}'
@@ -25,8 +318,10 @@ class AkamaiSession:
         self.account_switch_key = args.account_switch_key if 'account_switch_key' in args.__dict__.keys() else False
         self._params = {}
 
-        self.s = requests.Session()
-        self.s.auth = EdgeGridAuth.from_edgerc(self.edgerc, self.section)
+        # a fan-out of N workers keeps N connections busy
+        pool_size = max(getattr(args, 'pool_size', None) or DEFAULT_POOL_SIZE, getattr(args, 'concurrency', None) or 0)
+        rate_limit = getattr(args, 'rate_limit', DEFAULT_RATE_LIMIT)
+        self.s = shared_session(self.edgerc_file, self.section, pool_size, rate_limit)
 
     @property
     def params(self) -> dict:
@@ -1,15 +1,190 @@
 from __future__ import annotations
 
 import logging
+from abc import ABC
+from abc import abstractmethod
 
+import requests
+from akamai_apis import instrumentation
 from akamai_apis.auth import AkamaiSession
-from utils import utility
+from akamai_apis.response_cache import NO_CACHE
+from requests.structures import CaseInsensitiveDict
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CONCURRENCY = 100
 
-class Cps(AkamaiSession):
+
+class CpsEndpoints(ABC):
+    """
+    CPS API endpoints, shared by the synchronous and the asyncio client.
+
+    Every method describes its request and hands it to ``_request``, so ``Cps``
+    returns a ``requests.Response`` and ``AsyncCps`` returns a coroutine that
+    resolves to one. Endpoint paths take ``self.baseurl`` (``/cps/v2``) while
+    ``endpoint`` arguments are paths from the API host, as the CPS API returns
+    them in change status links. ``fresh=True`` reads the live resource, past
+    the request memo and the response cache.
+    """
+
+    def get_contracts(self):
+        url = f'{self.host}/contract-api/v1/contracts/identifiers'
+        return self._request('GET', url, params={'depth': 'TOP'})
+
+    def list_enrollments(self, contract_id: str | None = None, extra_headers: dict | None = None):
+        headers = {'Accept': 'application/vnd.akamai.cps.enrollments.v4+json'}
+        if extra_headers:
+            headers.update(extra_headers)
+        params = {'contractId': contract_id} if contract_id else {}
+        return self._request('GET', f'{self.baseurl}/enrollments', params=params, headers=headers)
+
+    def get_enrollment(self, enrollment_id: int, fresh: bool = False):
+        headers = {'Accept': 'application/vnd.akamai.cps.enrollment.v11+json', **(NO_CACHE if fresh else {})}
+        return self._request('GET', f'{self.baseurl}/enrollments/{enrollment_id}', headers=headers)
+
+    def create_enrollment(self, contract_id: str, data: str, allow_duplicate_cn: bool = False):
+        headers = {'Content-Type': 'application/vnd.akamai.cps.enrollment.v11+json',
+                   'Accept': 'application/vnd.akamai.cps.enrollment-status.v1+json'}
+        params = {'contractId': contract_id}
+        if allow_duplicate_cn:
+            params['allow-duplicate-cn'] = 'true'
+        return self._request('POST', f'{self.baseurl}/enrollments', params=params, headers=headers, data=data)
+
+    def update_enrollment(self, enrollment_id: int, data: str, force_renewal: bool = False):
+        headers = {'Content-Type': 'application/vnd.akamai.cps.enrollment.v11+json',
+                   'Accept': 'application/vnd.akamai.cps.enrollment-status.v1+json'}
+        params = {'allow-cancel-pending-changes': 'true'}
+        if force_renewal:
+            params['force-renewal'] = 'true'
+        return self._request('PUT', f'{self.baseurl}/enrollments/{enrollment_id}', params=params, headers=headers, data=data)
+
+    def delete_enrollment(self, enrollment_id: int):
+        headers = {'Accept': 'application/vnd.akamai.cps.enrollment-status.v1+json'}
+        return self._request('DELETE', f'{self.baseurl}/enrollments/{enrollment_id}', headers=headers)
+
+    def get_change_status(self, enrollment_id: int, change_id: int):
+        headers = {'Accept': 'application/vnd.akamai.cps.change.v1+json'}
+        return self._request('GET', f'{self.baseurl}/enrollments/{enrollment_id}/changes/{change_id}', headers=headers)
+
+    def get_change_history(self, enrollment_id: int):
+        headers = {'Accept': 'application/vnd.akamai.cps.change-history.v3+json'}
+        return self._request('GET', f'{self.baseurl}/enrollments/{enrollment_id}/history/changes', headers=headers)
+
+    def cancel_change(self, enrollment_id: int, change_id: int):
+        headers = {'Accept': 'application/vnd.akamai.cps.change-id.v1+json'}
+        return self._request('DELETE', f'{self.baseurl}/enrollments/{enrollment_id}/changes/{change_id}', headers=headers)
+
+    def get_certificate(self, enrollment_id: int, network: str = 'production', fresh: bool = False):
+        headers = {'Accept': 'application/vnd.akamai.cps.deployment.v3+json', **(NO_CACHE if fresh else {})}
+        return self._request('GET', f'{self.baseurl}/enrollments/{enrollment_id}/deployments/{network}', headers=headers)
+
+    def get_dv_change_info(self, endpoint: str):
+        headers = {'Accept': 'application/vnd.akamai.cps.dv-challenges.v2+json'}
+        return self._request('GET', f'{self.host}{endpoint}', headers=headers)
+
+    def custom_get_call(self, headers: dict, endpoint: str):
+        return self._request('GET', f'{self.host}{endpoint}', headers=headers)
+
+    def custom_post_call(self, headers: dict, endpoint: str, data: str | None = None):
+        return self._request('POST', f'{self.host}{endpoint}', headers=headers, data=data)
+
+    @abstractmethod
+    def _request(self, method: str, url: str, params: dict | None = None, headers: dict | None = None, data=None):
+        """Send the request, or return a coroutine that sends it"""
+
+
+class Cps(CpsEndpoints, AkamaiSession):
 
     def __init__(self, logger: logging.Logger, args):
         super().__init__(args)
-        utility()
+        self.baseurl = f'{self.baseurl}/cps/v2'
+        self.logger = logger
+
+    def _request(self, method, url, params=None, headers=None, data=None) -> requests.Response:
+        return self.s.request(method, url, params={**self.params, **(params or {})}, headers=headers, data=data)
+
+
+class AsyncCps(CpsEndpoints, AkamaiSession):
+    """
+    asyncio client with the same methods as ``Cps``, each one a coroutine.
+
+    Requests are signed with the EdgeGrid credentials of the section and go
+    through the section's request scheduler, so they share the rate limit and
+    retry policy of the synchronous client. At most ``concurrency`` requests are
+    in flight at once, everything runs on the event loop's thread::
+
+        async with AsyncCps(logger, args) as cps:
+            responses = await asyncio.gather(*(cps.get_enrollment(id) for id in ids))
+
+    Responses are ``requests.Response`` objects with the body already read, code
+    written against ``Cps`` can consume them unchanged. Requires aiohttp.
+    """
+
+    def __init__(self, logger: logging.Logger, args, concurrency: int | None = None):
+        import asyncio
+
+        super().__init__(args)
+        self.baseurl = f'{self.baseurl}/cps/v2'
+        self.logger = logger
+        self.concurrency = max(1, int(concurrency or getattr(args, 'concurrency', None) or DEFAULT_CONCURRENCY))
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.session = None
+
+    def _client(self):
+        if self.session is None:
+            import aiohttp
+            connector = aiohttp.TCPConnector(limit=self.concurrency)
+            self.session = aiohttp.ClientSession(connector=connector, headers={'Connection': 'keep-alive'})
+        return self.session
+
+    def _sign(self, method, url, params, headers, data) -> requests.PreparedRequest:
+        prepared = requests.Request(method, url, params={**self.params, **(params or {})}, headers=headers, data=data).prepare()
+        return self.s.auth(prepared) if self.s.auth else prepared
+
+    async def _send(self, method, url, params, headers, data) -> requests.Response:
+        from yarl import URL
+
+        # sign on every attempt, a retried request needs a fresh timestamp and nonce
+        prepared = self._sign(method, url, params, headers, data)
+        async with self._client().request(method, URL(prepared.url, encoded=True), headers=dict(prepared.headers),
+                                          data=prepared.body, allow_redirects=False) as resp:
+            response = requests.Response()
+            response.status_code = resp.status
+            response.reason = resp.reason
+            response.headers = CaseInsensitiveDict(resp.headers)
+            response.url = prepared.url
+            response.request = prepared
+            response.encoding = resp.charset
+            response._content = await resp.read()
+            return response
+
+    async def _request(self, method, url, params=None, headers=None, data=None) -> requests.Response:
+        import asyncio
+
+        import aiohttp
+
+        if self.s.memo is not None:
+            self.s.memo.count(method, url)
+        connection_errors = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+        async def send(attempt=None):
+            async def request():
+                if attempt is not None:
+                    attempt()
+                return await self._send(method, url, params, headers, data)
+            return await self.s.scheduler.send_async(method, url, request, connection_errors=connection_errors)
+
+        profiler = instrumentation.current()
+        async with self.semaphore:
+            return await (send() if profiler is None else profiler.measure_async(method, url, send))
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
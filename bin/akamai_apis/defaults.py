@@ -0,0 +1,7 @@
+from __future__ import annotations
+
+# Connection defaults shared by the session and the command line parser. Kept free of
+# imports so parsing the command line does not load the HTTP stack.
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RATE_LIMIT = 10
+DEFAULT_MAX_RETRIES = 5
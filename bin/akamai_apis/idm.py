@@ -2,30 +2,109 @@
 # https://techdocs.akamai.com/iam-api/reference/get-client-account-switch-keys
 from __future__ import annotations
 
+import hashlib
+import json
 import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future
 
 import utils.emojis as emoji
 from akamai_apis.auth import AkamaiSession
-from rich.console import Console
+
+ACCOUNT_NAME_TTL = 24 * 60 * 60
+
+_account_names = None
+
+
+class AccountNameCache:
+    """
+    On-disk account switch key to account name mapping.
+
+    One small JSON file per section of an .edgerc file, the same section name in
+    another .edgerc holds other credentials and maps to another file. Entries
+    older than ``ttl`` seconds are looked up again. The account name only
+    decorates output headers, so a day old answer is good enough.
+    """
+
+    def __init__(self, path: str, ttl: int = ACCOUNT_NAME_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def _file(self, edgerc_file: str, section: str) -> str:
+        name = re.sub(r'[^\w.-]', '_', section)
+        edgerc_hash = hashlib.sha256(os.path.abspath(os.path.expanduser(edgerc_file)).encode()).hexdigest()[:16]
+        return os.path.join(self.path, f'{name}-{edgerc_hash}.json')
+
+    def _load(self, edgerc_file: str, section: str) -> dict:
+        try:
+            with open(self._file(edgerc_file, section)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, edgerc_file: str, section: str, account_switch_key: str | None) -> str | None:
+        entry = self._load(edgerc_file, section).get(account_switch_key or '')
+        if entry is not None and time.time() - entry['fetched_at'] < self.ttl:
+            return entry['account_name']
+        return None
+
+    def set(self, edgerc_file: str, section: str, account_switch_key: str | None, account_name: str):
+        with self._lock:
+            entries = self._load(edgerc_file, section)
+            entries[account_switch_key or ''] = {'account_name': account_name, 'fetched_at': time.time()}
+            os.makedirs(self.path, exist_ok=True)
+            cache_file = self._file(edgerc_file, section)
+            temp_file = f'{cache_file}.{threading.get_ident()}.tmp'
+            with open(temp_file, 'w') as f:
+                json.dump(entries, f)
+            os.replace(temp_file, cache_file)
+
+
+def configure(path: str, enabled: bool | None = True, ttl: int = ACCOUNT_NAME_TTL) -> AccountNameCache | None:
+    """Set the account name cache lookups use, disabled returns None and always asks the API"""
+    global _account_names
+    _account_names = AccountNameCache(path, ttl) if enabled else None
+    return _account_names
+
+
+def account_name_cache() -> AccountNameCache | None:
+    return _account_names
 
 
 class IdentityAccessManagement(AkamaiSession):
-    def __init__(self, logger: logging.Logger, args):
+    def __init__(self, logger: logging.Logger, args, cache: AccountNameCache | None = None):
         super().__init__(args)
         self.baseurl = f'{self.baseurl}/identity-management/v3'
         self.headers = {'Accept': 'application/json'}
         self.logger = logger
         self.account_name = None
+        self.cache = cache if cache is not None else account_name_cache()
 
     def exit_condition(self):
         print()
         self.logger.error(f'invalid account switch key {self.account_switch_key}')
-        console = Console(stderr=True)
+        from utils.cli_logging import get_console
+        console = get_console()
         exit(
             console.print(f'{emoji.poop} [red]Error looking up account. Exiting....\n')
         )
 
+    def cached_account(self) -> str | None:
+        if self.cache is not None:
+            return self.cache.get(self.edgerc_file, self.section, self.account_switch_key)
+        return None
+
     def search_account(self):
+        cached = self.cached_account()
+        if cached:
+            self.account_name = cached
+            self.logger.debug(f'Account Name: {self.account_name} (cached)')
+            return self.account_name
+
         url = f'{self.baseurl}/api-clients/self/account-switch-keys'
         params = {}
         if self.account_switch_key:
@@ -41,8 +120,32 @@ class IdentityAccessManagement(AkamaiSession):
                     self.exit_condition()
             except IndexError:
                 self.exit_condition()
+        if self.cache is not None:
+            self.cache.set(self.edgerc_file, self.section, self.account_switch_key, self.account_name)
         self.logger.critical(f'Account Name: {self.account_name}')
         return self.account_name
 
+    def search_account_async(self) -> Future:
+        """
+        Resolve the account name on a background thread, so the look up overlaps with the
+        command's first CPS request. ``result()`` returns the name, or raises what the look up
+        raised (SystemExit for an invalid account switch key).
+        """
+        future = Future()
+        cached = self.cached_account()
+        if cached:
+            self.account_name = cached
+            future.set_result(cached)
+            return future
+
+        def lookup():
+            try:
+                future.set_result(self.search_account())
+            except BaseException as err:
+                future.set_exception(err)
+
+        threading.Thread(target=lookup, name='idm-account-lookup', daemon=True).start()
+        return future
+
     def __call__(self):
         return self.search_account()
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+
+from akamai_apis.request_memo import endpoint_template
+
+PERCENTILES = (50, 95, 99)
+
+_profiler = None
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of the values, 0 for no values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Profiler:
+    """
+    Records one sample per API request: endpoint template, status, response
+    bytes, latency and attempts.
+
+    Latency covers the whole request as the command saw it, including the
+    retries and rate limit waits of the scheduler. A request that failed
+    without a response is recorded with status None. ``summary`` aggregates
+    the samples per endpoint, ``dump`` writes them to a JSON file so runs can
+    be compared.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.samples = []
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, method: str, url: str, status: int | None, size: int, latency: float, attempts: int = 1):
+        sample = {'method': method.upper(), 'endpoint': endpoint_template(url), 'status': status,
+                  'bytes': size, 'latency_ms': round(latency * 1000, 3), 'attempts': attempts}
+        with self._lock:
+            self.samples.append(sample)
+
+    def measure(self, method: str, url: str, send):
+        """Call ``send(attempt)`` and record it, ``attempt`` is called by the sender once per attempt"""
+        attempts = 0
+
+        def attempt():
+            nonlocal attempts
+            attempts += 1
+
+        started = self.clock()
+        try:
+            response = send(attempt)
+        except BaseException:
+            self.record(method, url, None, 0, self.clock() - started, max(1, attempts))
+            raise
+        self.record(method, url, response.status_code, len(response.content or b''), self.clock() - started, max(1, attempts))
+        return response
+
+    async def measure_async(self, method: str, url: str, send):
+        """measure() for a coroutine function ``send(attempt)``"""
+        attempts = 0
+
+        def attempt():
+            nonlocal attempts
+            attempts += 1
+
+        started = self.clock()
+        try:
+            response = await send(attempt)
+        except BaseException:
+            self.record(method, url, None, 0, self.clock() - started, max(1, attempts))
+            raise
+        self.record(method, url, response.status_code, len(response.content or b''), self.clock() - started, max(1, attempts))
+        return response
+
+    def summary(self) -> list:
+        """Per endpoint aggregates, busiest endpoint first"""
+        with self._lock:
+            samples = list(self.samples)
+        endpoints = {}
+        for sample in samples:
+            endpoints.setdefault(f"{sample['method']} {sample['endpoint']}", []).append(sample)
+        rows = []
+        for endpoint, endpoint_samples in endpoints.items():
+            latencies = [sample['latency_ms'] for sample in endpoint_samples]
+            row = {'endpoint': endpoint, 'calls': len(endpoint_samples),
+                   'retries': sum(sample['attempts'] - 1 for sample in endpoint_samples),
+                   'errors': sum(1 for sample in endpoint_samples if sample['status'] is None or sample['status'] >= 400),
+                   'bytes': sum(sample['bytes'] for sample in endpoint_samples),
+                   'total_ms': round(sum(latencies), 3)}
+            for pct in PERCENTILES:
+                row[f'p{pct}_ms'] = percentile(latencies, pct)
+            rows.append(row)
+        return sorted(rows, key=lambda row: (-row['total_ms'], row['endpoint']))
+
+    def format_summary(self) -> str:
+        rows = self.summary()
+        header = ['Endpoint', 'Calls', 'Retries', 'Errors', 'KiB'] + [f'p{pct} ms' for pct in PERCENTILES]
+        table = [header] + [[row['endpoint'], str(row['calls']), str(row['retries']), str(row['errors']),
+                             f"{row['bytes'] / 1024:.1f}"] + [f"{row[f'p{pct}_ms']:.0f}" for pct in PERCENTILES]
+                            for row in rows]
+        widths = [max(len(line[column]) for line in table) for column in range(len(header))]
+        lines = ['  '.join(value.ljust(widths[0]) if column == 0 else value.rjust(widths[column])
+                           for column, value in enumerate(line)) for line in table]
+        calls = sum(row['calls'] for row in rows)
+        retries = sum(row['retries'] for row in rows)
+        lines.append(f'{calls} API calls, {retries} retries, {time.time() - self.started_at:.2f}s wall time')
+        return '\n'.join(lines)
+
+    def dump(self, path: str, command: str | None = None):
+        with self._lock:
+            samples = list(self.samples)
+        with open(path, 'w') as f:
+            json.dump({'command': command, 'started_at': self.started_at, 'samples': samples,
+                       'summary': self.summary()}, f, indent=2)
+
+
+def configure(enabled: bool | None = True) -> Profiler | None:
+    """Set the profiler sessions record into, disabled returns None and turns recording off"""
+    global _profiler
+    _profiler = Profiler() if enabled else None
+    return _profiler
+
+
+def current() -> Profiler | None:
+    return _profiler
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import sys
+
+from utils.certificates import decode
+
+
+def _intern(value):
+    # The same handful of values repeats across every enrollment of an account, keep one copy of each
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _strings(values) -> tuple:
+    return tuple(values or ())
+
+
+def _pending_changes(pending_changes) -> tuple | None:
+    # None when the response has no pendingChanges, the audit shows UNKNOWN then
+    if pending_changes is None:
+        return None
+    return tuple(change['location'] if isinstance(change, dict) else change for change in pending_changes)
+
+
+def _change_id(location: str | None) -> int | None:
+    return int(location.rstrip('/').split('/')[-1]) if location else None
+
+
+class Contact:
+    __slots__ = ('first_name', 'last_name', 'email', 'phone')
+
+    def __init__(self, first_name: str | None = None, last_name: str | None = None, email: str | None = None,
+                 phone: str | None = None):
+        self.first_name = first_name
+        self.last_name = last_name
+        self.email = email
+        self.phone = phone
+
+    @classmethod
+    def from_json(cls, data: dict | None) -> Contact:
+        data = data or {}
+        return cls(data.get('firstName'), data.get('lastName'), data.get('email'), data.get('phone'))
+
+    @property
+    def name(self) -> str:
+        return f'{self.first_name} {self.last_name}'
+
+
+# The enrollment fields each command reads, decode only what is needed
+ENROLLMENT_DECODERS = {
+    'cn': lambda data: data['csr']['cn'],
+    'sans': lambda data: _strings(data['csr'].get('sans')),
+    'validation_type': lambda data: _intern(data.get('validationType')),
+    'certificate_type': lambda data: _intern(data.get('certificateType')),
+    'change_management': lambda data: str(data.get('changeManagement')).lower() == 'true',
+    'pending_changes': lambda data: _pending_changes(data.get('pendingChanges')),
+    'admin_contact': lambda data: Contact.from_json(data.get('adminContact')),
+    'tech_contact': lambda data: Contact.from_json(data.get('techContact')),
+    'geography': lambda data: _intern(data['networkConfiguration'].get('geography')),
+    'secure_network': lambda data: _intern(data['networkConfiguration'].get('secureNetwork')),
+    'must_have_ciphers': lambda data: _intern(data['networkConfiguration'].get('mustHaveCiphers')),
+    'preferred_ciphers': lambda data: _intern(data['networkConfiguration'].get('preferredCiphers')),
+    'disallowed_tls_versions': lambda data: tuple(_intern(version) for version in
+                                                  data['networkConfiguration'].get('disallowedTlsVersions') or ()),
+    'sni_only': lambda data: data['networkConfiguration'].get('sniOnly'),
+    'country': lambda data: _intern(data['csr'].get('c')),
+    'state': lambda data: _intern(data['csr'].get('st')),
+    'organization': lambda data: _intern(data['csr'].get('o')),
+    'organization_unit': lambda data: _intern(data['csr'].get('ou')),
+}
+AUDIT_FIELDS = tuple(ENROLLMENT_DECODERS)
+
+
+class Enrollment:
+    """
+    Typed view of a CPS enrollment.
+
+    ``from_json`` decodes only the requested ``fields`` of the API response,
+    by default the ``AUDIT_FIELDS`` of the audit report, every other field
+    stays None. Instances have no ``__dict__`` and
+    share repeated strings, so holding tens of thousands of them for a report
+    stays cheap.
+    """
+
+    __slots__ = ('id', 'contract_id') + AUDIT_FIELDS
+
+    def __init__(self, id: int, contract_id: str | None = None, **fields):
+        self.id = id
+        self.contract_id = contract_id
+        for field in AUDIT_FIELDS:
+            setattr(self, field, fields.get(field))
+
+    @classmethod
+    def from_json(cls, data: dict, contract_id: str | None = None, fields=AUDIT_FIELDS) -> Enrollment:
+        enrollment = cls.__new__(cls)
+        enrollment.id = data['id'] if 'id' in data else int(data['location'].split('/')[-1])
+        enrollment.contract_id = _intern(contract_id or data.get('contractId'))
+        for field, decoder in ENROLLMENT_DECODERS.items():
+            setattr(enrollment, field, decoder(data) if field in fields else None)
+        return enrollment
+
+    @property
+    def status(self) -> str:
+        if self.pending_changes is None:
+            return 'UNKNOWN'
+        return 'IN-PROGRESS' if self.pending_changes else 'ACTIVE'
+
+    @property
+    def pending_change_id(self) -> int | None:
+        """Id of the first pending change"""
+        return _change_id(self.pending_changes[0]) if self.pending_changes else None
+
+    def __repr__(self):
+        return f'<Enrollment {self.id} {self.cn!r}>'
+
+
+class Deployment:
+    """
+    Certificate deployed on a network. The PEM is only parsed when one of the
+    certificate fields is read, through the shared decoder of utils.certificates.
+    """
+
+    __slots__ = ('enrollment_id', 'network', 'certificate', '_decoded')
+
+    def __init__(self, enrollment_id: int, network: str, certificate: str):
+        self.enrollment_id = enrollment_id
+        self.network = _intern(network)
+        self.certificate = certificate
+        self._decoded = None
+
+    @classmethod
+    def from_json(cls, data: dict, enrollment_id: int, network: str = 'production') -> Deployment:
+        return cls(enrollment_id, data.get('network') or network, data['certificate'])
+
+    @property
+    def decoded(self):
+        if self._decoded is None:
+            self._decoded = decode(self.certificate)
+        return self._decoded
+
+    @property
+    def not_valid_after(self):
+        return self.decoded.not_valid_after
+
+    @property
+    def sans(self) -> tuple:
+        return self.decoded.sans or ()
+
+    def __repr__(self):
+        return f'<Deployment {self.enrollment_id} {self.network}>'
+
+
+class Change:
+    """
+    Status of a pending change, as returned by the change status endpoint.
+
+    ``allowed_input`` lists the input types the change accepts, ``required_input``
+    those with requiredToProceed: the change only waits for someone when one of
+    them is there, other allowed input (e.g. change management info) is optional.
+    """
+
+    __slots__ = ('enrollment_id', 'change_id', 'state', 'status', 'description', 'allowed_input', 'required_input', 'error')
+
+    def __init__(self, enrollment_id: int | None = None, change_id: int | None = None, state: str | None = None,
+                 status: str | None = None, description: str | None = None, allowed_input: tuple = (),
+                 required_input: tuple = (), error: dict | None = None):
+        self.enrollment_id = enrollment_id
+        self.change_id = change_id
+        self.state = state
+        self.status = status
+        self.description = description
+        self.allowed_input = allowed_input
+        self.required_input = required_input
+        self.error = error
+
+    @classmethod
+    def from_json(cls, data: dict, enrollment_id: int | None = None, change_id: int | None = None) -> Change:
+        status_info = data.get('statusInfo') or {}
+        inputs = data.get('allowedInput') or ()
+        return cls(enrollment_id, change_id, _intern(status_info.get('state')), _intern(status_info.get('status')),
+                   status_info.get('description'),
+                   tuple(_intern(allowed['type']) for allowed in inputs),
+                   tuple(_intern(allowed['type']) for allowed in inputs if allowed.get('requiredToProceed')),
+                   status_info.get('error'))
+
+    @classmethod
+    def from_location(cls, location: str, data: dict) -> Change:
+        """Change of a pendingChanges location, /cps/v2/enrollments/{id}/changes/{id}"""
+        parts = location.rstrip('/').split('/')
+        return cls.from_json(data, int(parts[-3]), int(parts[-1]))
+
+    @property
+    def input_required(self) -> bool:
+        return bool(self.required_input)
+
+    @property
+    def next_input(self) -> str:
+        """Type of the input the change waits for, the one required to proceed first"""
+        inputs = self.required_input or self.allowed_input
+        return inputs[0] if inputs else ''
+
+    @property
+    def error_description(self) -> str:
+        """Code and description of the error of a change in the error state, its description otherwise"""
+        if self.state == 'error' and self.error:
+            return f"{self.error.get('code', '')}: {self.error.get('description', '')}"
+        return self.description or ''
+
+    def __repr__(self):
+        return f'<Change {self.change_id} of enrollment {self.enrollment_id} {self.state}>'
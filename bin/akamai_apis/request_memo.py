@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import re
+import threading
+from collections import Counter
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from akamai_apis.response_cache import ENROLLMENT_PATH
+from akamai_apis.response_cache import wants_fresh
+from requests.structures import CaseInsensitiveDict
+
+# Change status and the change inputs below it are polled and acted upon, they are always fetched
+UNMEMOIZED = re.compile(r'/changes/\d+(/|$)')
+# Responses kept at most, a command reads a resource twice close together, bulk commands
+# reading every enrollment of the account must not hold all of them
+DEFAULT_MAX_ENTRIES = 256
+
+_memo = None
+
+
+def endpoint_template(url: str) -> str:
+    """Path of a request with ids replaced, e.g. /cps/v2/enrollments/{id}/changes/{id}"""
+    path = re.sub(r'^[a-z]+://[^/]+', '', url.split('?', 1)[0])
+    return re.sub(r'/\d+(?=/|$)', '/{id}', path)
+
+
+class RequestMemo:
+    """
+    Per-invocation memo of GET responses, and a count of the API calls made.
+
+    A command that needs the same resource twice, e.g. ``status`` reading the
+    enrollment's validation type and then its pending changes, gets the first
+    response again instead of making a second call. Concurrent requests for the
+    same resource wait for the one in flight. Change status is never memoized,
+    write requests forget the memoized responses of their enrollment, server
+    errors and throttled responses are not kept. Requests with
+    ``Cache-Control: no-cache`` are always sent and replace the memoized
+    response. Only the ``max_entries`` most recently used responses are kept.
+    """
+
+    def __init__(self, max_entries: int | None = DEFAULT_MAX_ENTRIES):
+        self.calls = Counter()
+        self.hits = 0
+        self.max_entries = max_entries
+        self._responses = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(url: str, kwargs: dict) -> tuple:
+        params = kwargs.get('params') or {}
+        headers = CaseInsensitiveDict(kwargs.get('headers') or {})
+        return (url, tuple(sorted((str(k), str(v)) for k, v in params.items())),
+                tuple(sorted((k.lower(), str(v)) for k, v in headers.items() if k.lower() != 'cache-control')))
+
+    def get(self, url: str, kwargs: dict, send):
+        """Return the memoized response of a GET, or ``send()`` it once and keep the response"""
+        if UNMEMOIZED.search(url.split('?', 1)[0]):
+            return send()
+        key = self._key(url, kwargs)
+        fresh = wants_fresh(kwargs.get('headers'))
+        with self._lock:
+            future = None if fresh else self._responses.get(key)
+            owner = future is None
+            if owner:
+                future = self._responses[key] = Future()
+                self._responses.move_to_end(key)
+                while self.max_entries and len(self._responses) > self.max_entries:
+                    self._responses.popitem(last=False)
+            else:
+                self._responses.move_to_end(key)
+                self.hits += 1
+        if not owner:
+            return future.result()
+
+        try:
+            response = send()
+        except BaseException as err:
+            with self._lock:
+                if self._responses.get(key) is future:
+                    del self._responses[key]
+            future.set_exception(err)
+            raise
+        future.set_result(response)
+        if response.status_code >= 500 or response.status_code == 429:
+            with self._lock:
+                if self._responses.get(key) is future:
+                    del self._responses[key]
+        return response
+
+    def invalidate(self, url: str):
+        """Forget what a write request may have changed, the responses of its enrollment and the enrollment lists"""
+        match = ENROLLMENT_PATH.search(url)
+        with self._lock:
+            for key in [*self._responses]:
+                memoized = ENROLLMENT_PATH.search(key[0])
+                if match is None or memoized is None or memoized.group(1) == match.group(1):
+                    del self._responses[key]
+
+    def count(self, method: str, url: str):
+        with self._lock:
+            self.calls[f'{method.upper()} {endpoint_template(url)}'] += 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+    def summary(self) -> str:
+        lines = [f'{self.total} API calls, {self.hits} answered from memo']
+        lines.extend(f'  {count:>4}  {endpoint}' for endpoint, count in sorted(self.calls.items()))
+        return '\n'.join(lines)
+
+
+def current() -> RequestMemo:
+    """Memo shared by every session of this invocation"""
+    global _memo
+    if _memo is None:
+        _memo = RequestMemo()
+    return _memo
+
+
+def reset() -> RequestMemo:
+    global _memo
+    _memo = RequestMemo()
+    return _memo
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Read-only endpoints worth caching and how long (seconds) a stored response stays fresh.
+# The enrollment itself and change status are deliberately absent: pendingChanges and the
+# change state move outside the CLI (UI, auto-renewal) and status, proceed and update need them live.
+ENDPOINT_TTLS = [
+    (re.compile(r'/cps/v2/enrollments/\d+/deployments/(production|staging)$'), 3600),
+    (re.compile(r'/cps/v2/enrollments/\d+/history/changes$'), 300),
+]
+
+ENROLLMENT_PATH = re.compile(r'/cps/v2/enrollments/(\d+)')
+
+# Request header asking for the live resource: the memo and the cache are bypassed (a cached
+# entry is still revalidated with its ETag) and what comes back replaces the stored response
+NO_CACHE = {'Cache-Control': 'no-cache'}
+
+_default_cache = None
+
+
+def wants_fresh(headers: dict | None) -> bool:
+    """True when the request carries Cache-Control: no-cache"""
+    return 'no-cache' in CaseInsensitiveDict(headers or {}).get('Cache-Control', '').lower()
+
+
+class ResponseCache:
+    """
+    On-disk cache for GET responses of read-only CPS endpoints.
+
+    Entries are keyed by URL, query parameters, Accept header and account switch
+    key. Each endpoint has its own TTL (``max_age`` overrides all of them), stale
+    entries are revalidated with ETag/Last-Modified when the API provided them,
+    and the least recently used entries are evicted once the cache grows beyond
+    ``max_bytes``. Writes to an enrollment drop every cached response of it.
+    Requests with ``NO_CACHE`` headers always go to the API.
+    """
+
+    def __init__(self, path: str, max_age: int | None = None, max_bytes: int | None = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    def ttl_for(self, url: str) -> int | None:
+        path = url.split('?', 1)[0]
+        for pattern, ttl in ENDPOINT_TTLS:
+            if pattern.search(path):
+                return ttl if self.max_age is None else self.max_age
+        return None
+
+    def _entry_file(self, url: str, params: dict | None, headers: dict | None) -> str:
+        params = params or {}
+        accept = CaseInsensitiveDict(headers or {}).get('Accept', '')
+        key = json.dumps([url, sorted((str(k), str(v)) for k, v in params.items()), accept,
+                          params.get('accountSwitchKey', '')])
+        match = ENROLLMENT_PATH.search(url)
+        bucket = match.group(1) if match else '_'
+        return os.path.join(self.path, bucket, f'{hashlib.sha256(key.encode()).hexdigest()}.json')
+
+    def _load(self, entry_file: str) -> dict | None:
+        try:
+            with open(entry_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, entry_file: str, entry: dict):
+        os.makedirs(os.path.dirname(entry_file), exist_ok=True)
+        temp_file = f'{entry_file}.{threading.get_ident()}.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(entry, f)
+        previous = os.path.getsize(entry_file) if os.path.exists(entry_file) else 0
+        os.replace(temp_file, entry_file)
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += os.path.getsize(entry_file) - previous
+            if self.max_bytes and self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if name.endswith('.json'):
+                    yield os.path.join(root, name)
+
+    def _disk_usage(self) -> int:
+        return sum(os.path.getsize(entry_file) for entry_file in self._entries())
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under 90% of its budget"""
+        entries = sorted((os.stat(entry_file).st_mtime, os.path.getsize(entry_file), entry_file)
+                         for entry_file in self._entries())
+        for _, size, entry_file in entries:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(entry_file)
+                self._size -= size
+            except OSError:
+                pass
+
+    @staticmethod
+    def _response(entry: dict, url: str) -> requests.Response:
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response._content = entry['body'].encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = url
+        response.from_cache = True
+        return response
+
+    def get(self, url: str, kwargs: dict, send) -> requests.Response:
+        """
+        Answer a GET from the cache when possible, otherwise call ``send(kwargs)``
+        (with conditional headers for stale entries) and store the result.
+        """
+        ttl = self.ttl_for(url)
+        if ttl is None:
+            return send(kwargs)
+
+        entry_file = self._entry_file(url, kwargs.get('params'), kwargs.get('headers'))
+        entry = self._load(entry_file)
+        if entry is not None and time.time() - entry['stored_at'] < ttl and not wants_fresh(kwargs.get('headers')):
+            self.hits += 1
+            # touching the file keeps least-recently-used ordering for eviction
+            os.utime(entry_file)
+            return self._response(entry, url)
+
+        headers = dict(kwargs.get('headers') or {})
+        if entry is not None:
+            validators = CaseInsensitiveDict(entry['headers'])
+            if validators.get('ETag'):
+                headers['If-None-Match'] = validators['ETag']
+            if validators.get('Last-Modified'):
+                headers['If-Modified-Since'] = validators['Last-Modified']
+        response = send({**kwargs, 'headers': headers})
+
+        if response.status_code == 304 and entry is not None:
+            self.revalidated += 1
+            entry['stored_at'] = time.time()
+            self._store(entry_file, entry)
+            return self._response(entry, url)
+
+        self.misses += 1
+        if response.status_code == 200:
+            self._store(entry_file, {'url': url,
+                                     'status': response.status_code,
+                                     'headers': {name: value for name, value in response.headers.items()
+                                                 if name.lower() in ('content-type', 'etag', 'last-modified')},
+                                     'body': response.text,
+                                     'stored_at': time.time()})
+        return response
+
+    def invalidate(self, url: str):
+        """Forget every cached response of the enrollment a write request touched"""
+        match = ENROLLMENT_PATH.search(url)
+        if match:
+            with self._lock:
+                shutil.rmtree(os.path.join(self.path, match.group(1)), ignore_errors=True)
+                self._size = None
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self._size = None
+
+
+def configure(path: str, enabled: bool | None = True, max_age: int | None = None,
+              max_bytes: int | None = DEFAULT_MAX_BYTES) -> ResponseCache | None:
+    """Set the response cache shared sessions use, disabled returns None and turns caching off"""
+    global _default_cache
+    _default_cache = ResponseCache(path, max_age, max_bytes) if enabled else None
+    return _default_cache
+
+
+def default_cache() -> ResponseCache | None:
+    return _default_cache
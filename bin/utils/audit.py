@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from akamai_apis.models import Enrollment
+from utils.certificates import decode
+
+AUDIT_COLUMNS = ['Contract', 'Enrollment ID', 'Common Name (CN)', 'SAN(S)', 'Status', 'Expiration (In Production)',
+                 'Validation', 'Type', 'Test on Staging', 'Admin Name', 'Admin Email', 'Admin Phone', 'Tech Name',
+                 'Tech Email', 'Tech Phone', 'Geography', 'Secure Network', 'Must-Have Ciphers', 'Preferred Ciphers',
+                 'Disallowed TLS Versions', 'SNI Only', 'Country', 'State', 'Organization', 'Organization Unit']
+AUDIT_CHANGE_COLUMNS = ['Change Status Details', 'Order ID']
+# Machine readable name of every audit column, in the order of AUDIT_COLUMNS
+AUDIT_COLUMN_KEYS = ['contract', 'enrollment_id', 'cn', 'sans', 'status', 'expiration', 'validation', 'type', 'test_on_staging',
+                     'admin_name', 'admin_email', 'admin_phone', 'tech_name', 'tech_email', 'tech_phone', 'geography',
+                     'secure_network', 'must_have_ciphers', 'preferred_ciphers', 'disallowed_tls_versions', 'sni_only',
+                     'country', 'state', 'organization', 'organization_unit']
+NOT_APPLICABLE = 'Not Applicable'
+
+
+def audit_row(enrollment, contract_id, enrollment_id, expiration, change_details=None):
+    """
+    Map an enrollment to the columns of the audit report, in the order of AUDIT_COLUMNS
+
+    Parameters
+    -----------
+    enrollment : <Enrollment>
+        Enrollment decoded with AUDIT_FIELDS, or the enrollment details as returned by the CPS API
+    contract_id : <string>
+        Contract the enrollment belongs to
+    enrollment_id : <int>
+        Enrollment id from the local enrollments cache
+    expiration : <datetime>
+        Expiration date of the certificate deployed in production, empty when unknown
+    change_details : <list>
+        Change status description and order id, appended when change details are requested
+    Returns
+    -------
+    row : <list>
+        One cell per column
+    """
+    if not isinstance(enrollment, Enrollment):
+        enrollment = Enrollment.from_json(enrollment, contract_id)
+    admin_contact = enrollment.admin_contact
+    tech_contact = enrollment.tech_contact
+
+    row = [contract_id, enrollment_id, enrollment.cn, ' '.join(enrollment.sans) if len(enrollment.sans) > 1 else '',
+           enrollment.status, expiration, enrollment.validation_type, enrollment.certificate_type,
+           'yes' if enrollment.change_management else 'no',
+           admin_contact.name, admin_contact.email, admin_contact.phone,
+           tech_contact.name, tech_contact.email, tech_contact.phone,
+           enrollment.geography, enrollment.secure_network, enrollment.must_have_ciphers, enrollment.preferred_ciphers,
+           ' '.join(enrollment.disallowed_tls_versions), enrollment.sni_only if enrollment.sni_only is not None else '',
+           enrollment.country, enrollment.state, enrollment.organization, enrollment.organization_unit]
+    if change_details is not None:
+        row.extend(change_details)
+    return row
+
+
+def fetch_audit_details(cps, enrollment_id, include_change_details=False):
+    """
+    Fetch every CPS resource the audit needs for one enrollment. This runs on a worker thread of the
+    audit fan-out, so it only issues requests and leaves logging and output to the caller.
+
+    Parameters
+    -----------
+    cps : <Cps>
+        CPS API client
+    enrollment_id : <int>
+        Enrollment id from the local enrollments cache
+    include_change_details : <bool>
+        Also fetch change status and change history of the pending change
+    Returns
+    -------
+    audit_details : <dict>
+        Responses keyed by enrollment, certificate, change_id, change_status and change_history
+    """
+    audit_details = {'enrollment': cps.get_enrollment(enrollment_id)}
+    if audit_details['enrollment'].status_code != 200:
+        return audit_details
+
+    enrollment = audit_details['enrollment'].json()
+    audit_details['certificate'] = cps.get_certificate(enrollment_id)
+    if audit_details['certificate'].status_code == 200:
+        # parse on the worker, the row is rendered from the memoized certificate
+        decode(audit_details['certificate'].json()['certificate'])
+
+    pending_changes = enrollment.get('pendingChanges') or []
+    if include_change_details and pending_changes:
+        change_id = int(pending_changes[0]['location'].split('/')[-1])
+        audit_details['change_id'] = change_id
+        audit_details['change_status'] = cps.get_change_status(enrollment_id, change_id)
+        if audit_details['change_status'].status_code == 200 and enrollment['validationType'] in ('ov', 'ev'):
+            audit_details['change_history'] = cps.get_change_history(enrollment_id)
+    return audit_details
+
+
+def pending_order_id(change_history, default=NOT_APPLICABLE):
+    """
+    Find the GeoTrust order id of the incomplete change in the change history of an enrollment
+
+    Parameters
+    -----------
+    change_history : <dict>
+        Change history of the enrollment as returned by the CPS API
+    default : <string>
+        Value returned when no incomplete change carries an order id
+    Returns
+    -------
+    order_id : <string>
+        The order id of the pending change
+    """
+    for change in change_history.get('changes') or []:
+        if change.get('status') == 'incomplete':
+            order_id = (change.get('primaryCertificateOrderDetails') or {}).get('geotrustOrderId')
+            if order_id is not None:
+                return str(order_id)
+    return default
+
+
+def change_details(audit_details):
+    """
+    Change Status Details and Order ID cells of an enrollment, Not Applicable without a pending change
+
+    Parameters
+    -----------
+    audit_details : <dict>
+        Responses returned by fetch_audit_details with include_change_details
+    Returns
+    -------
+    change_details : <list>
+        Change status description and order id, None when the change status could not be fetched
+    """
+    if 'change_status' not in audit_details:
+        return [NOT_APPLICABLE, NOT_APPLICABLE]
+    if audit_details['change_status'].status_code != 200:
+        return None
+    order_id = NOT_APPLICABLE
+    if 'change_history' in audit_details and audit_details['change_history'].status_code == 200:
+        order_id = pending_order_id(audit_details['change_history'].json())
+    return [audit_details['change_status'].json()['statusInfo']['description'], order_id]
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from cryptography import x509
+from cryptography.hazmat.primitives.asymmetric import dsa
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric import rsa
+from utils.fanout import DEFAULT_CONCURRENCY
+from utils.fanout import FanOut
+
+DEFAULT_CACHE_SIZE = 4096
+
+_decoder = None
+_decoder_lock = threading.Lock()
+
+
+def fingerprint(pem: str) -> str:
+    """SHA-256 of the PEM text, surrounding whitespace ignored"""
+    return hashlib.sha256(pem.strip().encode()).hexdigest()
+
+
+def last_attribute(name: x509.Name) -> str | None:
+    attributes = [*name]
+    return attributes[-1].value if attributes else None
+
+
+def key_description(public_key) -> tuple:
+    """Key type and size in bits, e.g. ('RSA', 2048) or ('EC', 256)"""
+    if isinstance(public_key, rsa.RSAPublicKey):
+        return 'RSA', public_key.key_size
+    if isinstance(public_key, ec.EllipticCurvePublicKey):
+        return 'EC', public_key.curve.key_size
+    if isinstance(public_key, dsa.DSAPublicKey):
+        return 'DSA', public_key.key_size
+    return type(public_key).__name__.lstrip('_').replace('PublicKey', ''), None
+
+
+class DecodedCertificate:
+    """
+    Fields of a parsed certificate.
+
+    ``sans`` is a tuple of the DNS names of the SAN extension, None when the
+    certificate has no SAN extension. ``subject`` and ``issuer`` are the value of
+    the last attribute of the name, usually the CN. Dates are naive UTC datetimes.
+    Loading the public key costs more than the rest of the parse, ``key_type``
+    and ``key_size`` are only looked up when asked for.
+    """
+
+    __slots__ = ('fingerprint', 'cert', 'subject', 'issuer', 'serial', 'not_valid_before', 'not_valid_after', 'sans', '_key')
+
+    def __init__(self, pem: str, digest: str | None = None):
+        self.fingerprint = digest or fingerprint(pem)
+        self.cert = x509.load_pem_x509_certificate(pem.encode())
+        self.subject = last_attribute(self.cert.subject)
+        self.issuer = last_attribute(self.cert.issuer)
+        self.serial = self.cert.serial_number
+        self.not_valid_before = self.cert.not_valid_before
+        self.not_valid_after = self.cert.not_valid_after
+        try:
+            extension = self.cert.extensions.get_extension_for_class(x509.SubjectAlternativeName)
+            self.sans = tuple(extension.value.get_values_for_type(x509.DNSName))
+        except x509.ExtensionNotFound:
+            self.sans = None
+        self._key = None
+
+    def _key_description(self) -> tuple:
+        if self._key is None:
+            self._key = key_description(self.cert.public_key())
+        return self._key
+
+    @property
+    def key_type(self) -> str:
+        return self._key_description()[0]
+
+    @property
+    def key_size(self) -> int | None:
+        return self._key_description()[1]
+
+    def __repr__(self):
+        return f'<DecodedCertificate {self.subject!r} expires {self.not_valid_after:%Y-%m-%d} {self.fingerprint[:12]}>'
+
+
+class CertificateDecoder:
+    """
+    Memo of decoded certificates keyed by the SHA-256 of their PEM.
+
+    The same certificate is returned by many responses of a run, e.g. the
+    production and staging deployment of an enrollment, or every audit of a
+    long running session, and is parsed only once. The memo keeps the
+    ``max_size`` most recently used certificates.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._decoded = OrderedDict()
+        self._lock = threading.Lock()
+
+    def decode(self, pem: str) -> DecodedCertificate:
+        digest = fingerprint(pem)
+        with self._lock:
+            decoded = self._decoded.get(digest)
+            if decoded is not None:
+                self._decoded.move_to_end(digest)
+                self.hits += 1
+                return decoded
+            self.misses += 1
+        decoded = DecodedCertificate(pem, digest)
+        with self._lock:
+            self._decoded[digest] = decoded
+            while len(self._decoded) > self.max_size:
+                self._decoded.popitem(last=False)
+        return decoded
+
+    def decode_many(self, pems, concurrency: int | None = DEFAULT_CONCURRENCY) -> list:
+        """Decode every PEM on a pool of ``concurrency`` workers, in input order, None stays None"""
+        engine = FanOut(concurrency=concurrency, name='certificates')
+        return list(engine.map(lambda pem: self.decode(pem) if pem else None, pems))
+
+    def decode_deployments(self, deployments, concurrency: int | None = DEFAULT_CONCURRENCY) -> list:
+        """decode_many() of the leaf certificate of deployment responses (json), None for a missing deployment"""
+        return self.decode_many([(deployment or {}).get('certificate') for deployment in deployments], concurrency)
+
+    def clear(self):
+        with self._lock:
+            self._decoded.clear()
+
+    def __len__(self):
+        return len(self._decoded)
+
+
+def default_decoder() -> CertificateDecoder:
+    """Decoder shared by every command of this invocation"""
+    global _decoder
+    if _decoder is None:
+        # the first decodes run on fan-out workers, they must all get the same memo
+        with _decoder_lock:
+            if _decoder is None:
+                _decoder = CertificateDecoder()
+    return _decoder
+
+
+def decode(pem: str) -> DecodedCertificate:
+    return default_decoder().decode(pem)
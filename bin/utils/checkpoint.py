@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import datetime
+import json
+import os
+
+from utils.report import completed_records
+
+
+def _encode(value):
+    if isinstance(value, datetime.datetime):
+        return {'__datetime__': value.isoformat()}
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _decode(value: dict):
+    if '__datetime__' in value:
+        return datetime.datetime.fromisoformat(value['__datetime__'])
+    return value
+
+
+class CheckpointJournal:
+    """
+    Journal of the enrollments a long running report already finished.
+
+    Each completed enrollment is appended as one JSON line holding its report
+    row and, optionally, the record collected for the json format, and the
+    line is flushed right away. The first line stores the report columns, a
+    journal written for different columns is not resumed. After an interrupted
+    run ``entries`` replays the finished work so only the missing enrollments
+    have to be fetched again. A finished report discards its journal.
+    """
+
+    def __init__(self, path: str, header: list):
+        self.path = path
+        self.header = header
+        self.entries = []
+        self._handle = None
+
+    @property
+    def completed(self) -> set:
+        return {entry['enrollmentId'] for entry in self.entries}
+
+    def _load(self) -> bool:
+        if not os.path.isfile(self.path):
+            return False
+        _, offset = completed_records(self.path, 'enrollmentId')
+        with open(self.path, 'rb') as f:
+            lines = f.read(offset).decode('utf8').splitlines()
+        if not lines or json.loads(lines[0]).get('header') != self.header:
+            return False
+        self.entries = [json.loads(line, object_hook=_decode) for line in lines[1:]]
+        # drop a line cut short by the interrupted run before appending to it
+        os.truncate(self.path, offset)
+        return True
+
+    def open(self, resume: bool = False):
+        """Start a new journal, or continue the existing one when resuming"""
+        if self._handle is None:
+            if resume and self._load():
+                self._handle = open(self.path, 'a', encoding='utf8')
+            else:
+                self.entries = []
+                self._handle = open(self.path, 'w', encoding='utf8')
+                self._handle.write(json.dumps({'header': self.header}) + '\n')
+                self._handle.flush()
+        return self
+
+    def record(self, enrollment_id, row: list, record: dict | None = None):
+        entry = {'enrollmentId': enrollment_id, 'row': row}
+        if record is not None:
+            entry['record'] = record
+        self._handle.write(json.dumps(entry, separators=(',', ':'), default=_encode) + '\n')
+        self._handle.flush()
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def discard(self):
+        """The report is complete, the journal is no longer needed"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -3,6 +3,8 @@ from __future__ import annotations
 import logging
 import os
 
+from utils.fanout import DEFAULT_CONCURRENCY
+
 
 # Create a custom formatter that includes the folder name
 class CLIFormatter(logging.Formatter):
@@ -11,12 +13,19 @@ class CLIFormatter(logging.Formatter):
         return super().format(record)
 
 
-main_commands = [{'list': 'List all enrollments',
+main_commands = [{'setup': 'Initial setup to download all necessary enrollment info',
+                  'optional_arguments': [{'name': 'incremental', 'help': 'Refresh only the contracts that changed since the last setup',
+                                          'action': 'store_true'},
+                                         {'name': 'contract-max-age', 'help': 'With --incremental, skip the contracts listed less than this many seconds ago',
+                                          'type': int}]},
+                 {'list': 'List all enrollments',
                   'optional_arguments': [{'name': 'show-expiration', 'help': 'shows expiration date of the enrollment',
-                                          'action': 'store_true'}]},
+                                          'action': 'store_true'},
+                                         {'name': 'concurrency', 'help': 'Number of certificates fetched in parallel',
+                                          'type': int, 'default': DEFAULT_CONCURRENCY}]},
                  {'retrieve-enrollment': 'Output enrollment data to json or yaml format',
                   'optional_arguments': [{'name': 'enrollment-id', 'help': 'enrollment-id of the enrollment'},
-                                         {'name': 'common-name', 'help': 'Common name of the certificate'},
+                                         {'name': 'cn', 'help': 'Common Name of certificate'},
                                          {'name': 'network', 'help': 'Deployment detail of certificate in staging or production'},
                                          {'name': 'json', 'help': 'Output format is json',
                                           'action': 'store_true'},
@@ -33,7 +42,15 @@ main_commands = [{'list': 'List all enrollments',
                  {'status': 'Get any current change status for an enrollment',
                   'optional_arguments': [{'name': 'enrollment-id', 'help': 'enrollment-id of the enrollment'},
                                          {'name': 'cn', 'help': 'Common Name of certificate'},
-                                         {'name': 'validation-type', 'help': 'Use http or dns'}]},
+                                         {'name': 'validation-type', 'help': 'Use http or dns'},
+                                         {'name': 'all-pending', 'help': 'Show the change status of every enrollment with a pending change',
+                                          'action': 'store_true'},
+                                         {'name': 'enrollment-ids', 'help': 'File listing the enrollment-ids to show the change status of'},
+                                         {'name': 'concurrency', 'help': 'Number of change statuses fetched in parallel',
+                                          'type': int, 'default': DEFAULT_CONCURRENCY},
+                                         {'name': 'watch', 'help': 'Keep polling the change status until the change completes, fails, '
+                                                                   'is cancelled or needs input', 'action': 'store_true'},
+                                         {'name': 'watch-timeout', 'help': 'Stop watching after this many seconds', 'type': int}]},
                  {'create': 'Create a new enrollment from a yaml or json input file',
                   'optional_arguments': [{'name': 'force', 'help': 'No value'},
                                          {'name': 'contract-id', 'help': 'Contract ID under which Enrollment/Certificate has to be created'},
@@ -55,11 +72,19 @@ main_commands = [{'list': 'List all enrollments',
                                          {'name': 'enrollment-id', 'help': 'enrollment-id of the enrollment'},
                                          {'name': 'cn', 'help': 'Common Name of certificate'}]},
                  {'audit': 'Generate a report in csv format by default. Can also use --json/xlsx',
-                  'optional_arguments': [{'name': 'output-file', 'help': 'Name of the outputfile to be saved to'},
-                                         {'name': 'json', 'help': 'Output format is json'},
-                                         {'name': 'xlsx', 'help': 'Output format is xlsx'},
-                                         {'name': 'csv', 'help': 'Output format is csv'},
-                                         {'name': 'include-change-details', 'help': 'Add additional details of pending certificates'}]},
+                  'optional_arguments': [{'name': 'output-file', 'help': 'Name of the outputfile to be saved to, - streams csv to stdout'},
+                                         {'name': 'json', 'help': 'Output format is json', 'action': 'store_true'},
+                                         {'name': 'xlsx', 'help': 'Output format is xlsx', 'action': 'store_true'},
+                                         {'name': 'csv', 'help': 'Output format is csv', 'action': 'store_true'},
+                                         {'name': 'ndjson', 'help': 'Output format is ndjson, one object per enrollment. Cannot be combined with --json or --xlsx',
+                                          'action': 'store_true'},
+                                         {'name': 'include-change-details', 'help': 'Add additional details of pending certificates',
+                                          'action': 'store_true'},
+                                         {'name': 'resume', 'help': 'Continue the interrupted audit of --output-file, '
+                                                                    'skipping the enrollments already in an ndjson report',
+                                          'action': 'store_true'},
+                                         {'name': 'concurrency', 'help': 'Number of enrollments fetched in parallel',
+                                          'type': int, 'default': DEFAULT_CONCURRENCY}]},
                  {'proceed': 'Proceed to deploy certificate',
                   'optional_arguments': [{'name': 'force', 'help': 'Skip the stdout display and user confirmation'},
                                          {'name': 'cert-file', 'help': 'Signed leaf certificate (Mandatory only in case of third party cert upload)'},
@@ -68,8 +93,30 @@ main_commands = [{'list': 'List all enrollments',
                                          {'name': 'enrollment-id', 'help': 'enrollment-id of the enrollment'},
                                          {'name': 'cn', 'help': 'Common Name of certificate'}]},
                   {'sbd-audit': 'list all sbd enabled certificates for an account',
-                   'optional_arguments': [{'name': 'output-file', 'help': 'Name of the outputfile to be saved to'},
+                   'optional_arguments': [{'name': 'output-file', 'help': 'Name of the outputfile to be saved to, - streams csv to stdout'},
                                           {'name': 'json', 'help': 'Output format is json'},
                                           {'name': 'xlsx', 'help': 'Output format is xlsx'},
                                           {'name': 'csv', 'help': 'Output format is csv'},
-                                          {'name': 'include-change-details', 'help': 'Add additional details of pending certificates'}]}]
+                                          {'name': 'include-change-details', 'help': 'Add additional details of pending certificates'}]},
+                 {'snapshot': 'Store every enrollment and production deployment in a local snapshot for query',
+                  'optional_arguments': [{'name': 'snapshot-file', 'help': 'Snapshot to write, defaults to snapshot/snapshot.db in the cache directory'},
+                                         {'name': 'concurrency', 'help': 'Number of enrollments fetched in parallel',
+                                          'type': int, 'default': DEFAULT_CONCURRENCY}]},
+                 {'query': 'Filter, sort and aggregate the local snapshot without calling the API',
+                  'optional_arguments': [{'name': 'snapshot-file', 'help': 'Snapshot to read, defaults to snapshot/snapshot.db in the cache directory'},
+                                         {'name': 'columns', 'help': 'Comma separated columns to show'},
+                                         {'name': 'where', 'help': "SQL condition, e.g. \"days_left < 30 AND validation = 'dv'\""},
+                                         {'name': 'sort', 'help': 'Comma separated columns to sort by, append :desc for descending order'},
+                                         {'name': 'group-by', 'help': 'Comma separated columns to count enrollments by'},
+                                         {'name': 'limit', 'help': 'Show at most this many rows', 'type': int},
+                                         {'name': 'sql', 'help': 'Run a read-only SQL statement on the snapshot instead'},
+                                         {'name': 'show-columns', 'help': 'List the columns of the snapshot', 'action': 'store_true'},
+                                         {'name': 'json', 'help': 'Output format is json', 'action': 'store_true'},
+                                         {'name': 'csv', 'help': 'Output format is csv', 'action': 'store_true'}]},
+                 {'expiring': 'List production certificates expiring soon, by week and contract',
+                  'optional_arguments': [{'name': 'within', 'help': 'Window to look ahead, e.g. 30d, 4w or 12h (default: 30d)', 'default': '30d'},
+                                         {'name': 'refresh', 'help': 'Fetch every production certificate again instead of the cached expirations',
+                                          'action': 'store_true'},
+                                         {'name': 'json', 'help': 'Output format is json', 'action': 'store_true'},
+                                         {'name': 'concurrency', 'help': 'Number of certificates fetched in parallel',
+                                          'type': int, 'default': DEFAULT_CONCURRENCY}]}]
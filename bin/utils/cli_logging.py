@@ -3,15 +3,23 @@ from __future__ import annotations
 import json
 import logging
 import os
+import re
+import sys
 import time
+from contextlib import contextmanager
 from logging.config import dictConfig
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import coloredlogs
 import utils.emojis as emoji
-from rich import print
-from rich.console import Console
-from rich.panel import Panel
+
+if TYPE_CHECKING:
+    from rich.console import Console
+
+# rich markup such as [bold white] or [/i], dropped from plain output
+MARKUP = re.compile(r'\[/?[a-z][a-z0-9 #._-]*\]')
+
+_plain = False
 
 custom_level_styles = {
     'debug': {'color': 'cyan'},
@@ -40,7 +48,17 @@ def setup_logger(args):
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
 
+    if _plain:
+        level = logging.getLevelName(args.log_level.upper())
+        handler = logging.StreamHandler()
+        handler.setLevel(level)
+        handler.setFormatter(logging.Formatter('%(levelname)-8s: %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(min(level, logger.level))
+        return logger
+
     # Set up colored console logs using coloredlogs library
+    import coloredlogs
     coloredlogs.install(
         logger=logger,
         level=args.log_level.upper(),
@@ -54,6 +72,53 @@ def setup_logger(args):
     return logger
 
 
+def use_plain_output(plain: bool | None = True):
+    """
+    Turn emoji, colors and rich panels off for output that is not read on a terminal (CI logs,
+    cron mails, pipes). Must be called before setup_logger.
+    """
+    global _plain
+    _plain = bool(plain)
+    if _plain:
+        emoji.disable()
+    else:
+        emoji.enable()
+
+
+def is_plain() -> bool:
+    return _plain
+
+
+class PlainConsole:
+    """Stand-in for rich's Console in plain mode, prints text without markup to stderr"""
+
+    def print(self, *objects, **kwargs):
+        print(*(MARKUP.sub('', str(obj)) for obj in objects), file=sys.stderr)
+
+
+def get_console():
+    if _plain:
+        return PlainConsole()
+    from rich.console import Console
+    return Console(stderr=True)
+
+
+@contextmanager
+def progress_bar(console: Console, description: str, total: int):
+    """
+    Yields a callable that advances a transient progress bar by one, safe to call from
+    fan-out workers. Plain output has no progress bar, the callable does nothing.
+    """
+    if _plain:
+        yield lambda: None
+        return
+    from rich.progress import Progress
+
+    with Progress(console=console, transient=True) as progress:
+        task = progress.add_task(description, total=total)
+        yield lambda: progress.advance(task)
+
+
 def filepath_logging_config(config_file: str) -> str:
     docker_path = os.path.expanduser(Path('/cli'))
     local_home_path = os.path.expanduser(Path('~/.akamai-cli/src/cli-cps'))
@@ -63,13 +128,21 @@ def filepath_logging_config(config_file: str) -> str:
     elif Path(local_home_path).exists():  # local OS cli
         env_path = f'{local_home_path}/bin/config/{config_file}'
         return os.path.expanduser(env_path)
-    else:  # local python development
-        return f'{os.getcwd()}/bin/config/{config_file}'
+    else:  # local python development, the config next to this package
+        return str(Path(__file__).resolve().parents[1] / 'config' / config_file)
 
 
 def console_panel(console: Console, header: str, title: str,
                   align: str | None = 'left',
-                  emoji_name: emoji | None = emoji.star):
+                  emoji_name: emoji | None = None):
+    if _plain:
+        console.print(MARKUP.sub('', title))
+        console.print(header)
+        return
+    from rich import print
+    from rich.panel import Panel
+
+    emoji_name = emoji.star if emoji_name is None else emoji_name
     print()
     console.print(Panel(header,
                         width=150,
@@ -79,6 +152,11 @@ def console_panel(console: Console, header: str, title: str,
 
 
 def console_header(console: Console, msg: str, emoji_name: emoji, sandwiches: bool | None = False):
+    if _plain:
+        console.print(msg)
+        return
+    from rich import print
+
     print()
     if sandwiches:
         console.print(f'{emoji_name}[bold white] {msg} [/bold white]{emoji_name}')
@@ -88,6 +166,12 @@ def console_header(console: Console, msg: str, emoji_name: emoji, sandwiches: bo
 
 
 def console_complete(console: Console):
+    if _plain:
+        console.print('Done')
+        return
+    from rich import print
+    from rich.panel import Panel
+
     print()
     print()
     console.print(Panel.fit(emoji.all_done,
@@ -1,75 +1,108 @@
+"""
+Emoji used in console output.
+
+The characters are a precomputed literal table, resolving them with the
+``emojis`` package on every start cost more than the rest of the import.
+Attributes are looked up on access (``emoji.star``), so turning emoji off
+with ``disable()`` also affects modules that imported this one earlier.
+"""
 from __future__ import annotations
 
-import emojis
-
-
-# summary
-star              = emojis.encode(':star:')
-ok_hand           = emojis.encode(':ok_hand:')
-gem               = emojis.encode(':gem:')
-cloudy            = emojis.encode(':cloud_with_rain:')
-heavy_check_mark  = emojis.encode(':heavy_check_mark:')
-
-# bad annotation
-fail              = emojis.encode(':x:')
-thumbdown         = emojis.encode(':-1:')
-sos               = emojis.encode(':sos:')
-poop              = emojis.encode(':poop:')
-stop              = emojis.encode(':no_entry:')
-disappointed      = emojis.encode(':disappointed:')
-broken_heart      = emojis.encode(':broken_heart:')
-attention         = emojis.encode(':heavy_exclamation_mark:')
-shrug             = emojis.encode(':shrug:')
-
-# good annotaion
-thumbup           = emojis.encode(':+1:')
-tada              = emojis.encode(':tada:')
-blush             = emojis.encode(':blush:')
-partying_face     = emojis.encode(':partying_face:')
-pink_heart        = emojis.encode(':pink_heart:')
-two_hearts        = emojis.encode(':two_hearts:')
-ribbon            = emojis.encode(':ribbon:')
-cherry_blossom    = emojis.encode(':cherry_blossom:')
-pass_green        = emojis.encode(':white_check_mark:')
-
-# in progress
-clock             = emojis.encode(':compass:')
-bow               = emojis.encode(':bow:')
-looking           = emojis.encode(':eyes:')
-checking          = emojis.encode(':police_officer:')
-construction      = emojis.encode(':construction:')
-pending           = emojis.encode(':hourglass_flowing_sand:')
-magnify_glass     = emojis.encode(':mag:')
-
-# milestone
-dart              = emojis.encode(':dart:')
-memo              = emojis.encode(':open_book:')
-key               = emojis.encode(':key:')
-pushpin           = emojis.encode(':pushpin:')
-arrow_down        = emojis.encode(':arrow_down_small:')
-point_right       = emojis.encode(':point_right:')
-point_left        = emojis.encode(':point_left:')
-file_folder       = emojis.encode(':open_file_folder:')
-trash             = emojis.encode(':wastebasket:')
-smoke             = emojis.encode(':smoking:')
-home              = emojis.encode(':house:')
-traffic_light     = emojis.encode(':traffic_light:')
-destination       = emojis.encode(':golf:')
-
-# number
-zero               = emojis.encode(':zero:')
-one               = emojis.encode(':one:')
-two               = emojis.encode(':two:')
-three             = emojis.encode(':three:')
-four              = emojis.encode(':four:')
-five              = emojis.encode(':five:')
-
-# misc
-pencil            = emojis.encode(':pencil:')
-plus_grey         = emojis.encode(':heavy_plus_sign:')
-blue_globe        = emojis.encode(':globe_with_meridians:')
-crystal_ball      = emojis.encode(':crystal_ball:')
-hyper_link      = emojis.encode(':link:')
+EMOJI = {
+    # summary
+    'star': '\u2b50',                       # :star:
+    'ok_hand': '\U0001f44c',                # :ok_hand:
+    'gem': '\U0001f48e',                    # :gem:
+    'cloudy': '\U0001f327\ufe0f',           # :cloud_with_rain:
+    'heavy_check_mark': '\u2714\ufe0f',     # :heavy_check_mark:
+
+    # bad annotation
+    'fail': '\u274c',                       # :x:
+    'thumbdown': '\U0001f44e',              # :-1:
+    'sos': '\U0001f198',                    # :sos:
+    'poop': '\U0001f4a9',                   # :poop:
+    'stop': '\u26d4',                       # :no_entry:
+    'disappointed': '\U0001f61e',           # :disappointed:
+    'broken_heart': '\U0001f494',           # :broken_heart:
+    'attention': '\u2757',                  # :heavy_exclamation_mark:
+    'shrug': '\U0001f937',                  # :shrug:
+
+    # good annotaion
+    'thumbup': '\U0001f44d',                # :+1:
+    'tada': '\U0001f389',                   # :tada:
+    'blush': '\U0001f60a',                  # :blush:
+    'partying_face': '\U0001f973',          # :partying_face:
+    'pink_heart': '\U0001fa77',             # :pink_heart:
+    'two_hearts': '\U0001f495',             # :two_hearts:
+    'ribbon': '\U0001f380',                 # :ribbon:
+    'cherry_blossom': '\U0001f338',         # :cherry_blossom:
+    'pass_green': '\u2705',                 # :white_check_mark:
+
+    # in progress
+    'clock': '\U0001f9ed',                  # :compass:
+    'bow': '\U0001f647',                    # :bow:
+    'looking': '\U0001f440',                # :eyes:
+    'checking': '\U0001f46e',               # :police_officer:
+    'construction': '\U0001f6a7',           # :construction:
+    'pending': '\u23f3',                    # :hourglass_flowing_sand:
+    'magnify_glass': '\U0001f50d',          # :mag:
+
+    # milestone
+    'dart': '\U0001f3af',                   # :dart:
+    'memo': '\U0001f4d6',                   # :open_book:
+    'key': '\U0001f511',                    # :key:
+    'pushpin': '\U0001f4cc',                # :pushpin:
+    'arrow_down': '\U0001f53d',             # :arrow_down_small:
+    'point_right': '\U0001f449',            # :point_right:
+    'point_left': '\U0001f448',             # :point_left:
+    'file_folder': '\U0001f4c2',            # :open_file_folder:
+    'trash': '\U0001f5d1\ufe0f',            # :wastebasket:
+    'smoke': '\U0001f6ac',                  # :smoking:
+    'home': '\U0001f3e0',                   # :house:
+    'traffic_light': '\U0001f6a5',          # :traffic_light:
+    'destination': '\u26f3',                # :golf:
+
+    # number
+    'zero': '0\ufe0f\u20e3',                # :zero:
+    'one': '1\ufe0f\u20e3',                 # :one:
+    'two': '2\ufe0f\u20e3',                 # :two:
+    'three': '3\ufe0f\u20e3',               # :three:
+    'four': '4\ufe0f\u20e3',                # :four:
+    'five': '5\ufe0f\u20e3',                # :five:
+
+    # misc
+    'pencil': '\U0001f4dd',                 # :pencil:
+    'plus_grey': '\u2795',                  # :heavy_plus_sign:
+    'blue_globe': '\U0001f310',             # :globe_with_meridians:
+    'crystal_ball': '\U0001f52e',           # :crystal_ball:
+    'hyper_link': '\U0001f517',             # :link:
+}
+
+enabled = True
+
+
+def disable():
+    """Render every emoji as an empty string, used for plain (non-TTY / CI) output"""
+    global enabled
+    enabled = False
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def __getattr__(name: str) -> str:
+    try:
+        value = EMOJI[name]
+    except KeyError:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}') from None
+    return value if enabled else ''
+
+
+def __dir__():
+    return sorted([*globals(), *EMOJI])
+
 
 all_done = '''
    _       _       _           ____      U  ___ u  _   _   U _____ u 
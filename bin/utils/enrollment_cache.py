@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS contracts (
+    contract_id   TEXT PRIMARY KEY,
+    fetched_at    REAL,
+    etag          TEXT,
+    last_modified TEXT
+);
+CREATE TABLE IF NOT EXISTS enrollments (
+    enrollment_id INTEGER PRIMARY KEY,
+    cn            TEXT NOT NULL COLLATE NOCASE,
+    contract_id   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_enrollments_cn ON enrollments (cn);
+CREATE INDEX IF NOT EXISTS idx_enrollments_contract ON enrollments (contract_id);
+CREATE TABLE IF NOT EXISTS sans (
+    hostname      TEXT NOT NULL COLLATE NOCASE,
+    enrollment_id INTEGER NOT NULL REFERENCES enrollments (enrollment_id) ON DELETE CASCADE,
+    PRIMARY KEY (hostname, enrollment_id)
+);
+CREATE INDEX IF NOT EXISTS idx_sans_enrollment ON sans (enrollment_id);
+'''
+
+# Cache file of earlier releases, imported once into the store and then kept as enrollments.json.bak
+LEGACY_FILE = 'enrollments.json'
+
+
+class EnrollmentCache:
+    """
+    Indexed local enrollment cache used for CN / SAN / enrollment-id look ups.
+
+    Enrollments are kept in a SQLite file with indexes on enrollment id, CN and
+    every SAN, so a look up only reads the rows it needs. Per-contract fetch
+    metadata (timestamp, ETag and Last-Modified) lets a refresh re-list only the
+    contracts that changed. The enrollments.json of earlier releases is imported
+    on first use, without SANs until the next ``setup``.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db_file = os.path.join(path, 'enrollments.db')
+        self.legacy_file = os.path.join(path, LEGACY_FILE)
+        self.db = None
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.db_file) or os.path.isfile(self.legacy_file)
+
+    def open(self):
+        if self.db is None:
+            os.makedirs(self.path, exist_ok=True)
+            self.db = sqlite3.connect(self.db_file)
+            self.db.row_factory = sqlite3.Row
+            self.db.execute('PRAGMA foreign_keys = ON')
+            self.db.executescript(SCHEMA)
+            if os.path.isfile(self.legacy_file):
+                self._import_legacy()
+        return self
+
+    def _import_legacy(self):
+        """Import the enrollments.json of an earlier release, contracts are re-listed by the next refresh"""
+        try:
+            with open(self.legacy_file) as f:
+                enrollments = json.load(f)
+        except (OSError, ValueError):
+            enrollments = []
+        if not self.db.execute('SELECT 1 FROM enrollments LIMIT 1').fetchone():
+            self.db.executemany('INSERT OR REPLACE INTO enrollments (enrollment_id, cn, contract_id) VALUES (?, ?, ?)',
+                                [(int(enrollment['enrollmentId']), enrollment['cn'], enrollment['contractId'])
+                                 for enrollment in enrollments if isinstance(enrollment, dict)])
+            self.db.commit()
+        os.replace(self.legacy_file, f'{self.legacy_file}.bak')
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def save(self):
+        self.db.commit()
+
+    def clear(self):
+        """Forget every cached contract and enrollment, used for a full rebuild"""
+        self.db.execute('DELETE FROM sans')
+        self.db.execute('DELETE FROM enrollments')
+        self.db.execute('DELETE FROM contracts')
+
+    # contract metadata
+
+    def is_fresh(self, contract_id: str, max_age: int | None = None) -> bool:
+        """True when the contract was listed less than ``max_age`` seconds ago"""
+        if not max_age:
+            return False
+        row = self.db.execute('SELECT fetched_at FROM contracts WHERE contract_id = ?', (contract_id,)).fetchone()
+        return row is not None and time.time() - (row['fetched_at'] or 0) < max_age
+
+    def conditional_headers(self, contract_id: str) -> dict:
+        """Request headers to revalidate the cached enrollment list of a contract"""
+        headers = {}
+        row = self.db.execute('SELECT etag, last_modified FROM contracts WHERE contract_id = ?', (contract_id,)).fetchone()
+        if row is not None:
+            if row['etag']:
+                headers['If-None-Match'] = row['etag']
+            if row['last_modified']:
+                headers['If-Modified-Since'] = row['last_modified']
+        return headers
+
+    def update_contract(self, contract_id: str, enrollments: list, response_headers: dict | None = None):
+        """Replace the cached enrollments of one contract with a fresh listing"""
+        self.db.execute('DELETE FROM enrollments WHERE contract_id = ?', (contract_id,))
+        for every_enrollment in enrollments:
+            enrollment_id = int(every_enrollment['enrollmentId'])
+            self.db.execute('INSERT OR REPLACE INTO enrollments (enrollment_id, cn, contract_id) VALUES (?, ?, ?)',
+                            (enrollment_id, every_enrollment['cn'], contract_id))
+            self.db.executemany('INSERT OR IGNORE INTO sans (hostname, enrollment_id) VALUES (?, ?)',
+                                [(san, enrollment_id) for san in every_enrollment.get('sans') or []])
+        self.touch_contract(contract_id, response_headers)
+
+    def touch_contract(self, contract_id: str, response_headers: dict | None = None):
+        """Record that the contract listing was validated just now"""
+        response_headers = response_headers or {}
+        self.db.execute('''INSERT INTO contracts (contract_id, fetched_at, etag, last_modified) VALUES (?, ?, ?, ?)
+                           ON CONFLICT (contract_id) DO UPDATE SET
+                               fetched_at = excluded.fetched_at,
+                               etag = COALESCE(excluded.etag, etag),
+                               last_modified = COALESCE(excluded.last_modified, last_modified)''',
+                        (contract_id, time.time(), response_headers.get('ETag'), response_headers.get('Last-Modified')))
+
+    def retain_contracts(self, contract_ids):
+        """Drop cached data for contracts that are no longer returned by the API"""
+        contract_ids = list(contract_ids)
+        placeholders = ', '.join('?' * len(contract_ids))
+        self.db.execute(f'DELETE FROM enrollments WHERE contract_id NOT IN ({placeholders})', contract_ids)
+        self.db.execute(f'DELETE FROM contracts WHERE contract_id NOT IN ({placeholders})', contract_ids)
+
+    # look ups
+
+    @staticmethod
+    def _enrollment(row) -> dict:
+        return {'cn': row['cn'], 'contractId': row['contract_id'], 'enrollmentId': row['enrollment_id']}
+
+    def find_by_id(self, enrollment_id) -> dict | None:
+        try:
+            enrollment_id = int(enrollment_id)
+        except (TypeError, ValueError):
+            return None
+        row = self.db.execute('SELECT * FROM enrollments WHERE enrollment_id = ?', (enrollment_id,)).fetchone()
+        return self._enrollment(row) if row is not None else None
+
+    def find_by_hostname(self, hostname: str) -> list:
+        """Enrollments whose CN or one of whose SANs is the hostname"""
+        rows = self.db.execute('''SELECT * FROM enrollments WHERE cn = ?
+                                  UNION
+                                  SELECT enrollments.* FROM sans JOIN enrollments USING (enrollment_id)
+                                  WHERE sans.hostname = ?
+                                  ORDER BY enrollment_id''', (hostname, hostname)).fetchall()
+        return [self._enrollment(row) for row in rows]
+
+    def enrollments(self) -> list:
+        rows = self.db.execute('SELECT * FROM enrollments ORDER BY contract_id, enrollment_id').fetchall()
+        return [self._enrollment(row) for row in rows]
+
+    def contract_ids(self) -> list:
+        rows = self.db.execute('SELECT DISTINCT contract_id FROM enrollments ORDER BY contract_id').fetchall()
+        return [row['contract_id'] for row in rows]
+
+
+def contract_ids_of(contracts: list) -> list:
+    """Contract ids of the contract API response, without the ctr_ prefix"""
+    return [contract_id.split('_', 1)[1] if contract_id.startswith('ctr_') else contract_id for contract_id in contracts]
+
+
+def cache_entries(enrollments_json: dict, contract_id: str) -> list:
+    """Cache entries of a GET /cps/v2/enrollments response, enrollments without a CSR are left out"""
+    return [{'cn': enrollment['csr']['cn'], 'contractId': contract_id, 'enrollmentId': int(enrollment['location'].split('/')[-1]),
+             'sans': enrollment['csr'].get('sans') or []}
+            for enrollment in enrollments_json.get('enrollments') or [] if 'csr' in enrollment]
+
+
+def refresh_contract(enrollment_cache: EnrollmentCache, list_enrollments, contract_id: str, incremental: bool = False):
+    """
+    List the enrollments of one contract and merge them into the cache, the step ``setup`` runs per contract.
+
+    ``list_enrollments(contract_id, extra_headers)`` returns the listing response. Incrementally the
+    listing is revalidated with the stored ETag/Last-Modified, a 304 keeps the cached enrollments.
+    Returns the listing response, the cache is left as is for other statuses.
+    """
+    response = list_enrollments(contract_id, enrollment_cache.conditional_headers(contract_id) if incremental else None)
+    if response.status_code == 304:
+        enrollment_cache.touch_contract(contract_id, response.headers)
+    elif response.status_code == 200:
+        enrollment_cache.update_contract(contract_id, cache_entries(response.json(), contract_id), response.headers)
+    return response
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import datetime
+import os
+import re
+import sqlite3
+import time
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+DEFAULT_WINDOW = '30d'
+# An enrollment without a production certificate is checked again after this many seconds
+UNDEPLOYED_MAX_AGE = 7 * 24 * 3600
+# A deployed certificate expiring beyond the window is checked again after this many seconds,
+# a replacement (new CA, key rotation, shorter validity) can expire earlier than the indexed one
+DEPLOYED_MAX_AGE = 30 * 24 * 3600
+WINDOW_UNITS = {'h': 'hours', 'd': 'days', 'w': 'weeks'}
+WINDOW = re.compile(r'^\s*(\d+)\s*([hdw]?)\s*$', re.IGNORECASE)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS deployments (
+    enrollment_id INTEGER PRIMARY KEY,
+    contract_id   TEXT NOT NULL,
+    cn            TEXT,
+    not_after     TEXT,
+    fetched_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_deployments_not_after ON deployments (not_after);
+'''
+
+
+def parse_window(value: str) -> datetime.timedelta:
+    """Window of e.g. 30d, 4w or 12h, a bare number is days"""
+    match = WINDOW.match(str(value))
+    if not match:
+        raise ValueError(f'Invalid window {value!r}, use a number of days, weeks or hours, e.g. 30d, 4w or 12h')
+    return datetime.timedelta(**{WINDOW_UNITS[(match.group(2) or 'd').lower()]: int(match.group(1))})
+
+
+def utcnow() -> datetime.datetime:
+    """Current time as a naive UTC datetime, like the dates of a decoded certificate"""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def week_of(not_after: datetime.datetime) -> str:
+    """Monday of the week the certificate expires in"""
+    return (not_after.date() - datetime.timedelta(days=not_after.weekday())).isoformat()
+
+
+class DeploymentIndex:
+    """
+    Local index of the expiration (notAfter) of the production certificate of every enrollment.
+
+    A certificate only moves its expiration forward when it is renewed, so an
+    enrollment whose cached expiration is beyond the window cannot expire inside
+    it until ``DEPLOYED_MAX_AGE``, when a replacement certificate may have moved it
+    back. ``stale`` returns what has to be refetched: enrollments not indexed yet,
+    those expiring inside the window (they may have been renewed since), after
+    ``UNDEPLOYED_MAX_AGE`` those without a production certificate and after
+    ``DEPLOYED_MAX_AGE`` every other one.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db_file = os.path.join(path, 'deployments.db')
+        self.db = None
+
+    def open(self):
+        if self.db is None:
+            os.makedirs(self.path, exist_ok=True)
+            self.db = sqlite3.connect(self.db_file)
+            self.db.row_factory = sqlite3.Row
+            self.db.executescript(SCHEMA)
+        return self
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def retain(self, enrollments: list):
+        """Drop enrollments that are no longer in the enrollment cache, follow CN and contract changes"""
+        self.db.execute('CREATE TEMP TABLE IF NOT EXISTS current (enrollment_id INTEGER PRIMARY KEY, contract_id TEXT, cn TEXT)')
+        self.db.execute('DELETE FROM current')
+        self.db.executemany('INSERT OR REPLACE INTO current (enrollment_id, contract_id, cn) VALUES (?, ?, ?)',
+                            [(int(enrollment['enrollmentId']), enrollment['contractId'], enrollment['cn'])
+                             for enrollment in enrollments])
+        self.db.execute('DELETE FROM deployments WHERE enrollment_id NOT IN (SELECT enrollment_id FROM current)')
+        self.db.execute('''UPDATE deployments SET
+                               contract_id = (SELECT contract_id FROM current WHERE current.enrollment_id = deployments.enrollment_id),
+                               cn = (SELECT cn FROM current WHERE current.enrollment_id = deployments.enrollment_id)''')
+
+    def stale(self, enrollments: list, until: datetime.datetime, now: float | None = None) -> list:
+        """Enrollments whose production certificate has to be fetched to know whether it expires before ``until``"""
+        now = time.time() if now is None else now
+        rows = {row['enrollment_id']: row for row in self.db.execute('SELECT * FROM deployments')}
+        until = f'{until:{DATE_FORMAT}}'
+        stale = []
+        for enrollment in enrollments:
+            row = rows.get(int(enrollment['enrollmentId']))
+            if row is None:
+                stale.append(enrollment)
+            elif row['not_after'] is None:
+                if now - row['fetched_at'] >= UNDEPLOYED_MAX_AGE:
+                    stale.append(enrollment)
+            elif row['not_after'] <= until or now - row['fetched_at'] >= DEPLOYED_MAX_AGE:
+                stale.append(enrollment)
+        return stale
+
+    def update(self, enrollment: dict, not_after: datetime.datetime | None, fetched_at: float | None = None):
+        """Record the expiration of the production certificate, None when nothing is deployed"""
+        self.db.execute('INSERT OR REPLACE INTO deployments (enrollment_id, contract_id, cn, not_after, fetched_at) VALUES (?, ?, ?, ?, ?)',
+                        (int(enrollment['enrollmentId']), enrollment['contractId'], enrollment['cn'],
+                         f'{not_after:{DATE_FORMAT}}' if not_after is not None else None,
+                         time.time() if fetched_at is None else fetched_at))
+
+    def expiring(self, until: datetime.datetime) -> list:
+        """Indexed certificates expiring before ``until``, already expired ones included, soonest first"""
+        rows = self.db.execute('''SELECT * FROM deployments WHERE not_after IS NOT NULL AND not_after <= ?
+                                  ORDER BY not_after, enrollment_id''', (f'{until:{DATE_FORMAT}}',)).fetchall()
+        return [{'enrollmentId': row['enrollment_id'], 'contractId': row['contract_id'], 'cn': row['cn'],
+                 'expiration': datetime.datetime.strptime(row['not_after'], DATE_FORMAT)} for row in rows]
+
+
+def bucket(expiring: list, now: datetime.datetime) -> dict:
+    """
+    Certificates grouped by the week they expire in, then by contract: {week: {contract: [certificates]}}.
+    Weeks start on Monday, already expired certificates are grouped under 'expired'.
+    """
+    buckets = {}
+    for certificate in sorted(expiring, key=lambda certificate: certificate['expiration']):
+        week = 'expired' if certificate['expiration'] < now else week_of(certificate['expiration'])
+        buckets.setdefault(week, {}).setdefault(certificate['contractId'], []).append(certificate)
+    return buckets
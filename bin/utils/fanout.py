@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CONCURRENCY = 10
+
+logger = logging.getLogger(__name__)
+
+
+class FanOut:
+    """
+    Bounded-concurrency fetch engine.
+
+    Runs a callable over many items on a thread pool of ``concurrency`` workers.
+    Results are yielded in input order, so callers can render rows
+    deterministically while later items are still being fetched. Only a small
+    window of items is queued ahead of the consumer, which keeps memory flat
+    for large accounts.
+    """
+
+    def __init__(self, concurrency: int | None = DEFAULT_CONCURRENCY, name: str | None = 'fan-out'):
+        self.concurrency = max(1, int(concurrency or DEFAULT_CONCURRENCY))
+        self.name = name
+        self.completed = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def map(self, fn, items, on_complete=None):
+        """
+        Yield ``fn(item)`` for every item, in the same order as ``items``.
+
+        ``on_complete`` is called without arguments as soon as any item finishes,
+        in completion order, which makes it suitable for driving a progress bar.
+        Exceptions raised by ``fn`` are re-raised when the failing item is reached.
+        """
+        self.completed = 0
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+        iterator = iter(items)
+        in_flight = deque()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=self.name) as executor:
+            def submit(item):
+                future = executor.submit(fn, item)
+                if on_complete is not None:
+                    future.add_done_callback(lambda _: on_complete())
+                in_flight.append(future)
+
+            for item in iterator:
+                submit(item)
+                if len(in_flight) >= self.concurrency * 2:
+                    break
+
+            while in_flight:
+                result = in_flight.popleft().result()
+                self.completed += 1
+                for item in iterator:
+                    submit(item)
+                    break
+                yield result
+
+        self.finished_at = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    def summary(self, unit: str | None = 'items') -> str:
+        return (f'{self.completed} {unit} in {self.elapsed:.2f}s '
+                f'({self.throughput:.2f} {unit}/s, concurrency {self.concurrency})')
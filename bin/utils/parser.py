@@ -2,27 +2,50 @@
 from __future__ import annotations
 
 import argparse
+import sys
 
-import rich_argparse as rap
 import utils.cli as cli
+from akamai_apis.defaults import DEFAULT_POOL_SIZE
+from akamai_apis.defaults import DEFAULT_RATE_LIMIT
 
+_formatters = {}
 
-class OnelineArgumentFormatter(rap.ArgumentDefaultsRichHelpFormatter, rap.RichHelpFormatter):
-    def __init__(self, prog, max_help_position=30, **kwargs):
-        super().__init__(prog, **kwargs)
-        self._max_help_position = max_help_position
 
+def _formatter_classes() -> dict:
+    """
+    Build the rich help formatters on first use. rich_argparse is only needed
+    to render help, so a regular run never imports it.
+    """
+    if not _formatters:
+        import rich_argparse as rap
 
-class CustomHelpFormatter(rap.ArgumentDefaultsRichHelpFormatter, rap.RichHelpFormatter):
-    def __init__(self, prog, indent_increment=2, max_help_position=30, width=None):
-        super().__init__(prog, indent_increment, max_help_position, width)
-        rap.RichHelpFormatter.styles['argparse.text'] = 'italic'
-        rap.RichHelpFormatter.styles['argparse.prog'] = '#D65E76'
-        rap.RichHelpFormatter.styles['argparse.args'] = '#67BEE3'
-        rap.RichHelpFormatter.styles['argparse.groups'] = '#B576BC'
-        rap.RichHelpFormatter.styles['argparse.metavar'] = 'grey50'
-        rap.RichHelpFormatter.group_name_formatter = str.upper
-        rap.RichHelpFormatter.usage_markup = True
+        class OnelineArgumentFormatter(rap.ArgumentDefaultsRichHelpFormatter, rap.RichHelpFormatter):
+            def __init__(self, prog, max_help_position=30, **kwargs):
+                super().__init__(prog, **kwargs)
+                self._max_help_position = max_help_position
+
+        class CustomHelpFormatter(rap.ArgumentDefaultsRichHelpFormatter, rap.RichHelpFormatter):
+            def __init__(self, prog, indent_increment=2, max_help_position=30, width=None):
+                super().__init__(prog, indent_increment, max_help_position, width)
+                rap.RichHelpFormatter.styles['argparse.text'] = 'italic'
+                rap.RichHelpFormatter.styles['argparse.prog'] = '#D65E76'
+                rap.RichHelpFormatter.styles['argparse.args'] = '#67BEE3'
+                rap.RichHelpFormatter.styles['argparse.groups'] = '#B576BC'
+                rap.RichHelpFormatter.styles['argparse.metavar'] = 'grey50'
+                rap.RichHelpFormatter.group_name_formatter = str.upper
+                rap.RichHelpFormatter.usage_markup = True
+
+        _formatters['oneline'] = OnelineArgumentFormatter
+        _formatters['custom'] = CustomHelpFormatter
+    return _formatters
+
+
+def OnelineArgumentFormatter(prog, **kwargs):
+    return _formatter_classes()['oneline'](prog, **kwargs)
+
+
+def CustomHelpFormatter(prog, **kwargs):
+    return _formatter_classes()['custom'](prog, **kwargs)
 
 
 class AkamaiParser(argparse.ArgumentParser):
@@ -31,10 +54,18 @@ class AkamaiParser(argparse.ArgumentParser):
         self.usage = 'akamai cps [options] [command] [subcommand] [arguments] -h'
 
     @classmethod
-    def all_command(cls, subparsers):
+    def all_command(cls, subparsers, selected=None):
+        """
+        Register every command. Only the commands in ``selected`` get their full
+        argument set, the others are listed by name and help so the top level
+        help stays complete. ``None`` builds everything.
+        """
         actions = {}
         for main_cmd_info in cli.main_commands:
             command, main_cmd_help = next(iter(main_cmd_info.items()))
+            if selected is not None and command not in selected:
+                actions[command] = subparsers.add_parser(name=command, help=main_cmd_help)
+                continue
             try:
                 sc = cli.sub_commands[command]
             except Exception:
@@ -46,11 +77,18 @@ class AkamaiParser(argparse.ArgumentParser):
                                                        optional_arguments=main_cmd_info.get('optional_arguments', []),
                                                        subcommands=sc,
                                                        options=None)
+        return actions
+
+    @staticmethod
+    def selected_commands(args) -> set:
+        """Command names present on the command line, only these need a full parser"""
+        names = {next(iter(main_cmd_info)) for main_cmd_info in cli.main_commands}
+        return names.intersection(sys.argv[1:] if args is None else args)
 
     @classmethod
     def get_args(cls, args):
         parser = argparse.ArgumentParser(prog='akamai cps',
-                                         formatter_class=CustomHelpFormatter,
+                                         formatter_class=argparse.HelpFormatter,
                                          conflict_handler='resolve', add_help=False,
                                          description='Akamai CLI for CPS',
                                          epilog='Use %(prog)s {command} [-h]/[--help] to get help on individual command')
@@ -68,6 +106,24 @@ class AkamaiParser(argparse.ArgumentParser):
                             help='section of the credentials file [$AKAMAI_EDGERC_SECTION]')
         parser.add_argument('-v', '--version', action='version', version='%(prog)s v1.0.0',
                              help='show akamai cli utility version')
+        parser.add_argument('--pool-size',
+                            metavar='', type=int, dest='pool_size', default=DEFAULT_POOL_SIZE,
+                            help='maximum number of keep-alive connections to the API')
+        parser.add_argument('--rate-limit',
+                            metavar='', type=float, dest='rate_limit', default=DEFAULT_RATE_LIMIT,
+                            help='maximum API requests per second, 0 disables throttling')
+        parser.add_argument('--no-cache', action='store_true', dest='no_cache',
+                            help='do not read or write the local API response cache')
+        parser.add_argument('--max-age',
+                            metavar='', type=int, dest='max_age',
+                            help='reuse cached API responses younger than this many seconds (overrides per endpoint defaults)')
+        parser.add_argument('--plain', action='store_true', dest='plain',
+                            help='plain text output without emoji, colors or panels, default when stderr is not a terminal')
+        parser.add_argument('--profile', action='store_true', dest='profile',
+                            help='print API call counts, retries and p50/p95/p99 latency per endpoint at exit')
+        parser.add_argument('--profile-output',
+                            metavar='', type=str, dest='profile_output',
+                            help='write the raw request samples of --profile to this JSON file')
         parser.add_argument('-h', '--help', action='help', help='show this help message and exit')
         parser.add_argument('-l', '--log-level',
                             choices=['debug', 'info', 'warning', 'error', 'critical'],
@@ -79,9 +135,22 @@ class AkamaiParser(argparse.ArgumentParser):
         optional = parser.add_argument_group('Optional Arguments')
         optional.add_argument('-v', '--verbose', action='store_true', help=argparse.SUPPRESS)
 
-        cls.all_command(subparsers)
+        cls.all_command(subparsers, cls.selected_commands(args))
+        cls.use_rich_help(parser)
         return parser.parse_args(args)
 
+    @classmethod
+    def use_rich_help(cls, parser):
+        """
+        Switch every parser to the rich help formatter once all arguments are registered.
+        argparse builds a formatter for each add_argument call, the plain one keeps that cheap.
+        """
+        parser.formatter_class = CustomHelpFormatter
+        for action in parser._actions:
+            if isinstance(action, argparse._SubParsersAction):
+                for subparser in action.choices.values():
+                    cls.use_rich_help(subparser)
+
     @classmethod
     def create_main_command(cls, subparsers, name, help,
                             required_arguments=None,
@@ -94,7 +163,7 @@ class AkamaiParser(argparse.ArgumentParser):
                                        help=help,
                                        add_help=True,
                                        usage=None,
-                                       formatter_class=CustomHelpFormatter)
+                                       formatter_class=argparse.HelpFormatter)
 
         if subcommands:
             subparsers = action.add_subparsers(title=name, metavar='', dest='subcommand')
@@ -114,13 +183,11 @@ class AkamaiParser(argparse.ArgumentParser):
         if options:
             options_group = action.add_argument_group('Options')
             for option in options:
-                option_name = option['name']
-                del option['name']
-                try:
-                    action_value = option['action']
-                    del option['action']
-                    options_group.add_argument(f'--{option_name}', action=action_value, **option)
-                except KeyError:
+                option = dict(option)
+                option_name = option.pop('name')
+                if 'action' in option:
+                    options_group.add_argument(f'--{option_name}', **option)
+                else:
                     options_group.add_argument(f'--{option_name}', metavar='', **option)
         return action
 
@@ -140,13 +207,11 @@ class AkamaiParser(argparse.ArgumentParser):
         if required_arguments:
             required = action.add_argument_group('Required Arguments')
             for arg in required_arguments:
-                name = arg['name']
-                del arg['name']
-                try:
-                    action_value = arg['action']
-                    del arg['action']
-                    required.add_argument(f'--{name}', action=action_value, **arg)
-                except KeyError:
+                arg = dict(arg)
+                name = arg.pop('name')
+                if 'action' in arg:
+                    required.add_argument(f'--{name}', **arg)
+                else:
                     required.add_argument(f'--{name}', metavar='', **arg)
 
         if optional_arguments:
@@ -157,13 +222,11 @@ class AkamaiParser(argparse.ArgumentParser):
                 elif arg['name'] == '--property-id':
                     cls.add_mutually_exclusive_group(action, arg, '--group-id')
                 else:
-                    name = arg['name']
-                    del arg['name']
-                    try:
-                        action_value = arg['action']
-                        del arg['action']
-                        optional.add_argument(f'--{name}', required=False, action=action_value, **arg)
-                    except KeyError:
+                    arg = dict(arg)
+                    name = arg.pop('name')
+                    if 'action' in arg:
+                        optional.add_argument(f'--{name}', required=False, **arg)
+                    else:
                         optional.add_argument(f'--{name}', metavar='', required=False, **arg)
 
             optional.add_argument('--log-level',
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import csv
+import datetime
+import json
+import os
+import sys
+import time
+
+from xlsxwriter.workbook import Workbook
+
+STDOUT = '-'
+DEFAULT_FLUSH_ROWS = 100
+DEFAULT_FLUSH_INTERVAL = 1.0
+DATE_FORMAT = 'yyyy-mm-dd hh:mm:ss "UTC"'
+
+
+def csv_cell(value):
+    """Render a cell the way the csv report shows it, dates are written in UTC"""
+    if isinstance(value, datetime.datetime):
+        return f'{value:%Y-%m-%d %H:%M:%S} UTC'
+    return value
+
+
+class StreamReport:
+    """
+    Base of the line oriented report writers.
+
+    One buffered handle stays open for the whole report and is flushed every
+    ``flush_rows`` rows or ``flush_interval`` seconds, whichever comes first.
+    An output file of ``-`` streams to stdout.
+    """
+
+    def __init__(self, output_file: str, flush_rows: int = DEFAULT_FLUSH_ROWS,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.output_file = output_file
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.rows = 0
+        self._handle = None
+        self._pending = 0
+        self._flushed_at = 0.0
+
+    @property
+    def to_stdout(self) -> bool:
+        return self.output_file == STDOUT
+
+    def _open_handle(self, mode: str = 'w'):
+        if self.to_stdout:
+            self._handle = sys.stdout
+        else:
+            self._handle = open(self.output_file, mode, newline='', encoding='utf8', buffering=1024 * 1024)
+        self._flushed_at = time.monotonic()
+
+    def _written(self):
+        self.rows += 1
+        self._pending += 1
+        if self._pending >= self.flush_rows or time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self._handle.flush()
+        self._pending = 0
+        self._flushed_at = time.monotonic()
+
+    def close(self):
+        if self._handle is not None:
+            self.flush()
+            if not self.to_stdout:
+                self._handle.close()
+            self._handle = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvReport(StreamReport):
+    """
+    Streaming CSV report writer, every row goes through ``csv.writer`` so fields
+    containing commas or quotes are escaped.
+    """
+
+    def __init__(self, output_file: str, header: list, **kwargs):
+        super().__init__(output_file, **kwargs)
+        self.header = header
+        self._writer = None
+
+    def open(self):
+        if self._handle is None:
+            self._open_handle()
+            self._writer = csv.writer(self._handle)
+            self._writer.writerow(self.header)
+        return self
+
+    def write(self, row: list):
+        self._writer.writerow([csv_cell(value) for value in row])
+        self._written()
+
+
+def completed_records(output_file: str, key: str) -> tuple:
+    """
+    Read the records of an existing NDJSON report.
+
+    Returns the ``key`` value of every complete record and the byte offset
+    right after the last one, a line cut short by an interrupted run ends the scan.
+    """
+    completed = set()
+    offset = 0
+    with open(output_file, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if isinstance(record, dict) and key in record:
+                completed.add(record[key])
+            offset += len(line)
+    return completed, offset
+
+
+class NdjsonReport(StreamReport):
+    """
+    Streaming NDJSON (JSON Lines) report writer, one compact JSON object per line.
+
+    With ``resume`` an existing report is kept: records already in it are listed
+    in ``completed`` so the caller can skip them, a trailing partial line is cut
+    off and new records are appended.
+    """
+
+    def __init__(self, output_file: str, key: str = 'enrollmentId', resume: bool = False, **kwargs):
+        super().__init__(output_file, **kwargs)
+        self.key = key
+        self.resume = resume
+        self.completed = set()
+
+    def open(self):
+        if self._handle is None:
+            mode = 'w'
+            if self.resume and not self.to_stdout and os.path.isfile(self.output_file):
+                self.completed, offset = completed_records(self.output_file, self.key)
+                os.truncate(self.output_file, offset)
+                mode = 'a'
+            self._open_handle(mode)
+        return self
+
+    def write(self, record: dict):
+        self._handle.write(json.dumps(record, separators=(',', ':'), default=csv_cell))
+        self._handle.write('\n')
+        self._written()
+
+
+class XlsxReport:
+    """
+    Streaming xlsx report writer.
+
+    Rows go straight into the workbook as they are produced. The workbook runs
+    in xlsxwriter's ``constant_memory`` mode, so every row is flushed to disk
+    once the next one starts and memory use does not grow with the report.
+    Dates are written as real date cells and the header row gets an autofilter.
+    """
+
+    def __init__(self, output_file: str, header: list, sheet_name: str = 'Certificate', column_width: int = 20):
+        self.output_file = output_file
+        self.header = header
+        self.sheet_name = sheet_name
+        self.column_width = column_width
+        self.rows = 0
+        self._workbook = None
+        self._worksheet = None
+        self._header_format = None
+        self._date_format = None
+
+    def open(self):
+        if self._workbook is None:
+            self._workbook = Workbook(self.output_file, {'constant_memory': True})
+            self._worksheet = self._workbook.add_worksheet(self.sheet_name)
+            self._header_format = self._workbook.add_format({'bold': True})
+            self._date_format = self._workbook.add_format({'num_format': DATE_FORMAT})
+            self._worksheet.set_column(0, len(self.header) - 1, self.column_width)
+            self._worksheet.freeze_panes(1, 0)
+            self._worksheet.write_row(0, 0, self.header, self._header_format)
+        return self
+
+    def write(self, row: list):
+        self.rows += 1
+        for column, value in enumerate(row):
+            if isinstance(value, datetime.datetime):
+                self._worksheet.write_datetime(self.rows, column, value.replace(tzinfo=None), self._date_format)
+            elif value is None or value == '':
+                self._worksheet.write_blank(self.rows, column, None)
+            else:
+                self._worksheet.write(self.rows, column, value)
+
+    def close(self):
+        if self._workbook is not None:
+            self._worksheet.autofilter(0, 0, self.rows, len(self.header) - 1)
+            self._workbook.close()
+            self._workbook = None
+            self._worksheet = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import datetime
+import json
+import os
+import re
+import sqlite3
+import time
+
+from akamai_apis.models import Deployment
+from akamai_apis.models import Enrollment
+from utils.audit import AUDIT_COLUMN_KEYS
+from utils.audit import audit_row
+
+SNAPSHOT_VERSION = 1
+BATCH_ROWS = 500
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+DEFAULT_COLUMNS = ['contract', 'enrollment_id', 'cn', 'status', 'validation', 'expiration', 'days_left']
+
+# Columns of the audit report, then what the audit does not show. The enrollment column keeps the
+# raw enrollment json for questions the columns do not answer, e.g. json_extract(enrollment, '$.ra')
+COLUMN_TYPES = dict.fromkeys(AUDIT_COLUMN_KEYS, 'TEXT')
+COLUMN_TYPES.update({'enrollment_id': 'INTEGER PRIMARY KEY', 'sni_only': 'INTEGER', 'ra': 'TEXT', 'pending_change_id': 'INTEGER',
+                     'san_count': 'INTEGER', 'issuer': 'TEXT', 'serial': 'TEXT', 'key_type': 'TEXT', 'key_size': 'INTEGER',
+                     'not_valid_before': 'TEXT', 'enrollment': 'TEXT'})
+
+SCHEMA = f'''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE enrollments ({', '.join(f'{column} {sql_type}' for column, sql_type in COLUMN_TYPES.items())});
+CREATE INDEX idx_enrollments_contract ON enrollments (contract);
+CREATE INDEX idx_enrollments_expiration ON enrollments (expiration);
+CREATE VIEW certificates AS
+    SELECT *, CAST(julianday(expiration) - julianday('now') AS INTEGER) AS days_left FROM enrollments;
+'''
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def snapshot_value(value):
+    """Audit cell as stored in the snapshot, empty cells are NULL and dates ISO text"""
+    if value == '' or value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return f'{value:{DATE_FORMAT}}'
+    return value
+
+
+def snapshot_record(enrollment_json: dict, contract_id: str, enrollment_id: int, deployment_json: dict | None = None) -> dict:
+    """One snapshot row: the audit row of the enrollment and the fields of its production certificate"""
+    enrollment = Enrollment.from_json(enrollment_json, contract_id)
+    deployment = Deployment.from_json(deployment_json, enrollment_id) if deployment_json else None
+    expiration = deployment.not_valid_after if deployment is not None else ''
+    record = {key: snapshot_value(value)
+              for key, value in zip(AUDIT_COLUMN_KEYS, audit_row(enrollment, contract_id, enrollment_id, expiration))}
+    record.update(ra=enrollment_json.get('ra'), pending_change_id=enrollment.pending_change_id, san_count=len(enrollment.sans),
+                  enrollment=json.dumps(enrollment_json, separators=(',', ':')), issuer=None, serial=None, key_type=None,
+                  key_size=None, not_valid_before=None)
+    if deployment is not None:
+        decoded = deployment.decoded
+        record.update(issuer=decoded.issuer, serial=f'{decoded.serial:x}', key_type=decoded.key_type, key_size=decoded.key_size,
+                      not_valid_before=snapshot_value(decoded.not_valid_before))
+    return record
+
+
+class SnapshotWriter:
+    """
+    Writes a new snapshot next to the current one and replaces it on close, queries
+    keep reading the previous snapshot until the new one is complete. ``meta`` is
+    stored with the snapshot.
+    """
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self.tmp_file = f'{db_file}.tmp'
+        self.rows = 0
+        self.meta = {}
+        self.db = None
+        self._pending = []
+
+    def open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_file)), exist_ok=True)
+        if os.path.exists(self.tmp_file):
+            os.remove(self.tmp_file)
+        self.db = sqlite3.connect(self.tmp_file)
+        self.db.executescript(SCHEMA)
+        return self
+
+    def add(self, enrollment_json: dict, contract_id: str, enrollment_id: int, deployment_json: dict | None = None):
+        self._pending.append(snapshot_record(enrollment_json, contract_id, enrollment_id, deployment_json))
+        if len(self._pending) >= BATCH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            columns = list(COLUMN_TYPES)
+            self.db.executemany(f'INSERT OR REPLACE INTO enrollments ({", ".join(columns)}) '
+                                f'VALUES ({", ".join("?" * len(columns))})',
+                                [[record[column] for column in columns] for record in self._pending])
+            self.rows += len(self._pending)
+            self._pending = []
+
+    def close(self):
+        """Commit the snapshot and make it the current one"""
+        if self.db is None:
+            return
+        self._flush()
+        self.meta.update(version=SNAPSHOT_VERSION, created=time.strftime(DATE_FORMAT, time.gmtime()), enrollments=self.rows)
+        self.db.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                            [(key, str(value)) for key, value in self.meta.items()])
+        self.db.commit()
+        self.db.close()
+        self.db = None
+        os.replace(self.tmp_file, self.db_file)
+
+    def discard(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+        if os.path.exists(self.tmp_file):
+            os.remove(self.tmp_file)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class Snapshot:
+    """
+    Read-only access to a snapshot. ``select`` filters, sorts and groups the
+    ``certificates`` view (the enrollments table plus ``days_left``), ``query``
+    runs any read-only SQL statement.
+    """
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self.db = None
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.db_file)
+
+    def open(self):
+        if self.db is None:
+            if not self.exists():
+                raise SnapshotError(f'No snapshot found at {self.db_file}')
+            self.db = sqlite3.connect(f'file:{self.db_file}?mode=ro', uri=True)
+        return self
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def meta(self) -> dict:
+        return dict(self.db.execute('SELECT key, value FROM meta').fetchall())
+
+    def columns(self) -> list:
+        return [row[1] for row in self.db.execute('PRAGMA table_info(certificates)').fetchall()]
+
+    def query(self, sql: str, params=()) -> tuple:
+        """Column names and rows of a read-only SQL statement"""
+        try:
+            cursor = self.db.execute(sql, params)
+        except sqlite3.Error as err:
+            raise SnapshotError(str(err)) from err
+        return [description[0] for description in cursor.description or ()], cursor.fetchall()
+
+    def _identifiers(self, names) -> list:
+        known = self.columns()
+        for name in names:
+            if not IDENTIFIER.match(name) or name not in known:
+                raise SnapshotError(f'Unknown column {name!r}, the columns are: {", ".join(known)}')
+        return list(names)
+
+    def select(self, columns: list | None = None, where: str | None = None, sort: list | None = None,
+               group_by: list | None = None, limit: int | None = None) -> tuple:
+        """
+        Rows of the certificates view. ``where`` is an SQL condition, ``sort`` lists
+        columns with an optional ``:desc`` suffix. With ``group_by`` one row per group
+        is returned with the number of enrollments and the earliest expiration.
+        """
+        if group_by:
+            selected = ', '.join(self._identifiers(group_by)) + ', COUNT(*) AS enrollments, MIN(expiration) AS earliest_expiration'
+        else:
+            selected = ', '.join(self._identifiers(columns or DEFAULT_COLUMNS))
+        sql = f'SELECT {selected} FROM certificates'
+        if where:
+            sql += f' WHERE {where}'
+        if group_by:
+            sql += f' GROUP BY {", ".join(group_by)}'
+        order = []
+        for key in sort or ([] if group_by else ['enrollment_id']):
+            name, _, direction = key.partition(':')
+            if name not in ('enrollments', 'earliest_expiration') or not group_by:
+                self._identifiers([name])
+            order.append(f'{name} {"DESC" if direction.lower() == "desc" else "ASC"}')
+        if group_by and not order:
+            order.append('enrollments DESC')
+        sql += f' ORDER BY {", ".join(order)}'
+        if limit:
+            sql += f' LIMIT {int(limit)}'
+        return self.query(sql)
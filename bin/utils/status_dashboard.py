@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+from akamai_apis.models import Change
+
+NO_PENDING_CHANGES = 'no pending changes'
+UNAVAILABLE = 'unavailable'
+
+# states that need someone to act are listed first
+STATE_ORDER = ['error', 'wait-input', 'wait-review-third-party-cert', 'wait-ack-change-management']
+
+COLUMNS = ['Enrollment ID', 'Common Name', 'Change ID', 'State', 'Allowed Input', 'Status', 'Description']
+
+
+def read_enrollment_ids(path: str) -> list:
+    """
+    Enrollment ids listed in a file, separated by new lines, commas or spaces. Blank lines and
+    anything after a # are ignored, duplicates are kept only once.
+    """
+    enrollment_ids = []
+    with open(path) as f:
+        for line in f:
+            for value in line.split('#', 1)[0].replace(',', ' ').split():
+                enrollment_id = int(value)
+                if enrollment_id not in enrollment_ids:
+                    enrollment_ids.append(enrollment_id)
+    return enrollment_ids
+
+
+def pending_change_id(pending_changes: list) -> int | None:
+    """Change id of the first pending change, list entries are change objects or plain locations"""
+    if not pending_changes:
+        return None
+    change = pending_changes[0]
+    location = change['location'] if isinstance(change, dict) else change
+    return int(location.split('/')[-1])
+
+
+def summarize(enrollment_id, cn: str, change_id=None, change_status_json: dict | None = None,
+              error: str | None = None) -> dict:
+    """One dashboard row for an enrollment, from its change status when it has a pending change"""
+    row = {'enrollmentId': enrollment_id, 'cn': cn or '', 'changeId': change_id or '',
+           'state': NO_PENDING_CHANGES, 'allowedInput': '', 'status': '', 'description': ''}
+    if error is not None:
+        row.update(state=UNAVAILABLE, description=error)
+    elif change_status_json is not None:
+        change = Change.from_json(change_status_json, enrollment_id, change_id)
+        row.update(state=change.state or '', status=change.status or '', allowedInput=change.next_input,
+                   description=change.error_description)
+    return row
+
+
+def fetch_change_summary(cps, enrollment_info: dict) -> dict:
+    """
+    Dashboard row of one enrollment, run on a worker of the status fan-out. The enrollment is only
+    read when ``enrollment_info`` has no pendingChanges, i.e. it does not come from the enrollments list.
+    A request that failed after its retries or an unreadable response is one row, the dashboard carries on.
+    """
+    enrollment_id = enrollment_info['enrollmentId']
+    cn = enrollment_info.get('cn', '')
+    change_id = None
+    try:
+        pending_changes = enrollment_info.get('pendingChanges')
+        if pending_changes is None:
+            response = cps.get_enrollment(enrollment_id)
+            if response.status_code != 200:
+                return summarize(enrollment_id, cn,
+                                 error=f'Invalid API Response ({response.status_code}): Unable to get enrollment details')
+            enrollment = response.json()
+            cn = (enrollment.get('csr') or {}).get('cn', cn)
+            pending_changes = enrollment.get('pendingChanges')
+
+        change_id = pending_change_id(pending_changes)
+        if change_id is None:
+            return summarize(enrollment_id, cn)
+        response = cps.get_change_status(enrollment_id, change_id)
+        if response.status_code != 200:
+            return summarize(enrollment_id, cn, change_id,
+                             error=f'Invalid API Response ({response.status_code}): Unable to determine change status')
+        return summarize(enrollment_id, cn, change_id, response.json())
+    except Exception as err:
+        return summarize(enrollment_id, cn, change_id, error=f'{type(err).__name__}: {err}')
+
+
+class StatusDashboard:
+    """
+    Aggregated change status of many enrollments.
+
+    Rows arrive in any order while the change statuses are fetched, ``table``
+    renders them grouped by state and allowed input, states that need someone
+    to act first, with a section line between groups. The table is redrawn by
+    a ``rich.live.Live`` on every update.
+    """
+
+    def __init__(self, title: str | None = 'Pending changes', total: int | None = None):
+        self.title = title
+        self.total = total
+        self.rows = []
+
+    def add(self, row: dict):
+        self.rows.append(row)
+
+    @staticmethod
+    def group(row: dict) -> tuple:
+        state = row['state']
+        if state in STATE_ORDER:
+            rank = STATE_ORDER.index(state)
+        elif state in (NO_PENDING_CHANGES, UNAVAILABLE):
+            rank = len(STATE_ORDER) + 1
+        else:
+            rank = len(STATE_ORDER)
+        return (rank, state, row['allowedInput'])
+
+    def grouped(self) -> list:
+        """(state, allowed input, rows) tuples in display order"""
+        groups = {}
+        for row in sorted(self.rows, key=lambda row: (self.group(row), str(row['enrollmentId']))):
+            groups.setdefault(self.group(row), []).append(row)
+        return [(key[1], key[2], rows) for key, rows in groups.items()]
+
+    def counts(self) -> dict:
+        counts = {}
+        for row in self.rows:
+            counts[row['state']] = counts.get(row['state'], 0) + 1
+        return counts
+
+    def caption(self) -> str:
+        done = f'{len(self.rows)} of {self.total}' if self.total is not None else str(len(self.rows))
+        states = ', '.join(f'{state}: {count}' for state, count in sorted(self.counts().items()))
+        return f'{done} enrollments' + (f' ({states})' if states else '')
+
+    def table(self):
+        from rich.table import Table
+
+        table = Table(title=self.title, caption=self.caption(), show_lines=False)
+        for column in COLUMNS:
+            table.add_column(column, overflow='fold')
+        groups = self.grouped()
+        for index, (_, _, rows) in enumerate(groups):
+            for position, row in enumerate(rows):
+                table.add_row(str(row['enrollmentId']), row['cn'], str(row['changeId']), row['state'],
+                              row['allowedInput'], row['status'], row['description'],
+                              end_section=position == len(rows) - 1 and index < len(groups) - 1)
+        return table
+
+    def text(self) -> str:
+        """The table as plain text, for output that is not read on a terminal"""
+        from prettytable import PrettyTable
+
+        table = PrettyTable(COLUMNS)
+        table.align = 'l'
+        for _, _, rows in self.grouped():
+            for row in rows:
+                table.add_row([row['enrollmentId'], row['cn'], row['changeId'], row['state'], row['allowedInput'],
+                               row['status'], row['description']])
+        return f'{self.title}\n{table}\n{self.caption()}'
+
+    def __rich__(self):
+        return self.table()
@@ -2,8 +2,8 @@ from __future__ import annotations
 
 import logging
 
-import requests
 import utils.emojis as emoji
+from akamai_apis.auth import shared_session
 from akamai_apis.cps import Cps
 
 
@@ -12,7 +12,7 @@ class utility():
         self.logger = logger
         self.hostnames = []
         self.waiting = f'{emoji.clock} waiting'
-        self.s = requests.Session()
+        self.s = shared_session()
         self.max_column_width = 20
         self.column_width = 30
 
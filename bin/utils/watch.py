@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import time
+
+from akamai_apis.models import Change
+
+# exit codes of status --watch, one per way a change stops being watched
+WATCH_COMPLETE = 0
+WATCH_INPUT_REQUIRED = 2
+WATCH_ERROR = 3
+WATCH_CANCELLED = 4
+WATCH_TIMEOUT = 5
+
+COMPLETE_STATES = ('complete', 'completed')
+CANCELLED_STATES = ('cancelled', 'canceled')
+
+# (first, longest) seconds between polls per change state. The interval starts
+# short whenever the state changes and grows while it stays the same, a change
+# that was just acknowledged moves on within minutes while deployments and
+# domain validation take hours.
+POLL_INTERVALS = {
+    'wait': (10.0, 60.0),
+    'running': (30.0, 600.0),
+}
+DEFAULT_POLL_INTERVAL = (30.0, 300.0)
+BACKOFF_FACTOR = 1.5
+
+# input that was already waiting when the watch started is the input just
+# given with proceed, CPS takes a moment to process it
+ACK_GRACE_PERIOD = 180.0
+
+
+class WatchError(Exception):
+    """The change status could not be read, the watch stops"""
+
+
+def outcome(change: Change) -> int | None:
+    """Exit code for a change that reached a terminal state, None while it is in progress"""
+    if change.state in COMPLETE_STATES:
+        return WATCH_COMPLETE
+    if change.state in CANCELLED_STATES:
+        return WATCH_CANCELLED
+    if change.state == 'error':
+        return WATCH_ERROR
+    if change.input_required:
+        return WATCH_INPUT_REQUIRED
+    return None
+
+
+class AdaptiveInterval:
+    """Seconds to wait before the next poll, reset when the state changes and backed off while it does not"""
+
+    def __init__(self, intervals: dict | None = None, factor: float = BACKOFF_FACTOR):
+        self.intervals = POLL_INTERVALS if intervals is None else intervals
+        self.factor = factor
+        self.state = None
+        self.current = None
+
+    def bounds(self, state: str) -> tuple:
+        if state in self.intervals:
+            return self.intervals[state]
+        return self.intervals.get(state.split('-')[0], DEFAULT_POLL_INTERVAL)
+
+    def next(self, state: str) -> float:
+        first, longest = self.bounds(state)
+        if state != self.state or self.current is None:
+            self.state = state
+            self.current = first
+        else:
+            self.current = min(longest, self.current * self.factor)
+        return self.current
+
+
+class ChangeWatcher:
+    """
+    Polls the status of one change until it reaches a terminal state.
+
+    ``poll`` returns the change status json, it is the only request made per
+    round, and raises WatchError when it cannot. ``watch`` returns the exit
+    code and the last change status: complete, waiting for input, error,
+    cancelled, or timed out.
+    """
+
+    def __init__(self, poll, interval: AdaptiveInterval | None = None, timeout: float | None = None,
+                 grace_period: float = ACK_GRACE_PERIOD, clock=time.monotonic, sleep=time.sleep):
+        self.poll = poll
+        self.interval = interval or AdaptiveInterval()
+        self.timeout = timeout
+        self.grace_period = grace_period
+        self.clock = clock
+        self.sleep = sleep
+        self.polls = 0
+
+    def watch(self, on_update=None) -> tuple:
+        """``on_update(change_status_json, next_poll_in)`` is called after every poll, next_poll_in is None at the end"""
+        started = self.clock()
+        initial_input = None
+        while True:
+            change_status_json = self.poll()
+            self.polls += 1
+            elapsed = self.clock() - started
+            change = Change.from_json(change_status_json)
+            if self.polls == 1:
+                initial_input = change.next_input
+
+            code = outcome(change)
+            if code == WATCH_INPUT_REQUIRED and change.next_input == initial_input and elapsed < self.grace_period:
+                code = None
+            state = change.state or ''
+            if code is None and self.timeout is not None and elapsed >= self.timeout:
+                code = WATCH_TIMEOUT
+            if code is not None:
+                if on_update is not None:
+                    on_update(change_status_json, None)
+                return code, change_status_json
+
+            delay = self.interval.next(state)
+            if self.timeout is not None:
+                delay = max(0.0, min(delay, self.timeout - elapsed))
+            if on_update is not None:
+                on_update(change_status_json, delay)
+            self.sleep(delay)
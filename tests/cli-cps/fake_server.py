@@ -0,0 +1,526 @@
+"""
+Local stand-in for the CPS, Identity Management and contract APIs.
+
+Serves a synthetic account of any size over HTTP or HTTPS with configurable
+latency, server error rate and 429 injection, so tests and benchmarks can run
+``setup``, ``list``, ``audit`` and ``status`` without the network. Covered
+endpoints: contracts, account switch keys, enrollments (list, get, create,
+update, delete), deployments, change status, change cancellation and change
+history. Requests are not authenticated, any EdgeGrid signature is accepted.
+
+The CLI builds ``https://`` URLs from the host in .edgerc, so serve with TLS
+and point ``REQUESTS_CA_BUNDLE`` at ``server.ca_file``::
+
+    python tests/cli-cps/fake_server.py --enrollments 5000 --latency 0.05 --tls --edgerc /tmp/fake.edgerc
+
+``CliRunner`` does that for tests, it runs ``bin/akamai-cps.py`` commands
+against a TLS server in a subprocess.
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import hashlib
+import ipaddress
+import json
+import os
+import random
+import re
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'bin', 'akamai-cps.py')
+FIRST_ENROLLMENT_ID = 10000
+FIRST_CHANGE_ID = 500000
+VALIDATION_TYPES = ['dv', 'dv', 'dv', 'ov', 'ev', 'third-party']
+CHANGE_STATES = [
+    ('wait-input', 'wait-review-pre-verification-warnings', 'post-verification-warnings-acknowledgement'),
+    ('wait-input', 'wait-upload-third-party', 'third-party-certificate'),
+    ('wait-input', 'wait-dv-challenge', 'lets-encrypt-challenges'),
+    ('running', 'coordinate-domain-validation', None),
+    ('running', 'deploy-cert-to-staging', None),
+    ('error', 'error', None),
+]
+SUMMARY_FIELDS = ('id', 'location', 'ra', 'validationType', 'certificateType', 'changeManagement', 'csr',
+                  'networkConfiguration', 'pendingChanges')
+CONTACT = {'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane.doe@example.com', 'phone': '+1-617-555-0100',
+           'organizationName': 'Example Inc', 'title': 'Engineer', 'addressLineOne': '1 Main St', 'addressLineTwo': None,
+           'city': 'Cambridge', 'region': 'MA', 'postalCode': '02142', 'country': 'US'}
+
+
+class SyntheticAccount:
+    """
+    Deterministic account with ``enrollments`` enrollments spread over ``contracts`` contracts.
+
+    Every value derives from the enrollment index and ``seed``: validation and
+    certificate type, SANs, a pending change for about ``pending_ratio`` of
+    them, and a production certificate expiring between 30 days ago and 365
+    days from ``now``. Every 20th enrollment has no deployment yet.
+    """
+
+    def __init__(self, contracts: int = 2, enrollments: int = 100, pending_ratio: float = 0.1, sans: int = 3,
+                 seed: int = 0, account_name: str = 'Synthetic Account', now: datetime.datetime | None = None):
+        self.contract_ids = [f'K-{index:04d}' for index in range(1, contracts + 1)]
+        self.enrollment_ids = list(range(FIRST_ENROLLMENT_ID, FIRST_ENROLLMENT_ID + enrollments))
+        self.pending_ratio = pending_ratio
+        self.sans = sans
+        self.seed = seed
+        self.account_name = account_name
+        self.now = now or datetime.datetime.utcnow().replace(microsecond=0)
+        self.deleted = set()
+        self.completed = set()
+        self.version = 0
+        self._enrollments = {}
+        self._certificates = {}
+        self._lock = threading.Lock()
+        self.key = ec.generate_private_key(ec.SECP256R1())
+        self.ca_name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'Fake CPS CA')])
+        self.ca_certificate = self._sign(self.ca_name, self.key.public_key(), self.now - datetime.timedelta(days=1),
+                                         self.now + datetime.timedelta(days=3650), ca=True)
+
+    def _rng(self, enrollment_id: int) -> random.Random:
+        return random.Random(self.seed * 1000003 + enrollment_id)
+
+    def _sign(self, subject, public_key, not_before, not_after, sans=(), ca=False) -> x509.Certificate:
+        builder = (x509.CertificateBuilder().subject_name(subject).issuer_name(self.ca_name).public_key(public_key)
+                   .serial_number(x509.random_serial_number()).not_valid_before(not_before).not_valid_after(not_after)
+                   .add_extension(x509.BasicConstraints(ca=ca, path_length=None), critical=True))
+        if sans:
+            builder = builder.add_extension(x509.SubjectAlternativeName(list(sans)), critical=False)
+        return builder.sign(self.key, hashes.SHA256())
+
+    def contract_of(self, enrollment_id: int) -> str:
+        return self.contract_ids[(enrollment_id - FIRST_ENROLLMENT_ID) % len(self.contract_ids)]
+
+    def exists(self, enrollment_id: int) -> bool:
+        return enrollment_id in self._enrollment_set() and enrollment_id not in self.deleted
+
+    def _enrollment_set(self) -> range:
+        return range(FIRST_ENROLLMENT_ID, FIRST_ENROLLMENT_ID + len(self.enrollment_ids))
+
+    def change_id(self, enrollment_id: int) -> int | None:
+        if enrollment_id in self.completed:
+            return None
+        if self._rng(enrollment_id).random() < self.pending_ratio:
+            return FIRST_CHANGE_ID + enrollment_id
+        return None
+
+    def enrollment(self, enrollment_id: int) -> dict:
+        with self._lock:
+            if enrollment_id not in self._enrollments:
+                self._enrollments[enrollment_id] = self._build_enrollment(enrollment_id)
+            return self._enrollments[enrollment_id]
+
+    def _build_enrollment(self, enrollment_id: int) -> dict:
+        rng = self._rng(enrollment_id)
+        index = enrollment_id - FIRST_ENROLLMENT_ID
+        validation_type = VALIDATION_TYPES[index % len(VALIDATION_TYPES)]
+        cn = f'www{index}.{self.contract_of(enrollment_id).lower()}.example.com'
+        sans = [cn] + [f'san{number}.{cn}' for number in range(rng.randint(0, self.sans))]
+        location = f'/cps/v2/enrollments/{enrollment_id}'
+        change_id = self.change_id(enrollment_id)
+        pending_changes = []
+        if change_id is not None:
+            pending_changes.append({'location': f'{location}/changes/{change_id}', 'changeType': 'renewal'})
+        return {
+            'id': enrollment_id, 'location': location, 'ra': 'lets-encrypt' if validation_type == 'dv' else 'symantec',
+            'validationType': validation_type,
+            'certificateType': 'third-party' if validation_type == 'third-party' else 'san',
+            'changeManagement': index % 5 == 0, 'enableMultiStackedCertificates': False, 'signatureAlgorithm': 'SHA-256',
+            'csr': {'cn': cn, 'sans': sans, 'c': 'US', 'st': 'MA', 'l': 'Cambridge', 'o': 'Example Inc', 'ou': 'IT'},
+            'networkConfiguration': {'geography': 'core', 'secureNetwork': 'enhanced-tls', 'sniOnly': True,
+                                     'mustHaveCiphers': 'ak-akamai-default', 'preferredCiphers': 'ak-akamai-default',
+                                     'disallowedTlsVersions': ['TLSv1', 'TLSv1_1'], 'quicEnabled': False,
+                                     'clone-dns-names': True, 'dnsNameSettings': {'cloneDnsNames': True, 'dnsNames': sans}},
+            'adminContact': CONTACT, 'techContact': dict(CONTACT, email='tech@example.com'), 'org': None,
+            'thirdParty': {'excludeSans': False} if validation_type == 'third-party' else None,
+            'pendingChanges': pending_changes, 'maxAllowedSanNames': 100, 'maxAllowedWildcardSanNames': 100,
+        }
+
+    def enrollments_of(self, contract_id: str | None) -> list:
+        """Enrollment summaries as listed by GET /cps/v2/enrollments"""
+        enrollments = []
+        for enrollment_id in self.enrollment_ids:
+            if enrollment_id in self.deleted or (contract_id and self.contract_of(enrollment_id) != contract_id):
+                continue
+            enrollment = self.enrollment(enrollment_id)
+            enrollments.append({key: enrollment[key] for key in SUMMARY_FIELDS})
+        return enrollments
+
+    def not_valid_after(self, enrollment_id: int) -> datetime.datetime:
+        days = (enrollment_id * 37) % 395 - 30
+        return self.now + datetime.timedelta(days=days, hours=enrollment_id % 24)
+
+    def deployment(self, enrollment_id: int, network: str) -> dict | None:
+        if (enrollment_id - FIRST_ENROLLMENT_ID) % 20 == 19:
+            return None
+        with self._lock:
+            pem = self._certificates.get(enrollment_id)
+        if pem is None:
+            enrollment = self.enrollment(enrollment_id)
+            leaf_key = ec.generate_private_key(ec.SECP256R1())
+            subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, enrollment['csr']['cn'])])
+            leaf = self._sign(subject, leaf_key.public_key(), self.now - datetime.timedelta(days=60),
+                              self.not_valid_after(enrollment_id), [x509.DNSName(san) for san in enrollment['csr']['sans']])
+            pem = leaf.public_bytes(serialization.Encoding.PEM).decode()
+            with self._lock:
+                self._certificates[enrollment_id] = pem
+        return {'certificate': pem, 'trustChain': self.ca_certificate.public_bytes(serialization.Encoding.PEM).decode(),
+                'network': network, 'primaryCertificate': {'certificate': pem, 'keyAlgorithm': 'ECDSA'},
+                'multiStackedCertificates': []}
+
+    def change_status(self, enrollment_id: int, change_id: int) -> dict | None:
+        if self.change_id(enrollment_id) != change_id:
+            return None
+        state, status, input_type = CHANGE_STATES[enrollment_id % len(CHANGE_STATES)]
+        allowed_input = []
+        if input_type is not None:
+            info = f'/cps/v2/enrollments/{enrollment_id}/changes/{change_id}/input/info/{input_type}'
+            allowed_input.append({'type': input_type, 'requiredToProceed': True, 'info': info,
+                                  'update': info.replace('/info/', '/update/')})
+        status_info = {'state': state, 'status': status, 'description': f'Change is {status.replace("-", " ")}',
+                       'deploymentSchedule': None}
+        if state == 'error':
+            status_info['error'] = {'code': 'FAKE-001', 'description': 'Synthetic error', 'timestamp': self.now.isoformat()}
+        return {'statusInfo': status_info, 'allowedInput': allowed_input}
+
+    def change_history(self, enrollment_id: int) -> dict:
+        changes = [{'action': 'new-certificate', 'status': 'completed', 'createdOn': '2023-01-01T00:00:00Z',
+                    'primaryCertificateOrderDetails': {'geotrustOrderId': None}}]
+        if self.change_id(enrollment_id) is not None:
+            changes.insert(0, {'action': 'renew', 'status': 'incomplete', 'createdOn': self.now.isoformat() + 'Z',
+                               'primaryCertificateOrderDetails': {'geotrustOrderId': str(enrollment_id * 7)}})
+        return {'changes': changes}
+
+    def etag(self, contract_id: str | None) -> str:
+        return '"' + hashlib.sha256(f'{contract_id}:{self.version}:{len(self.enrollment_ids)}'.encode()).hexdigest()[:16] + '"'
+
+    def add_enrollment(self, contract_id: str) -> int:
+        with self._lock:
+            enrollment_id = FIRST_ENROLLMENT_ID + len(self.enrollment_ids)
+            self.enrollment_ids.append(enrollment_id)
+            self.version += 1
+        return enrollment_id
+
+    def complete_change(self, enrollment_id: int):
+        """The pending change of the enrollment completes, its change status is no longer found"""
+        with self._lock:
+            self.completed.add(enrollment_id)
+            self._enrollments.pop(enrollment_id, None)
+            self.version += 1
+
+    def delete_enrollment(self, enrollment_id: int):
+        with self._lock:
+            self.deleted.add(enrollment_id)
+            self.version += 1
+
+
+class FakeCpsServer:
+    """
+    Threaded HTTP(S) server answering API requests from a SyntheticAccount.
+
+    Every request first waits ``latency`` plus up to ``jitter`` seconds, then is
+    answered with a 429 (``Retry-After: retry_after``) with probability
+    ``throttle_rate`` or a 503 with probability ``error_rate``. ``requests``
+    counts the requests received per method and endpoint template.
+    """
+
+    def __init__(self, account: SyntheticAccount | None = None, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, retry_after: float = 0.0, tls: bool = False,
+                 host: str = '127.0.0.1', port: int = 0, seed: int = 0):
+        self.account = account or SyntheticAccount()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.requests = Counter()
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._tmp = tempfile.TemporaryDirectory()
+        self.ca_file = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        if tls:
+            self._wrap_tls(host)
+        self.scheme = 'https' if tls else 'http'
+        self.thread = None
+
+    @property
+    def netloc(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'{host}:{port}'
+
+    @property
+    def url(self) -> str:
+        return f'{self.scheme}://{self.netloc}'
+
+    def _wrap_tls(self, host: str):
+        account = self.account
+        key = ec.generate_private_key(ec.SECP256R1())
+        subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, host)])
+        names = [x509.DNSName('localhost'), x509.IPAddress(ipaddress.ip_address(host))]
+        server_certificate = account._sign(subject, key.public_key(), account.now - datetime.timedelta(days=1),
+                                           account.now + datetime.timedelta(days=30), names)
+        cert_file = os.path.join(self._tmp.name, 'server.pem')
+        with open(cert_file, 'wb') as f:
+            f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                      serialization.NoEncryption()))
+            f.write(server_certificate.public_bytes(serialization.Encoding.PEM))
+        self.ca_file = os.path.join(self._tmp.name, 'ca.pem')
+        with open(self.ca_file, 'wb') as f:
+            f.write(account.ca_certificate.public_bytes(serialization.Encoding.PEM))
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert_file)
+        self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+
+    def write_edgerc(self, path: str, section: str = 'default'):
+        """Credentials section whose host is this server"""
+        with open(path, 'a') as f:
+            f.write(f'[{section}]\nclient_secret = fake\nhost = {self.netloc}\n'
+                    f'access_token = akab-fake\nclient_token = akab-fake\n\n')
+
+    def inject_fault(self) -> tuple | None:
+        with self._lock:
+            roll = self.random.random()
+        if roll < self.throttle_rate:
+            return 429, {'Retry-After': str(self.retry_after)}
+        if roll < self.throttle_rate + self.error_rate:
+            return 503, {}
+        return None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='fake-cps', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self._tmp.cleanup()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handler(self):
+        server = self
+
+        class Handler(FakeCpsHandler):
+            fake = server
+
+        return Handler
+
+
+class CliRunner:
+    """
+    Runs ``bin/akamai-cps.py`` in a subprocess against a TLS ``FakeCpsServer``.
+
+    ``path`` is the working directory and the cache directory of every run, it
+    holds the .edgerc written for the server. Runs are not throttled, the
+    output is plain text and the exit code is the one of the process.
+    """
+
+    def __init__(self, server: FakeCpsServer, path: str):
+        self.server = server
+        self.path = path
+        self.edgerc = os.path.join(path, '.edgerc')
+        server.write_edgerc(self.edgerc)
+
+    def _command(self, args) -> dict:
+        env = dict(os.environ, REQUESTS_CA_BUNDLE=self.server.ca_file, AKAMAI_CLI_CACHE_DIR=self.path)
+        return {'args': [sys.executable, CLI, '--edgerc', self.edgerc, '--rate-limit', '0', *args], 'cwd': self.path, 'env': env}
+
+    def run(self, *args, timeout: float = 120) -> subprocess.CompletedProcess:
+        return subprocess.run(**self._command(args), capture_output=True, text=True, timeout=timeout)
+
+    def start(self, *args) -> subprocess.Popen:
+        """Run the command in the background, e.g. to interrupt it"""
+        return subprocess.Popen(**self._command(args), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+class FakeCpsHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, without this every response waits for a delayed ACK
+    disable_nagle_algorithm = True
+    fake = None
+
+    ROUTES = [
+        ('GET', re.compile(r'^/contract-api/v1/contracts/identifiers$'), 'contracts'),
+        ('GET', re.compile(r'^/identity-management/v3/api-clients/self/account-switch-keys$'), 'account_switch_keys'),
+        ('GET', re.compile(r'^/cps/v2/enrollments$'), 'list_enrollments'),
+        ('POST', re.compile(r'^/cps/v2/enrollments$'), 'create_enrollment'),
+        ('GET', re.compile(r'^/cps/v2/enrollments/(\d+)$'), 'get_enrollment'),
+        ('PUT', re.compile(r'^/cps/v2/enrollments/(\d+)$'), 'update_enrollment'),
+        ('DELETE', re.compile(r'^/cps/v2/enrollments/(\d+)$'), 'delete_enrollment'),
+        ('GET', re.compile(r'^/cps/v2/enrollments/(\d+)/deployments/(production|staging)$'), 'deployment'),
+        ('GET', re.compile(r'^/cps/v2/enrollments/(\d+)/changes/(\d+)$'), 'change_status'),
+        ('DELETE', re.compile(r'^/cps/v2/enrollments/(\d+)/changes/(\d+)$'), 'cancel_change'),
+        ('GET', re.compile(r'^/cps/v2/enrollments/(\d+)/history/changes$'), 'change_history'),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body=None, headers: dict | None = None):
+        payload = b'' if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _not_found(self):
+        self._reply(404, {'type': 'not-found', 'title': 'Not Found', 'instance': self.path})
+
+    def _dispatch(self, method: str):
+        if self.headers.get('Content-Length'):
+            self.body = self.rfile.read(int(self.headers['Content-Length']))
+        url = urlparse(self.path)
+        self.query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        template = re.sub(r'/\d+(?=/|$)', '/{id}', url.path)
+        with self.fake._lock:
+            self.fake.requests[f'{method} {template}'] += 1
+
+        delay = self.fake.latency + (self.fake.random.uniform(0, self.fake.jitter) if self.fake.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        fault = self.fake.inject_fault()
+        if fault is not None:
+            status, headers = fault
+            return self._reply(status, {'type': 'fault', 'status': status}, headers)
+
+        for route_method, pattern, name in self.ROUTES:
+            match = pattern.match(url.path)
+            if match and route_method == method:
+                return getattr(self, name)(*[int(group) if group.isdigit() else group for group in match.groups()])
+        self._not_found()
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    # endpoints
+
+    def contracts(self):
+        self._reply(200, [f'ctr_{contract_id}' for contract_id in self.fake.account.contract_ids])
+
+    def account_switch_keys(self):
+        self._reply(200, [{'accountSwitchKey': '1-FAKE:1-2FAKE', 'accountName': self.fake.account.account_name}])
+
+    def list_enrollments(self):
+        account = self.fake.account
+        contract_id = self.query.get('contractId')
+        etag = account.etag(contract_id)
+        if self.headers.get('If-None-Match') == etag:
+            return self._reply(304, headers={'ETag': etag})
+        self._reply(200, {'enrollments': account.enrollments_of(contract_id)}, {'ETag': etag})
+
+    def create_enrollment(self):
+        enrollment_id = self.fake.account.add_enrollment(self.query.get('contractId'))
+        location = f'/cps/v2/enrollments/{enrollment_id}'
+        self._reply(202, {'enrollment': location, 'changes': [f'{location}/changes/{FIRST_CHANGE_ID + enrollment_id}']})
+
+    def get_enrollment(self, enrollment_id):
+        if not self.fake.account.exists(enrollment_id):
+            return self._not_found()
+        self._reply(200, self.fake.account.enrollment(enrollment_id))
+
+    def update_enrollment(self, enrollment_id):
+        if not self.fake.account.exists(enrollment_id):
+            return self._not_found()
+        location = f'/cps/v2/enrollments/{enrollment_id}'
+        self._reply(202, {'enrollment': location, 'changes': [f'{location}/changes/{FIRST_CHANGE_ID + enrollment_id}']})
+
+    def delete_enrollment(self, enrollment_id):
+        if not self.fake.account.exists(enrollment_id):
+            return self._not_found()
+        self.fake.account.delete_enrollment(enrollment_id)
+        self._reply(202, {'enrollment': f'/cps/v2/enrollments/{enrollment_id}', 'changes': []})
+
+    def deployment(self, enrollment_id, network):
+        deployment = self.fake.account.deployment(enrollment_id, network) if self.fake.account.exists(enrollment_id) else None
+        if deployment is None:
+            return self._not_found()
+        self._reply(200, deployment)
+
+    def change_status(self, enrollment_id, change_id):
+        change_status = self.fake.account.change_status(enrollment_id, change_id) if self.fake.account.exists(enrollment_id) else None
+        if change_status is None:
+            return self._not_found()
+        self._reply(200, change_status)
+
+    def cancel_change(self, enrollment_id, change_id):
+        if self.fake.account.change_status(enrollment_id, change_id) is None:
+            return self._not_found()
+        self._reply(200, {'change': f'/cps/v2/enrollments/{enrollment_id}/changes/{change_id}'})
+
+    def change_history(self, enrollment_id):
+        if not self.fake.account.exists(enrollment_id):
+            return self._not_found()
+        self._reply(200, self.fake.account.change_history(enrollment_id))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local stand-in for the CPS, IDM and contract APIs')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--contracts', type=int, default=2)
+    parser.add_argument('--enrollments', type=int, default=100)
+    parser.add_argument('--pending-ratio', type=float, default=0.1)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many extra seconds per response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with 503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of requests answered with 429')
+    parser.add_argument('--retry-after', type=float, default=0.0, help='Retry-After seconds of injected 429s')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tls', action='store_true', help='serve https, trust it with REQUESTS_CA_BUNDLE=<ca file>')
+    parser.add_argument('--edgerc', help='write a credentials section for this server to this file')
+    args = parser.parse_args(argv)
+
+    account = SyntheticAccount(args.contracts, args.enrollments, args.pending_ratio, seed=args.seed)
+    server = FakeCpsServer(account, args.latency, args.jitter, args.error_rate, args.throttle_rate, args.retry_after,
+                           tls=args.tls, port=args.port, seed=args.seed)
+    if args.edgerc:
+        server.write_edgerc(args.edgerc)
+    if server.ca_file:
+        ca_file = os.path.abspath('fake-cps-ca.pem')
+        with open(server.ca_file, 'rb') as src, open(ca_file, 'wb') as dst:
+            dst.write(src.read())
+        print(f'export REQUESTS_CA_BUNDLE={ca_file}', file=sys.stderr)
+    print(f'Serving {len(account.enrollment_ids)} enrollments on {server.url}, Ctrl+C to stop', file=sys.stderr)
+    with server:
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
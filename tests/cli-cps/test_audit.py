@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import datetime
+import unittest
+
+from fake_server import SyntheticAccount
+from utils.audit import AUDIT_CHANGE_COLUMNS
+from utils.audit import AUDIT_COLUMNS
+from utils.audit import audit_row
+from utils.audit import change_details
+from utils.audit import NOT_APPLICABLE
+from utils.audit import pending_order_id
+
+
+class TestAuditRow(unittest.TestCase):
+    def setUp(self):
+        self.enrollment = SyntheticAccount(enrollments=1).enrollment(10000)
+
+    def test_one_cell_per_column(self):
+        expiration = datetime.datetime(2030, 1, 1)
+        row = dict(zip(AUDIT_COLUMNS, audit_row(self.enrollment, 'K-0001', 10000, expiration)))
+        assert len(row) == len(AUDIT_COLUMNS)
+        assert row['Common Name (CN)'] == self.enrollment['csr']['cn']
+        assert row['Expiration (In Production)'] == expiration
+        assert row['Test on Staging'] == 'yes'
+        assert row['Disallowed TLS Versions'] == 'TLSv1 TLSv1_1'
+        assert row['Admin Name'] == 'Jane Doe'
+
+    def test_status_and_change_details(self):
+        self.enrollment['pendingChanges'] = [{'location': '/cps/v2/enrollments/10000/changes/1'}]
+        row = audit_row(self.enrollment, 'K-0001', 10000, '', ['Waiting for input', '12345'])
+        assert len(row) == len(AUDIT_COLUMNS) + len(AUDIT_CHANGE_COLUMNS)
+        assert row[AUDIT_COLUMNS.index('Status')] == 'IN-PROGRESS'
+        assert row[-2:] == ['Waiting for input', '12345']
+
+
+class Response:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+
+    def json(self):
+        return self.body
+
+
+class TestChangeDetails(unittest.TestCase):
+    def test_order_id_of_the_incomplete_change(self):
+        history = {'changes': [{'status': 'incomplete', 'primaryCertificateOrderDetails': {'geotrustOrderId': 70000}},
+                               {'status': 'completed', 'primaryCertificateOrderDetails': {'geotrustOrderId': 1}}]}
+        assert pending_order_id(history) == '70000'
+        assert pending_order_id({'changes': history['changes'][1:]}) == NOT_APPLICABLE
+
+    def test_change_details(self):
+        assert change_details({}) == [NOT_APPLICABLE, NOT_APPLICABLE]
+        status = {'statusInfo': {'description': 'Waiting for input'}}
+        history = {'changes': [{'status': 'incomplete', 'primaryCertificateOrderDetails': {'geotrustOrderId': '12345'}}]}
+        assert change_details({'change_status': Response(status)}) == ['Waiting for input', NOT_APPLICABLE]
+        assert change_details({'change_status': Response(status), 'change_history': Response(history)}) == ['Waiting for input', '12345']
+        assert change_details({'change_status': Response({}, 404)}) is None
+
+
+if __name__ == '__main__':
+    unittest.main()
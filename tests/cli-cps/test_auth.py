@@ -1,10 +1,17 @@
 from __future__ import annotations
 
 import os.path
+import tempfile
 import unittest
 from unittest.mock import patch
 
 import pytest
+import requests
+from akamai_apis.auth import RequestScheduler
+from akamai_apis.auth import shared_session
+from akamai_apis.auth import TokenBucket
+from akamai_apis.cps import Cps
+from akamai_apis.idm import AccountNameCache
 from akamai_apis.idm import IdentityAccessManagement
 from mock_factory import MockFactory
 from mock_factory import Namespace
@@ -78,5 +85,178 @@ class TestAccountLookup(unittest.TestCase):
         assert account_name == 'not set'
 
 
+class TestAccountNameCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = AccountNameCache(self.tmp.name)
+        self.response_body = MockFactory.getJSONFromFile(f'{os.getcwd()}/tests/cli-cps/data/idm/list_account_switch_keys.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @patch('akamai_apis.auth.requests.Session.get')
+    def test_lookup_is_cached_per_edgerc_section_and_key(self, mock_get):
+        mock_logger, _, _ = MockFactory.get_mock_objects()
+        mock_get.return_value = MockFactory.get_mock_response(200, self.response_body)
+        cli_args = Namespace(account_switch_key='ABC-123', section='default')
+
+        assert IdentityAccessManagement(mock_logger, cli_args, cache=self.cache)() == 'Internet Company'
+        assert IdentityAccessManagement(mock_logger, cli_args, cache=self.cache)() == 'Internet Company'
+        assert mock_get.call_count == 1
+
+        # another key, another section and the same section of another .edgerc are separate entries
+        idm = IdentityAccessManagement(mock_logger, Namespace(account_switch_key='XYZ-9', section='default'), cache=self.cache)
+        idm()
+        assert self.cache.get(idm.edgerc_file, 'other', 'ABC-123') is None
+        assert self.cache.get(os.path.join(self.tmp.name, '.edgerc'), 'default', 'ABC-123') is None
+        assert self.cache.get(idm.edgerc_file, 'default', 'ABC-123') == 'Internet Company'
+        assert mock_get.call_count == 2
+
+    def test_entries_expire(self):
+        self.cache.set('~/.edgerc', 'default', None, 'Internet Company')
+        assert self.cache.get(os.path.expanduser('~/.edgerc'), 'default', None) == 'Internet Company'
+        assert AccountNameCache(self.tmp.name, ttl=0).get('~/.edgerc', 'default', None) is None
+
+    @patch('akamai_apis.auth.requests.Session.get')
+    def test_async_lookup(self, mock_get):
+        mock_logger, _, _ = MockFactory.get_mock_objects()
+        cli_args = Namespace(account_switch_key='ABC-123', section='default')
+
+        mock_get.return_value = MockFactory.get_mock_response(200, self.response_body)
+        assert IdentityAccessManagement(mock_logger, cli_args, cache=self.cache).search_account_async().result(5) == 'Internet Company'
+
+        # a cache hit resolves without a request or a thread
+        future = IdentityAccessManagement(mock_logger, cli_args, cache=self.cache).search_account_async()
+        assert future.done() and future.result() == 'Internet Company'
+        assert mock_get.call_count == 1
+
+        failure = MockFactory.get_mock_response(404, self.response_body)
+        failure.ok = False
+        mock_get.return_value = failure
+        with pytest.raises(SystemExit):
+            IdentityAccessManagement(mock_logger, Namespace(account_switch_key='BAD-1', section='default'),
+                                     cache=self.cache).search_account_async().result(5)
+
+
+class TestSharedTransport(unittest.TestCase):
+    def test_api_classes_share_one_session(self):
+        mock_logger, _, _ = MockFactory.get_mock_objects()
+        cli_args = Namespace(account_switch_key='ABC-123', section='default', pool_size=4)
+
+        idm = IdentityAccessManagement(mock_logger, cli_args)
+        cps = Cps(mock_logger, cli_args)
+
+        assert idm.s is cps.s
+        assert idm.s.auth is not None
+        assert idm.s.get_adapter('https://example.com')._pool_maxsize >= 4
+
+    def test_pool_grows_on_demand(self):
+        session = shared_session(section='pool-test', pool_maxsize=2)
+        assert session.auth is None
+        assert session.get_adapter('https://example.com')._pool_maxsize == 2
+
+        assert shared_session(section='pool-test', pool_maxsize=20) is session
+        assert session.get_adapter('https://example.com')._pool_maxsize == 20
+
+        assert shared_session(section='pool-test', pool_maxsize=5) is session
+        assert session.get_adapter('https://example.com')._pool_maxsize == 20
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TestRequestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.time = FakeClock()
+
+    def scheduler(self, **kwargs):
+        return RequestScheduler(clock=self.time.clock, sleep=self.time.sleep, **kwargs)
+
+    def responses(self, *responses):
+        responses = iter(responses)
+        return lambda: next(responses)
+
+    def test_retry_after_is_honoured(self):
+        throttled = MockFactory.get_mock_response(429, {})
+        throttled.headers = {'Retry-After': '7'}
+        ok = MockFactory.get_mock_response(200, {})
+        ok.headers = {}
+
+        scheduler = self.scheduler(rate_limit=None)
+        response = scheduler.send('get', '/cps/v2/enrollments', self.responses(throttled, ok))
+
+        assert response is ok
+        assert scheduler.retries == 1
+        assert self.time.now == 7
+
+    def test_server_error_backoff_only_for_idempotent_methods(self):
+        error = MockFactory.get_mock_response(503, {})
+        error.headers = {}
+        ok = MockFactory.get_mock_response(200, {})
+        ok.headers = {}
+
+        scheduler = self.scheduler(rate_limit=None, backoff_base=1)
+        assert scheduler.send('GET', '/cps', self.responses(error, error, ok)) is ok
+        assert scheduler.retries == 2
+        assert all(delay <= 1 * 2 ** attempt for attempt, delay in enumerate(self.time.slept))
+
+        scheduler = self.scheduler(rate_limit=None)
+        assert scheduler.send('POST', '/cps', self.responses(error, ok)) is error
+        assert scheduler.retries == 0
+
+    def test_gives_up_after_max_retries(self):
+        throttled = MockFactory.get_mock_response(429, {})
+        throttled.headers = {'Retry-After': '1'}
+
+        scheduler = self.scheduler(rate_limit=None, max_retries=2)
+        assert scheduler.send('GET', '/cps', self.responses(throttled, throttled, throttled)) is throttled
+        assert scheduler.retries == 2
+
+    def test_read_timeout_is_retried_for_idempotent_methods(self):
+        ok = MockFactory.get_mock_response(200, {})
+        ok.headers = {}
+        attempts = []
+
+        def timeout_once():
+            attempts.append(None)
+            if len(attempts) == 1:
+                raise requests.ReadTimeout('read timed out')
+            return ok
+
+        scheduler = self.scheduler(rate_limit=None, backoff_base=1)
+        assert scheduler.send('GET', '/cps', timeout_once) is ok
+        assert scheduler.retries == 1 and len(self.time.slept) == 1
+
+        attempts.clear()
+        with pytest.raises(requests.ReadTimeout):
+            self.scheduler(rate_limit=None).send('POST', '/cps', timeout_once)
+        assert len(attempts) == 1
+
+    def test_akamai_rate_limit_next(self):
+        throttled = MockFactory.get_mock_response(429, {})
+        throttled.headers = {'Akamai-RateLimit-Next': '2000-01-01T00:00:00Z'}
+        assert self.scheduler().retry_delay(throttled, 0) == 0
+
+    def test_token_bucket_limits_rate(self):
+        bucket = TokenBucket(rate=5, capacity=1, clock=self.time.clock, sleep=self.time.sleep)
+        for _ in range(11):
+            bucket.acquire()
+        assert abs(self.time.now - 2.0) < 1e-6
+
+        bucket.block_for(30)
+        bucket.acquire()
+        assert self.time.now >= 32.0
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import datetime
+import threading
+import unittest
+from unittest.mock import patch
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from fake_server import SyntheticAccount
+from utils import certificates
+from utils.certificates import CertificateDecoder
+from utils.certificates import fingerprint
+
+
+def rsa_certificate_without_sans() -> str:
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.ORGANIZATION_NAME, 'Example Inc'),
+                      x509.NameAttribute(NameOID.COMMON_NAME, 'legacy.example.com')])
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(42).not_valid_before(datetime.datetime(2024, 1, 1))
+            .not_valid_after(datetime.datetime(2025, 1, 1, 12, 30)).sign(key, hashes.SHA256()))
+    return cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+class TestCertificateDecoder(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.account = SyntheticAccount(enrollments=20)
+        cls.deployments = [cls.account.deployment(enrollment_id, 'production') for enrollment_id in cls.account.enrollment_ids]
+
+    def setUp(self):
+        self.decoder = CertificateDecoder(max_size=8)
+
+    def test_typed_fields(self):
+        decoded = self.decoder.decode(self.deployments[0]['certificate'])
+        enrollment = self.account.enrollment(10000)
+        assert decoded.subject == enrollment['csr']['cn']
+        assert decoded.issuer == 'Fake CPS CA'
+        assert decoded.sans == tuple(enrollment['csr']['sans'])
+        assert decoded.not_valid_after == self.account.not_valid_after(10000)
+        assert (decoded.key_type, decoded.key_size) == ('EC', 256)
+
+        decoded = self.decoder.decode(rsa_certificate_without_sans())
+        assert (decoded.subject, decoded.serial, decoded.sans) == ('legacy.example.com', 42, None)
+        assert (decoded.key_type, decoded.key_size) == ('RSA', 2048)
+        assert decoded.not_valid_after == datetime.datetime(2025, 1, 1, 12, 30)
+
+    def test_each_pem_is_parsed_once(self):
+        pem = self.deployments[1]['certificate']
+        first = self.decoder.decode(pem)
+        assert self.decoder.decode(pem + '\n') is first
+        assert (self.decoder.hits, self.decoder.misses) == (1, 1)
+        assert first.fingerprint == fingerprint(pem)
+
+    def test_least_recently_used_are_dropped(self):
+        pems = [deployment['certificate'] for deployment in self.deployments[:10]]
+        for pem in pems:
+            self.decoder.decode(pem)
+        assert len(self.decoder) == 8
+        self.decoder.decode(pems[0])
+        assert self.decoder.misses == 11
+
+    def test_decode_deployments(self):
+        decoded = self.decoder.decode_deployments(self.deployments, concurrency=4)
+        assert len(decoded) == 20
+        # every 20th enrollment of the synthetic account is not deployed
+        assert decoded[19] is None
+        assert [certificate.subject for certificate in decoded[:19]] == \
+            [self.account.enrollment(enrollment_id)['csr']['cn'] for enrollment_id in self.account.enrollment_ids[:19]]
+
+    def test_default_decoder_is_created_once(self):
+        barrier = threading.Barrier(8)
+        decoders = []
+
+        def first_decode():
+            barrier.wait()
+            decoders.append(certificates.default_decoder())
+
+        with patch.object(certificates, '_decoder', None):
+            workers = [threading.Thread(target=first_decode) for _ in range(8)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        assert len(decoders) == 8 and len({id(decoder) for decoder in decoders}) == 1
+
+
+if __name__ == '__main__':
+    unittest.main()
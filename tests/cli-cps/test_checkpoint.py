@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import datetime
+import os
+import tempfile
+import unittest
+
+from utils.checkpoint import CheckpointJournal
+
+HEADER = ['Contract', 'Enrollment ID', 'Expiration (In Production)']
+
+
+class TestCheckpointJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'audit.csv.journal')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def interrupted_run(self):
+        with CheckpointJournal(self.path, HEADER) as journal:
+            journal.record(1, ['A-1', 1, datetime.datetime(2024, 3, 1, 12, 0)], {'enrollmentId': 1})
+            journal.record(2, ['A-1', 2, ''])
+        with open(self.path, 'a') as f:
+            f.write('{"enrollmentId":3,"ro')
+
+    def test_resume_replays_completed_entries(self):
+        self.interrupted_run()
+
+        journal = CheckpointJournal(self.path, HEADER).open(resume=True)
+        assert journal.completed == {1, 2}
+        assert journal.entries[0]['row'] == ['A-1', 1, datetime.datetime(2024, 3, 1, 12, 0)]
+        assert journal.entries[0]['record'] == {'enrollmentId': 1}
+        assert 'record' not in journal.entries[1]
+
+        journal.record(3, ['A-1', 3, ''])
+        journal.close()
+        assert CheckpointJournal(self.path, HEADER).open(resume=True).completed == {1, 2, 3}
+
+    def test_fresh_run_or_other_columns_start_over(self):
+        self.interrupted_run()
+        assert CheckpointJournal(self.path, HEADER + ['Order ID']).open(resume=True).entries == []
+
+        self.interrupted_run()
+        assert CheckpointJournal(self.path, HEADER).open(resume=False).entries == []
+
+    def test_discard_removes_the_journal(self):
+        journal = CheckpointJournal(self.path, HEADER).open()
+        journal.record(1, ['A-1', 1, ''])
+        journal.discard()
+        assert not os.path.exists(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
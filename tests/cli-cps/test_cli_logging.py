@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import unittest
+
+import pytest
+import utils.cli_logging as lg
+import utils.emojis as emoji
+
+BIN = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../bin'))
+
+# Code points of the emoji table, what the emojis package returns for each shortcode (it has
+# no :pink_heart:, U+1FA77 is the Unicode 15 character). Frozen so no package is needed to check it
+EXPECTED_CODE_POINTS = {
+    'star': 'U+2B50',
+    'ok_hand': 'U+1F44C',
+    'gem': 'U+1F48E',
+    'cloudy': 'U+1F327 U+FE0F',
+    'heavy_check_mark': 'U+2714 U+FE0F',
+    'fail': 'U+274C',
+    'thumbdown': 'U+1F44E',
+    'sos': 'U+1F198',
+    'poop': 'U+1F4A9',
+    'stop': 'U+26D4',
+    'disappointed': 'U+1F61E',
+    'broken_heart': 'U+1F494',
+    'attention': 'U+2757',
+    'shrug': 'U+1F937',
+    'thumbup': 'U+1F44D',
+    'tada': 'U+1F389',
+    'blush': 'U+1F60A',
+    'partying_face': 'U+1F973',
+    'pink_heart': 'U+1FA77',
+    'two_hearts': 'U+1F495',
+    'ribbon': 'U+1F380',
+    'cherry_blossom': 'U+1F338',
+    'pass_green': 'U+2705',
+    'clock': 'U+1F9ED',
+    'bow': 'U+1F647',
+    'looking': 'U+1F440',
+    'checking': 'U+1F46E',
+    'construction': 'U+1F6A7',
+    'pending': 'U+23F3',
+    'magnify_glass': 'U+1F50D',
+    'dart': 'U+1F3AF',
+    'memo': 'U+1F4D6',
+    'key': 'U+1F511',
+    'pushpin': 'U+1F4CC',
+    'arrow_down': 'U+1F53D',
+    'point_right': 'U+1F449',
+    'point_left': 'U+1F448',
+    'file_folder': 'U+1F4C2',
+    'trash': 'U+1F5D1 U+FE0F',
+    'smoke': 'U+1F6AC',
+    'home': 'U+1F3E0',
+    'traffic_light': 'U+1F6A5',
+    'destination': 'U+26F3',
+    'zero': 'U+0030 U+FE0F U+20E3',
+    'one': 'U+0031 U+FE0F U+20E3',
+    'two': 'U+0032 U+FE0F U+20E3',
+    'three': 'U+0033 U+FE0F U+20E3',
+    'four': 'U+0034 U+FE0F U+20E3',
+    'five': 'U+0035 U+FE0F U+20E3',
+    'pencil': 'U+1F4DD',
+    'plus_grey': 'U+2795',
+    'blue_globe': 'U+1F310',
+    'crystal_ball': 'U+1F52E',
+    'hyper_link': 'U+1F517',
+}
+
+
+class TestEmojiTable(unittest.TestCase):
+    def tearDown(self):
+        lg.use_plain_output(False)
+
+    def test_table_matches_frozen_code_points(self):
+        assert {name: ' '.join(f'U+{ord(char):04X}' for char in getattr(emoji, name))
+                for name in emoji.EMOJI} == EXPECTED_CODE_POINTS
+
+    def test_import_does_not_load_emojis_package(self):
+        result = subprocess.run([sys.executable, '-c', 'import sys, utils.emojis; print("emojis" in sys.modules)'],
+                                capture_output=True, text=True, check=True, env=dict(os.environ, PYTHONPATH=BIN))
+        assert result.stdout.strip() == 'False'
+
+    def test_plain_output_disables_emoji_and_markup(self):
+        assert emoji.tada == '\U0001f389'
+        lg.use_plain_output()
+        assert emoji.tada == ''
+        with pytest.raises(AttributeError):
+            emoji.unknown_emoji
+
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            lg.console_panel(lg.get_console(), '\nAccount: Example\n', 'CPS CLI: [i]List Enrollments[/i]')
+        assert stderr.getvalue() == 'CPS CLI: List Enrollments\n\nAccount: Example\n\n'
+
+    def test_plain_output_has_no_progress_bar(self):
+        lg.use_plain_output()
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), lg.progress_bar(lg.get_console(), 'Fetching', total=2) as advance:
+            advance()
+            advance()
+        assert stderr.getvalue() == ''
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,469 @@
+from __future__ import annotations
+
+import csv
+import datetime
+import io
+import json
+import os
+import signal
+import tempfile
+import time
+import unittest
+import zipfile
+
+from fake_server import CliRunner
+from fake_server import FakeCpsServer
+from fake_server import SyntheticAccount
+from utils.enrollment_cache import EnrollmentCache
+
+
+class CommandTestCase(unittest.TestCase):
+    """Runs CLI commands against a fake account of 2 contracts and 30 enrollments, half of them with a pending change"""
+
+    def setUp(self):
+        self.server = FakeCpsServer(SyntheticAccount(contracts=2, enrollments=30, pending_ratio=0.5), tls=True).start()
+        self.addCleanup(self.server.stop)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cli = CliRunner(self.server, tmp.name)
+
+
+class TestSetupCommand(CommandTestCase):
+
+    def cached(self) -> tuple:
+        with EnrollmentCache(os.path.join(self.cli.path, 'setup')) as enrollment_cache:
+            return enrollment_cache.contract_ids(), len(enrollment_cache.enrollments())
+
+    def test_setup_lists_every_contract(self):
+        result = self.cli.run('setup')
+        assert result.returncode == 0, result.stderr
+        assert self.cached() == (['K-0001', 'K-0002'], 30)
+        assert self.server.requests['GET /cps/v2/enrollments'] == 2
+
+    def test_incremental_setup_keeps_unchanged_contracts(self):
+        assert self.cli.run('setup').returncode == 0
+        result = self.cli.run('setup', '--incremental')
+        assert result.returncode == 0, result.stderr
+        assert 'no changes since last setup' in result.stdout + result.stderr
+        assert self.cached() == (['K-0001', 'K-0002'], 30)
+        assert self.server.requests['GET /cps/v2/enrollments'] == 4
+
+    def test_contract_max_age_skips_the_listing(self):
+        assert self.cli.run('setup').returncode == 0
+        result = self.cli.run('setup', '--incremental', '--contract-max-age', '3600')
+        assert result.returncode == 0, result.stderr
+        assert self.server.requests['GET /cps/v2/enrollments'] == 2
+
+    def test_failed_listing_exits_non_zero(self):
+        self.server.error_rate = 1.0
+        result = self.cli.run('setup')
+        assert result.returncode == 1
+
+
+class TestEnrollmentLookup(CommandTestCase):
+    def test_lookup_by_san_hostname(self):
+        assert self.cli.run('setup').returncode == 0
+        enrollment = next(self.server.account.enrollment(enrollment_id) for enrollment_id in self.server.account.enrollment_ids
+                          if len(self.server.account.enrollment(enrollment_id)['csr']['sans']) > 1)
+        result = self.cli.run('retrieve-enrollment', '--cn', enrollment['csr']['sans'][-1], '--json')
+        assert result.returncode == 0, result.stderr
+        assert json.loads(result.stdout)['id'] == enrollment['id']
+        # found in the cache, the account is not listed again
+        assert self.server.requests['GET /cps/v2/enrollments'] == 2
+
+    def test_miss_refreshes_the_cache(self):
+        assert self.cli.run('setup').returncode == 0
+        enrollment_id = self.server.account.add_enrollment('K-0001')
+        result = self.cli.run('retrieve-enrollment', '--enrollment-id', str(enrollment_id), '--yaml')
+        assert result.returncode == 0, result.stderr
+        assert f'id: {enrollment_id}' in result.stdout
+        assert self.server.requests['GET /cps/v2/enrollments'] == 4
+
+    def test_lookup_without_setup(self):
+        result = self.cli.run('retrieve-enrollment', '--enrollment-id', '10003')
+        assert result.returncode == 0, result.stderr
+        assert json.loads(result.stdout)['id'] == 10003
+
+    def test_unknown_enrollment(self):
+        result = self.cli.run('retrieve-enrollment', '--cn', 'unknown.example.com')
+        assert result.returncode == 1
+        assert 'Enrollment not found' in result.stderr
+
+
+class TestListCommand(CommandTestCase):
+    def rows(self, stdout: str) -> dict:
+        rows = [[cell.strip() for cell in line.strip('|').split('|')] for line in stdout.splitlines() if line.startswith('| ')]
+        return {row[0].strip('*'): row for row in rows[1:]}
+
+    def test_list_marks_pending_changes(self):
+        result = self.cli.run('list')
+        assert result.returncode == 0, result.stderr
+        rows = self.rows(result.stdout)
+        assert len(rows) == 30
+        account = self.server.account
+        for enrollment_id in account.enrollment_ids:
+            row = rows[str(enrollment_id)]
+            pending = account.change_id(enrollment_id) is not None
+            assert row[0] == (f'*{enrollment_id}*' if pending else str(enrollment_id))
+            assert row[3] == ('*Yes*' if pending else 'No')
+            assert len(row) == 5
+        assert self.server.requests['GET /cps/v2/enrollments/{id}/deployments/production'] == 0
+
+    def test_show_expiration_prefetches_every_certificate(self):
+        result = self.cli.run('list', '--show-expiration', '--concurrency', '4')
+        assert result.returncode == 0, result.stderr
+        rows = self.rows(result.stdout)
+        account = self.server.account
+        for enrollment_id in account.enrollment_ids:
+            expiration = rows[str(enrollment_id)][5]
+            if account.deployment(enrollment_id, 'production') is None:
+                assert expiration == ''
+            else:
+                assert expiration == f'{account.not_valid_after(enrollment_id):%Y-%m-%d %H:%M:%S} UTC'
+        assert self.server.requests['GET /cps/v2/enrollments/{id}/deployments/production'] == 30
+
+
+class TestAuditCommand(CommandTestCase):
+    def setUp(self):
+        super().setUp()
+        assert self.cli.run('setup').returncode == 0
+        self.server.requests.clear()
+
+    def read_csv(self, path: str) -> list:
+        with open(os.path.join(self.cli.path, path), newline='') as f:
+            return [*csv.DictReader(f)]
+
+    def test_audit_fans_out_every_enrollment(self):
+        result = self.cli.run('audit', '--concurrency', '4', '--output-file', 'audit.csv')
+        assert result.returncode == 0, result.stderr
+        rows = self.read_csv('audit.csv')
+        account = self.server.account
+        assert [int(row['Enrollment ID']) for row in rows] == sorted(account.enrollment_ids, key=account.contract_of)
+        for row in rows:
+            enrollment_id = int(row['Enrollment ID'])
+            assert row['Status'] == ('IN-PROGRESS' if account.change_id(enrollment_id) else 'ACTIVE')
+            deployed = account.deployment(enrollment_id, 'production') is not None
+            expiration = f'{account.not_valid_after(enrollment_id):%Y-%m-%d %H:%M:%S} UTC' if deployed else ''
+            assert row['Expiration (In Production)'] == expiration
+        assert self.server.requests['GET /cps/v2/enrollments/{id}'] == 30
+        assert self.server.requests['GET /cps/v2/enrollments/{id}/deployments/production'] == 30
+        assert self.server.requests['GET /cps/v2/enrollments/{id}/changes/{id}'] == 0
+
+    def test_change_details(self):
+        result = self.cli.run('audit', '--include-change-details', '--output-file', 'audit.csv', '--json')
+        assert result.returncode == 0, result.stderr
+        account = self.server.account
+        pending = [enrollment_id for enrollment_id in account.enrollment_ids if account.change_id(enrollment_id)]
+        for row in self.read_csv('audit.csv'):
+            if int(row['Enrollment ID']) in pending:
+                assert row['Change Status Details'].startswith('Change is ')
+            else:
+                assert row['Change Status Details'] == row['Order ID'] == 'Not Applicable'
+        assert self.server.requests['GET /cps/v2/enrollments/{id}/changes/{id}'] == len(pending)
+        with open(os.path.join(self.cli.path, 'audit.json')) as f:
+            records = json.load(f)
+        assert len(records) == 30
+        assert all(record['contractId'] == account.contract_of(record['id']) for record in records)
+
+    def test_xlsx_rows_are_streamed_into_the_workbook(self):
+        result = self.cli.run('audit', '--xlsx', '--concurrency', '4', '--output-file', 'audit.csv')
+        assert result.returncode == 0, result.stderr
+        assert not os.path.exists(os.path.join(self.cli.path, 'audit.csv'))
+        with zipfile.ZipFile(os.path.join(self.cli.path, 'audit.xlsx')) as workbook:
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        # header and one row per enrollment, strings inline as written by the constant memory mode
+        assert '<autoFilter ref="A1:Y31"/>' in sheet
+        assert '<c r="B31"><v>10029</v></c>' in sheet
+        assert 'www29.k-0002.example.com' in sheet
+        assert self.cli.run('audit', '--xlsx', '--output-file', '-').returncode == 1
+
+    def read_ndjson(self, path: str) -> list:
+        with open(os.path.join(self.cli.path, path)) as f:
+            return [json.loads(line) for line in f]
+
+    def test_ndjson_resume_skips_written_enrollments(self):
+        assert self.cli.run('audit', '--ndjson', '--output-file', 'audit.ndjson').returncode == 0
+        records = self.read_ndjson('audit.ndjson')
+        enrollment_ids = [record['enrollmentId'] for record in records]
+        assert enrollment_ids == sorted(self.server.account.enrollment_ids, key=self.server.account.contract_of)
+        # an interrupted run, ten records and a line cut short
+        with open(os.path.join(self.cli.path, 'audit.ndjson'), 'w') as f:
+            f.writelines(json.dumps(record) + '\n' for record in records[:10])
+            f.write(json.dumps(records[10])[:20])
+        self.server.requests.clear()
+
+        result = self.cli.run('audit', '--ndjson', '--output-file', 'audit.ndjson', '--resume')
+        assert result.returncode == 0, result.stderr
+        assert 'Skipping 10 enrollments' in result.stderr
+        assert [record['enrollmentId'] for record in self.read_ndjson('audit.ndjson')] == enrollment_ids
+        assert self.server.requests['GET /cps/v2/enrollments/{id}'] == 20
+
+    def test_ndjson_without_resume_starts_over(self):
+        with open(os.path.join(self.cli.path, 'audit.ndjson'), 'w') as f:
+            f.write(json.dumps({'enrollmentId': 10000}) + '\n')
+        assert self.cli.run('audit', '--ndjson', '--output-file', 'audit.ndjson').returncode == 0
+        assert len(self.read_ndjson('audit.ndjson')) == 30
+        assert self.server.requests['GET /cps/v2/enrollments/{id}'] == 30
+
+    def test_ndjson_rejects_other_formats(self):
+        for output_format in ('--json', '--xlsx'):
+            result = self.cli.run('audit', '--ndjson', output_format, '--output-file', 'audit.ndjson')
+            assert result.returncode == 1
+            assert '--ndjson cannot be combined' in result.stderr
+        assert not os.path.exists(os.path.join(self.cli.path, 'audit.ndjson'))
+        assert self.server.requests['GET /cps/v2/enrollments/{id}'] == 0
+
+    def test_resume_needs_the_output_file(self):
+        result = self.cli.run('audit', '--ndjson', '--resume')
+        assert result.returncode == 1
+        assert '--resume needs the --output-file' in result.stderr
+
+    @staticmethod
+    def journaled(journal_file: str) -> int:
+        if not os.path.exists(journal_file):
+            return 0
+        with open(journal_file) as f:
+            # the first line holds the columns
+            return max(0, len(f.readlines()) - 1)
+
+    def test_interrupted_audit_resumes_from_the_journal(self):
+        self.server.latency = 0.05
+        journal_file = os.path.join(self.cli.path, 'audit.csv.journal')
+        process = self.cli.start('audit', '--json', '--concurrency', '2', '--output-file', 'audit.csv')
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline and self.journaled(journal_file) < 5:
+            time.sleep(0.05)
+        process.send_signal(signal.SIGINT)
+        _, stderr = process.communicate(timeout=60)
+        assert process.returncode == 1
+        assert 'Run it again with --resume' in stderr
+        audited = self.journaled(journal_file)
+        assert 5 <= audited < 30
+
+        self.server.latency = 0
+        self.server.requests.clear()
+        result = self.cli.run('audit', '--json', '--output-file', 'audit.csv', '--resume')
+        assert result.returncode == 0, result.stderr
+        assert f'{audited} enrollments already audited' in result.stderr
+        assert self.server.requests['GET /cps/v2/enrollments/{id}'] == 30 - audited
+        rows = self.read_csv('audit.csv')
+        assert sorted(int(row['Enrollment ID']) for row in rows) == self.server.account.enrollment_ids
+        with open(os.path.join(self.cli.path, 'audit.json')) as f:
+            assert len(json.load(f)) == 30
+        assert not os.path.exists(journal_file)
+
+    def test_csv_resume_needs_the_output_file(self):
+        result = self.cli.run('audit', '--resume')
+        assert result.returncode == 1
+        assert '--resume needs the --output-file' in result.stderr
+
+    def test_csv_to_stdout(self):
+        result = self.cli.run('audit', '--output-file', '-')
+        assert result.returncode == 0, result.stderr
+        assert len([*csv.DictReader(io.StringIO(result.stdout))]) == 30
+        assert self.cli.run('audit', '--output-file', '-', '--json').returncode == 1
+
+    def test_audit_needs_setup(self):
+        os.remove(os.path.join(self.cli.path, 'setup', 'enrollments.db'))
+        result = self.cli.run('audit')
+        assert result.returncode == 1
+        assert "Please run 'setup'" in result.stderr
+
+
+class TestSnapshotCommand(CommandTestCase):
+    def setUp(self):
+        super().setUp()
+        assert self.cli.run('setup').returncode == 0
+        self.server.requests.clear()
+
+    def query(self, *args) -> list:
+        result = self.cli.run('query', '--json', *args)
+        assert result.returncode == 0, result.stderr
+        return json.loads(result.stdout)
+
+    def test_snapshot_then_query_offline(self):
+        result = self.cli.run('snapshot', '--concurrency', '4')
+        assert result.returncode == 0, result.stderr
+        assert 'Snapshot of 30 enrollments written to' in result.stderr
+        assert os.path.isfile(os.path.join(self.cli.path, 'snapshot', 'snapshot.db'))
+        assert self.server.requests['GET /cps/v2/enrollments/{id}'] == 30
+        assert self.server.requests['GET /cps/v2/enrollments/{id}/deployments/production'] == 30
+        self.server.requests.clear()
+
+        account = self.server.account
+        rows = self.query()
+        assert [row['enrollment_id'] for row in rows] == sorted(account.enrollment_ids)
+        for row in rows:
+            deployed = account.deployment(row['enrollment_id'], 'production') is not None
+            assert row['contract'] == account.contract_of(row['enrollment_id'])
+            assert (row['expiration'] is not None) == deployed
+        dv = self.query('--where', "validation = 'dv'", '--columns', 'enrollment_id,validation')
+        assert dv and {row['validation'] for row in dv} == {'dv'}
+        groups = self.query('--group-by', 'contract')
+        assert {row['contract']: row['enrollments'] for row in groups} == {'K-0001': 15, 'K-0002': 15}
+        columns = self.query('--show-columns')
+        assert {'days_left', 'issuer', 'enrollment'} <= {row['column'] for row in columns}
+        # query only reads the snapshot
+        assert sum(self.server.requests.values()) == 0
+
+    def test_plain_table_and_csv(self):
+        assert self.cli.run('snapshot').returncode == 0
+        result = self.cli.run('query', '--limit', '3')
+        assert result.returncode == 0, result.stderr
+        assert '3 rows, snapshot of' in result.stdout
+        result = self.cli.run('query', '--csv', '--columns', 'enrollment_id,cn')
+        assert result.returncode == 0, result.stderr
+        assert len([*csv.DictReader(io.StringIO(result.stdout))]) == 30
+
+    def test_query_errors(self):
+        result = self.cli.run('query')
+        assert result.returncode == 1
+        assert "Run 'snapshot' to create it" in result.stderr
+        assert self.cli.run('snapshot').returncode == 0
+        result = self.cli.run('query', '--columns', 'nope')
+        assert result.returncode == 1
+        assert "Unknown column 'nope'" in result.stderr
+
+    def test_snapshot_needs_setup(self):
+        os.remove(os.path.join(self.cli.path, 'setup', 'enrollments.db'))
+        assert self.cli.run('snapshot').returncode == 1
+
+
+class TestExpiringCommand(CommandTestCase):
+    def setUp(self):
+        super().setUp()
+        assert self.cli.run('setup').returncode == 0
+        self.server.requests.clear()
+
+    def expiring(self, *args) -> set:
+        result = self.cli.run('expiring', '--json', *args)
+        assert result.returncode == 0, result.stderr
+        return {certificate['enrollmentId'] for contracts in json.loads(result.stdout)['weeks'].values()
+                for certificates in contracts.values() for certificate in certificates}
+
+    def test_only_stale_certificates_are_fetched_again(self):
+        account = self.server.account
+        until = account.now + datetime.timedelta(days=60)
+        expected = {enrollment_id for enrollment_id in account.enrollment_ids
+                    if account.deployment(enrollment_id, 'production') is not None and account.not_valid_after(enrollment_id) <= until}
+        assert expected
+        assert self.expiring('--within', '60d') == expected
+        assert self.server.requests['GET /cps/v2/enrollments/{id}/deployments/production'] == 30
+        self.server.requests.clear()
+        # the certificates beyond the window cannot expire inside it, the index answers for them
+        assert self.expiring('--within', '60d') == expected
+        assert self.server.requests['GET /cps/v2/enrollments/{id}/deployments/production'] == len(expected)
+        self.server.requests.clear()
+        assert self.expiring('--within', '60d', '--refresh') == expected
+        assert self.server.requests['GET /cps/v2/enrollments/{id}/deployments/production'] == 30
+
+    def test_table_and_errors(self):
+        result = self.cli.run('expiring', '--within', '60d')
+        assert result.returncode == 0, result.stderr
+        assert 'Production certificates expiring by' in result.stdout
+        assert 'production certificates expire within 60d' in result.stderr
+        assert self.cli.run('expiring', '--within', '3x').returncode == 1
+        os.remove(os.path.join(self.cli.path, 'setup', 'enrollments.db'))
+        assert self.cli.run('expiring').returncode == 1
+
+
+class TestStatusCommand(CommandTestCase):
+    def setUp(self):
+        super().setUp()
+        assert self.cli.run('setup').returncode == 0
+        self.server.requests.clear()
+
+    def enrollment_in_state(self, state: str | None) -> int:
+        """First enrollment whose pending change is in the state, without pending change for None"""
+        account = self.server.account
+        for enrollment_id in account.enrollment_ids:
+            change_id = account.change_id(enrollment_id)
+            if change_id is None:
+                if state is None:
+                    return enrollment_id
+            elif account.change_status(enrollment_id, change_id)['statusInfo']['state'] == state:
+                return enrollment_id
+
+    def test_enrollment_is_read_once(self):
+        enrollment_id = self.enrollment_in_state('running')
+        result = self.cli.run('status', '--enrollment-id', str(enrollment_id))
+        assert result.returncode == 0, result.stderr
+        assert 'Current State = running' in result.stderr
+        assert self.server.requests['GET /cps/v2/enrollments/{id}'] == 1
+        assert self.server.requests['GET /cps/v2/enrollments/{id}/changes/{id}'] == 1
+        assert self.server.requests['GET /cps/v2/enrollments'] == 0
+
+    def test_lookup_by_cn(self):
+        enrollment_id = self.enrollment_in_state('error')
+        cn = self.server.account.enrollment(enrollment_id)['csr']['cn']
+        result = self.cli.run('status', '--cn', cn)
+        assert result.returncode == 0, result.stderr
+        assert 'Error Code = FAKE-001' in result.stderr
+        assert self.server.requests['GET /cps/v2/enrollments/{id}'] == 1
+
+    def test_input_required(self):
+        result = self.cli.run('status', '--enrollment-id', str(self.enrollment_in_state('wait-input')))
+        assert result.returncode == 0, result.stderr
+        assert 'Waiting for input: ' in result.stderr
+
+    def test_no_pending_change(self):
+        result = self.cli.run('status', '--enrollment-id', str(self.enrollment_in_state(None)))
+        assert result.returncode == 0, result.stderr
+        assert 'no current pending changes' in result.stderr
+        assert self.server.requests['GET /cps/v2/enrollments/{id}/changes/{id}'] == 0
+
+    def dashboard_rows(self, stdout: str) -> dict:
+        rows = [[cell.strip() for cell in line.strip('|').split('|')] for line in stdout.splitlines() if line.startswith('| ')]
+        return {int(row[0]): row for row in rows[1:]}
+
+    def test_all_pending_dashboard(self):
+        result = self.cli.run('status', '--all-pending', '--concurrency', '4')
+        assert result.returncode == 0, result.stderr
+        account = self.server.account
+        pending = [enrollment_id for enrollment_id in account.enrollment_ids if account.change_id(enrollment_id)]
+        rows = self.dashboard_rows(result.stdout)
+        assert sorted(rows) == pending
+        for enrollment_id, row in rows.items():
+            assert row[3] == account.change_status(enrollment_id, account.change_id(enrollment_id))['statusInfo']['state']
+        assert f'{len(pending)} of {len(pending)} enrollments' in result.stdout
+        # the change locations come from the list, no enrollment is read on its own
+        assert self.server.requests['GET /cps/v2/enrollments'] == 1
+        assert self.server.requests['GET /cps/v2/enrollments/{id}'] == 0
+        assert self.server.requests['GET /cps/v2/enrollments/{id}/changes/{id}'] == len(pending)
+
+    def test_enrollment_ids_file(self):
+        ids_file = os.path.join(self.cli.path, 'ids.txt')
+        no_change = self.enrollment_in_state(None)
+        with open(ids_file, 'w') as f:
+            f.write(f'{self.enrollment_in_state("error")}, {no_change}\n99999  # deleted\n')
+        result = self.cli.run('status', '--enrollment-ids', ids_file)
+        assert result.returncode == 0, result.stderr
+        rows = self.dashboard_rows(result.stdout)
+        assert rows[self.enrollment_in_state('error')][3] == 'error'
+        assert rows[no_change][3] == 'no pending changes'
+        assert rows[99999][3] == 'unavailable'
+        assert self.server.requests['GET /cps/v2/enrollments/{id}'] == 3
+        assert self.cli.run('status', '--enrollment-ids', 'missing.txt').returncode == 1
+
+    def test_watch_exit_codes(self):
+        result = self.cli.run('status', '--enrollment-id', str(self.enrollment_in_state('error')), '--watch')
+        assert result.returncode == 3, result.stderr
+        result = self.cli.run('status', '--enrollment-id', str(self.enrollment_in_state('running')), '--watch', '--watch-timeout', '0')
+        assert result.returncode == 5, result.stderr
+        assert 'Stopped watching in state running after 1 checks' in result.stderr
+        result = self.cli.run('status', '--enrollment-id', str(self.enrollment_in_state(None)), '--watch')
+        assert result.returncode == 0, result.stderr
+
+    def test_watch_sees_the_change_complete(self):
+        enrollment_id = self.enrollment_in_state('running')
+        process = self.cli.start('status', '--enrollment-id', str(enrollment_id), '--watch', '--watch-timeout', '2')
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline and not self.server.requests['GET /cps/v2/enrollments/{id}/changes/{id}']:
+            time.sleep(0.05)
+        self.server.account.complete_change(enrollment_id)
+        _, stderr = process.communicate(timeout=60)
+        assert process.returncode == 0, stderr
+        assert 'The change is complete.' in stderr
+        # the change status is gone, the enrollment is read again past the request memo
+        assert self.server.requests['GET /cps/v2/enrollments/{id}/changes/{id}'] == 2
+        assert self.server.requests['GET /cps/v2/enrollments/{id}'] == 2
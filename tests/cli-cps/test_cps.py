@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from akamai_apis.auth import RequestScheduler
+from akamai_apis.cps import AsyncCps
+from akamai_apis.cps import Cps
+from akamai_apis.cps import CpsEndpoints
+from mock_factory import Namespace
+
+try:
+    from aiohttp import web
+except ImportError:  # pragma: no cover
+    web = None
+
+BIN = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../bin'))
+
+
+class TestCps(unittest.TestCase):
+    def test_endpoints_add_account_switch_key(self):
+        cps = Cps(MagicMock(), Namespace(section='default', account_switch_key='ABC-123'))
+        with patch.object(cps.s, 'request') as mock_request:
+            cps.get_change_status(10, 20)
+            cps.list_enrollments(contract_id='K-1')
+
+        (method, url), kwargs = mock_request.call_args_list[0]
+        assert method == 'GET' and url == f'{cps.host}/cps/v2/enrollments/10/changes/20'
+        assert kwargs['params'] == {'accountSwitchKey': 'ABC-123'}
+        assert kwargs['headers'] == {'Accept': 'application/vnd.akamai.cps.change.v1+json'}
+        _, kwargs = mock_request.call_args_list[1]
+        assert kwargs['params'] == {'accountSwitchKey': 'ABC-123', 'contractId': 'K-1'}
+
+    def test_endpoints_need_a_transport(self):
+        with self.assertRaises(TypeError):
+            CpsEndpoints()
+
+    def test_sync_client_does_not_load_asyncio(self):
+        result = subprocess.run([sys.executable, '-c', 'import sys, akamai_apis.cps; print("asyncio" in sys.modules)'],
+                                capture_output=True, text=True, check=True, env=dict(os.environ, PYTHONPATH=BIN))
+        assert result.stdout.strip() == 'False'
+
+
+@unittest.skipIf(web is None, 'aiohttp is not installed')
+class TestAsyncCps(unittest.TestCase):
+    def setUp(self):
+        self.in_flight = self.max_in_flight = 0
+        self.requests = []
+        self.throttled = set()
+
+    async def enrollment(self, request):
+        enrollment_id = int(request.match_info['enrollment_id'])
+        self.requests.append(request)
+        if enrollment_id == 7 and enrollment_id not in self.throttled:
+            self.throttled.add(enrollment_id)
+            return web.json_response({}, status=429, headers={'Retry-After': '0'})
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return web.json_response({'id': enrollment_id})
+
+    async def fan_out(self, ids, concurrency):
+        app = web.Application()
+        app.router.add_get('/cps/v2/enrollments/{enrollment_id}', self.enrollment)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        try:
+            async with AsyncCps(MagicMock(), Namespace(section='default', account_switch_key='ABC-123'), concurrency) as cps:
+                cps.host = f'http://127.0.0.1:{port}'
+                cps.baseurl = f'{cps.host}/cps/v2'
+                with patch.object(cps.s, 'scheduler', RequestScheduler(rate_limit=None, backoff_base=0)):
+                    return await asyncio.gather(*(cps.get_enrollment(i) for i in ids))
+        finally:
+            await runner.cleanup()
+
+    def test_gather_is_bounded_signed_and_retried(self):
+        responses = asyncio.run(self.fan_out(range(20), concurrency=5))
+
+        assert [response.json()['id'] for response in responses] == list(range(20))
+        assert all(response.status_code == 200 for response in responses)
+        assert 1 < self.max_in_flight <= 5
+        # enrollment 7 was throttled once and sent again
+        assert len(self.requests) == 21
+        assert all(request.headers['Authorization'].startswith('EG1-HMAC-SHA256 ') for request in self.requests)
+        assert all(request.query['accountSwitchKey'] == 'ABC-123' for request in self.requests)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import unittest
+
+from utils.enrollment_cache import contract_ids_of
+from utils.enrollment_cache import EnrollmentCache
+from utils.enrollment_cache import refresh_contract
+
+
+class Listing:
+    """Stands in for the enrollment listing of the CPS client"""
+
+    def __init__(self, status_code: int, body: dict | None = None, headers: dict | None = None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.requests = []
+
+    def json(self):
+        return self.body
+
+    def list_enrollments(self, contract_id, extra_headers=None):
+        self.requests.append((contract_id, extra_headers))
+        return self
+
+
+class TestEnrollmentCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def populate(self):
+        with EnrollmentCache(self.path) as cache:
+            cache.update_contract('A-1', [{'cn': 'a.example.com', 'contractId': 'A-1', 'enrollmentId': 1,
+                                           'sans': ['a.example.com', 'www.example.com']}],
+                                  {'ETag': '"v1"', 'Last-Modified': 'Tue, 01 Aug 2023 00:00:00 GMT'})
+            cache.update_contract('B-2', [{'cn': 'b.example.com', 'contractId': 'B-2', 'enrollmentId': 2,
+                                           'sans': ['b.example.com', 'shared.example.com']},
+                                          {'cn': 'c.example.com', 'contractId': 'B-2', 'enrollmentId': 3,
+                                           'sans': ['c.example.com', 'shared.example.com']}])
+
+    def test_lookup_by_id_cn_and_san(self):
+        assert not EnrollmentCache(self.path).exists()
+        self.populate()
+
+        with EnrollmentCache(self.path) as cache:
+            assert cache.find_by_id('2') == {'cn': 'b.example.com', 'contractId': 'B-2', 'enrollmentId': 2}
+            assert cache.find_by_id(99) is None
+            assert cache.find_by_id('www.example.com') is None
+            assert [e['enrollmentId'] for e in cache.find_by_hostname('A.example.com')] == [1]
+            assert [e['enrollmentId'] for e in cache.find_by_hostname('www.example.com')] == [1]
+            assert [e['enrollmentId'] for e in cache.find_by_hostname('shared.example.com')] == [2, 3]
+            assert cache.find_by_hostname('unknown.example.com') == []
+            assert cache.contract_ids() == ['A-1', 'B-2']
+
+    def test_merge_only_changed_contract(self):
+        self.populate()
+
+        with EnrollmentCache(self.path) as cache:
+            assert cache.conditional_headers('A-1') == {'If-None-Match': '"v1"',
+                                                        'If-Modified-Since': 'Tue, 01 Aug 2023 00:00:00 GMT'}
+            assert cache.conditional_headers('B-2') == {}
+
+            cache.touch_contract('A-1', {})
+            cache.update_contract('B-2', [{'cn': 'd.example.com', 'contractId': 'B-2', 'enrollmentId': 4}])
+
+        with EnrollmentCache(self.path) as cache:
+            assert [e['enrollmentId'] for e in cache.enrollments()] == [1, 4]
+            assert cache.conditional_headers('A-1')['If-None-Match'] == '"v1"'
+            assert cache.find_by_hostname('shared.example.com') == []
+
+    def test_freshness_and_retain(self):
+        self.populate()
+
+        with EnrollmentCache(self.path) as cache:
+            assert cache.is_fresh('A-1', max_age=60)
+            assert not cache.is_fresh('A-1', max_age=None)
+            assert not cache.is_fresh('Z-9', max_age=60)
+            cache.db.execute("UPDATE contracts SET fetched_at = fetched_at - 120 WHERE contract_id = 'A-1'")
+            assert not cache.is_fresh('A-1', max_age=60)
+
+            cache.retain_contracts(['B-2'])
+            assert cache.contract_ids() == ['B-2']
+            assert cache.find_by_hostname('www.example.com') == []
+
+            cache.clear()
+            assert cache.enrollments() == []
+
+    def test_import_legacy_enrollments_json(self):
+        with open(os.path.join(self.path, 'enrollments.json'), 'w') as f:
+            json.dump([{'cn': 'a.example.com', 'contractId': 'A-1', 'enrollmentId': 1},
+                       {'cn': 'b.example.com', 'contractId': 'B-2', 'enrollmentId': 2}], f)
+        cache = EnrollmentCache(self.path)
+        assert cache.exists()
+
+        with cache:
+            assert cache.find_by_id(2) == {'cn': 'b.example.com', 'contractId': 'B-2', 'enrollmentId': 2}
+            assert cache.contract_ids() == ['A-1', 'B-2']
+            # no listing metadata, the next incremental refresh re-lists every contract
+            assert not cache.is_fresh('A-1', max_age=60)
+        assert not os.path.exists(os.path.join(self.path, 'enrollments.json'))
+        assert os.path.exists(os.path.join(self.path, 'enrollments.json.bak'))
+
+    def test_refresh_contract(self):
+        assert contract_ids_of(['ctr_A-1', 'B-2']) == ['A-1', 'B-2']
+        self.populate()
+        listing = Listing(200, {'enrollments': [
+            {'location': '/cps/v2/enrollments/7', 'csr': {'cn': 'g.example.com', 'sans': ['g.example.com', 'h.example.com']}},
+            {'location': '/cps/v2/enrollments/8'}]}, {'ETag': '"v2"'})
+
+        with EnrollmentCache(self.path) as cache:
+            assert refresh_contract(cache, listing.list_enrollments, 'A-1') is listing
+            assert listing.requests == [('A-1', None)]
+            assert [e['enrollmentId'] for e in cache.find_by_hostname('h.example.com')] == [7]
+            assert cache.find_by_id(1) is None
+            assert cache.find_by_id(8) is None
+
+            listing.status_code = 304
+            refresh_contract(cache, listing.list_enrollments, 'A-1', incremental=True)
+            assert listing.requests[-1][1]['If-None-Match'] == '"v2"'
+            assert sorted(e['enrollmentId'] for e in cache.enrollments()) == [2, 3, 7]
+
+            listing.status_code = 500
+            refresh_contract(cache, listing.list_enrollments, 'B-2', incremental=True)
+            assert sorted(e['enrollmentId'] for e in cache.enrollments()) == [2, 3, 7]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import datetime
+import tempfile
+import unittest
+
+from utils.expirations import bucket
+from utils.expirations import DEPLOYED_MAX_AGE
+from utils.expirations import DeploymentIndex
+from utils.expirations import parse_window
+from utils.expirations import UNDEPLOYED_MAX_AGE
+from utils.expirations import week_of
+
+NOW = datetime.datetime(2026, 10, 14, 12, 0, 0)
+NOW_TS = 2_000_000_000.0
+
+
+def enrollment(enrollment_id, contract_id='K-0001'):
+    return {'enrollmentId': enrollment_id, 'contractId': contract_id, 'cn': f'www{enrollment_id}.example.com'}
+
+
+class TestWindow(unittest.TestCase):
+    def test_parse_window(self):
+        assert parse_window('30d') == datetime.timedelta(days=30)
+        assert parse_window('4W') == datetime.timedelta(weeks=4)
+        assert parse_window('12h') == datetime.timedelta(hours=12)
+        assert parse_window('7') == datetime.timedelta(days=7)
+        for value in ['', 'd', '3x', '-1d', '1.5d']:
+            with self.assertRaises(ValueError):
+                parse_window(value)
+
+    def test_week_of_is_monday(self):
+        assert week_of(datetime.datetime(2026, 10, 14, 23, 59)) == '2026-10-12'
+        assert week_of(datetime.datetime(2026, 10, 19)) == '2026-10-19'
+
+
+class TestDeploymentIndex(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.index = DeploymentIndex(tmp.name).open()
+        self.addCleanup(self.index.close)
+        self.enrollments = [enrollment(1), enrollment(2), enrollment(3, 'K-0002'), enrollment(4), enrollment(5)]
+
+    def test_only_what_may_expire_in_the_window_is_refetched(self):
+        until = NOW + datetime.timedelta(days=30)
+        assert self.index.stale(self.enrollments, until, NOW_TS) == self.enrollments
+
+        self.index.update(self.enrollments[0], NOW + datetime.timedelta(days=10), NOW_TS)
+        self.index.update(self.enrollments[1], NOW + datetime.timedelta(days=200), NOW_TS)
+        self.index.update(self.enrollments[2], NOW - datetime.timedelta(days=2), NOW_TS)
+        self.index.update(self.enrollments[3], None, NOW_TS)
+        stale = self.index.stale(self.enrollments, until, NOW_TS + 3600)
+        # inside the window or expired (may have been renewed) and never indexed
+        assert [e['enrollmentId'] for e in stale] == [1, 3, 5]
+        # undeployed enrollments are checked again once the entry is old enough
+        stale = self.index.stale(self.enrollments, until, NOW_TS + UNDEPLOYED_MAX_AGE)
+        assert [e['enrollmentId'] for e in stale] == [1, 3, 4, 5]
+        # and deployed certificates beyond the window, a replacement may expire earlier
+        stale = self.index.stale(self.enrollments, until, NOW_TS + DEPLOYED_MAX_AGE)
+        assert [e['enrollmentId'] for e in stale] == [1, 2, 3, 4, 5]
+
+    def test_expiring_and_retain(self):
+        self.index.update(self.enrollments[0], NOW + datetime.timedelta(days=10), NOW_TS)
+        self.index.update(self.enrollments[1], NOW + datetime.timedelta(days=200), NOW_TS)
+        self.index.update(self.enrollments[2], NOW - datetime.timedelta(days=2), NOW_TS)
+        expiring = self.index.expiring(NOW + datetime.timedelta(days=30))
+        assert [(e['enrollmentId'], e['expiration']) for e in expiring] == [(3, NOW - datetime.timedelta(days=2)),
+                                                                            (1, NOW + datetime.timedelta(days=10))]
+
+        self.index.retain([enrollment(1, 'K-0009'), enrollment(2)])
+        expiring = self.index.expiring(NOW + datetime.timedelta(days=300))
+        assert [(e['enrollmentId'], e['contractId']) for e in expiring] == [(1, 'K-0009'), (2, 'K-0001')]
+
+    def test_bucket_by_week_and_contract(self):
+        certificates = [dict(enrollment(1), expiration=datetime.datetime(2026, 10, 20)),
+                        dict(enrollment(2, 'K-0002'), expiration=datetime.datetime(2026, 10, 16)),
+                        dict(enrollment(3), expiration=datetime.datetime(2026, 10, 15)),
+                        dict(enrollment(4), expiration=datetime.datetime(2026, 10, 1))]
+        buckets = bucket(certificates, NOW)
+        assert list(buckets) == ['expired', '2026-10-12', '2026-10-19']
+        assert {week: {contract_id: [c['enrollmentId'] for c in certs] for contract_id, certs in contracts.items()}
+                for week, contracts in buckets.items()} == {'expired': {'K-0001': [4]},
+                                                            '2026-10-12': {'K-0001': [3], 'K-0002': [2]},
+                                                            '2026-10-19': {'K-0001': [1]}}
+
+
+if __name__ == '__main__':
+    unittest.main()
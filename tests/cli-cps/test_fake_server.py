@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import csv
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+from akamai_apis import request_memo
+from akamai_apis.auth import RequestScheduler
+from akamai_apis.auth import ScheduledSession
+from akamai_apis.cps import Cps
+from cryptography import x509
+from fake_server import CliRunner
+from fake_server import FakeCpsServer
+from fake_server import SyntheticAccount
+from mock_factory import Namespace
+
+
+class TestFakeServer(unittest.TestCase):
+    def setUp(self):
+        request_memo.reset()
+        self.server = FakeCpsServer(SyntheticAccount(contracts=3, enrollments=60, pending_ratio=0.5)).start()
+        self.addCleanup(self.server.stop)
+        self.cps = Cps(MagicMock(), Namespace(section='default', account_switch_key=None))
+        self.cps.host = self.server.url
+        self.cps.baseurl = f'{self.server.url}/cps/v2'
+        scheduler = patch.object(self.cps.s, 'scheduler', RequestScheduler(rate_limit=None, backoff_base=0))
+        scheduler.start()
+        self.addCleanup(scheduler.stop)
+
+    def test_account_walkthrough(self):
+        contracts = self.cps.get_contracts().json()
+        assert contracts == ['ctr_K-0001', 'ctr_K-0002', 'ctr_K-0003']
+
+        enrollments = self.cps.list_enrollments(contract_id='K-0002').json()['enrollments']
+        assert len(enrollments) == 20
+        enrollment = self.cps.get_enrollment(enrollments[0]['id']).json()
+        assert enrollment['csr']['cn'] in enrollment['csr']['sans']
+
+        pending = [e for e in enrollments if e['pendingChanges']]
+        assert pending
+        change_id = int(pending[0]['pendingChanges'][0]['location'].rsplit('/', 1)[1])
+        status = self.cps.get_change_status(pending[0]['id'], change_id).json()
+        assert status['statusInfo']['state'] in ('wait-input', 'running', 'error')
+        assert self.cps.get_change_history(pending[0]['id']).json()['changes'][0]['status'] == 'incomplete'
+
+        deployment = self.cps.get_certificate(enrollments[0]['id']).json()
+        certificate = x509.load_pem_x509_certificate(deployment['certificate'].encode())
+        assert certificate.not_valid_after == self.server.account.not_valid_after(enrollments[0]['id'])
+        assert self.cps.get_enrollment(99999).status_code == 404
+
+        assert self.server.requests['GET /cps/v2/enrollments'] == 1
+        assert self.server.requests['GET /cps/v2/enrollments/{id}/changes/{id}'] == 1
+
+    def test_writes_change_the_account(self):
+        self.cps.delete_enrollment(10000)
+        assert self.cps.get_enrollment(10000).status_code == 404
+        assert len(self.cps.list_enrollments().json()['enrollments']) == 59
+
+    def test_faults_are_retried(self):
+        self.server.throttle_rate = 0.3
+        self.server.error_rate = 0.2
+        responses = [self.cps.get_enrollment(10000 + index) for index in range(20)]
+        assert all(response.status_code == 200 for response in responses)
+        assert self.server.requests['GET /cps/v2/enrollments/{id}'] > 20
+
+
+class TestCliWalkthrough(unittest.TestCase):
+    """The commands of the live CLI, one after the other in a subprocess, against the same fake account"""
+
+    def setUp(self):
+        self.server = FakeCpsServer(SyntheticAccount(contracts=3, enrollments=60, pending_ratio=0.5), tls=True).start()
+        self.addCleanup(self.server.stop)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cli = CliRunner(self.server, tmp.name)
+
+    def test_setup_list_audit_status(self):
+        account = self.server.account
+        pending = {enrollment_id for enrollment_id in account.enrollment_ids if account.change_id(enrollment_id) is not None}
+
+        result = self.cli.run('setup')
+        assert result.returncode == 0, result.stderr
+        assert self.server.requests['GET /cps/v2/enrollments'] == 3
+
+        result = self.cli.run('list')
+        assert result.returncode == 0, result.stderr
+        listed = {line.split('|')[1].strip().strip('*') for line in result.stdout.splitlines() if line.startswith('| ')}
+        assert listed - {'Enrollment ID'} == {str(enrollment_id) for enrollment_id in account.enrollment_ids}
+
+        result = self.cli.run('audit', '--concurrency', '8', '--output-file', 'audit.csv')
+        assert result.returncode == 0, result.stderr
+        with open(os.path.join(self.cli.path, 'audit.csv'), newline='') as f:
+            rows = [*csv.DictReader(f)]
+        assert {int(row['Enrollment ID']) for row in rows if row['Status'] == 'IN-PROGRESS'} == pending
+        assert self.server.requests['GET /cps/v2/enrollments/{id}'] == 60
+
+        enrollment_id = min(pending)
+        result = self.cli.run('status', '--enrollment-id', str(enrollment_id))
+        assert result.returncode == 0, result.stderr
+        assert f'Getting change status for changeId: {account.change_id(enrollment_id)}' in result.stderr
+
+        result = self.cli.run('status', '--all-pending', '--concurrency', '8')
+        assert result.returncode == 0, result.stderr
+        dashboard = {line.split('|')[1].strip() for line in result.stdout.splitlines() if line.startswith('| ')}
+        assert {str(enrollment_id) for enrollment_id in pending} <= dashboard
+        assert self.server.requests['GET /cps/v2/enrollments/{id}/changes/{id}'] == len(pending) + 1
+
+
+class TestFakeServerTls(unittest.TestCase):
+    def test_https_with_ca_file(self):
+        with FakeCpsServer(SyntheticAccount(enrollments=5), tls=True) as server:
+            session = ScheduledSession(RequestScheduler(rate_limit=None, max_retries=0))
+            response = session.get(f'{server.url}/cps/v2/enrollments', verify=server.ca_file)
+            etag = response.headers['ETag']
+            assert len(response.json()['enrollments']) == 5
+            assert session.get(f'{server.url}/cps/v2/enrollments', headers={'If-None-Match': etag},
+                               verify=server.ca_file).status_code == 304
+
+
+if __name__ == '__main__':
+    unittest.main()
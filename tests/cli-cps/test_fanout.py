@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import random
+import threading
+import time
+import unittest
+
+import pytest
+from utils.fanout import FanOut
+
+
+class TestFanOut(unittest.TestCase):
+    def test_preserves_input_order(self):
+        def fetch(item):
+            time.sleep(random.uniform(0, 0.01))
+            return item * 2
+
+        engine = FanOut(concurrency=8)
+        results = list(engine.map(fetch, range(50)))
+
+        assert results == [item * 2 for item in range(50)]
+        assert engine.completed == 50
+        assert engine.throughput > 0
+        assert '50 enrollments' in engine.summary(unit='enrollments')
+
+    def test_bounded_concurrency(self):
+        lock = threading.Lock()
+        active = {'now': 0, 'peak': 0}
+
+        def fetch(item):
+            with lock:
+                active['now'] += 1
+                active['peak'] = max(active['peak'], active['now'])
+            time.sleep(0.005)
+            with lock:
+                active['now'] -= 1
+            return item
+
+        list(FanOut(concurrency=3).map(fetch, range(30)))
+        assert active['peak'] <= 3
+
+    def test_on_complete_counts_every_item(self):
+        lock = threading.Lock()
+        finished = []
+
+        def on_complete():
+            with lock:
+                finished.append(1)
+
+        results = list(FanOut(concurrency=4).map(lambda item: item, range(25), on_complete=on_complete))
+        assert results == list(range(25))
+        assert len(finished) == 25
+
+    def test_error_is_raised_in_order(self):
+        def fetch(item):
+            if item == 5:
+                raise ValueError('boom')
+            return item
+
+        results = []
+        with pytest.raises(ValueError):
+            for result in FanOut(concurrency=4).map(fetch, range(10)):
+                results.append(result)
+        assert results == [0, 1, 2, 3, 4]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import requests
+from akamai_apis import instrumentation
+from akamai_apis.auth import RequestScheduler
+from akamai_apis.auth import ScheduledSession
+from akamai_apis.instrumentation import percentile
+from akamai_apis.instrumentation import Profiler
+
+HOST = 'https://akab-test.luna.akamaiapis.net'
+
+
+def api_response(status=200, body=b'{"enrollments": []}'):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    return response
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.profiler = instrumentation.configure()
+
+    def tearDown(self):
+        instrumentation.configure(False)
+
+    def test_percentiles(self):
+        values = list(range(1, 101))
+        assert [percentile(values, pct) for pct in (50, 95, 99, 100)] == [50, 95, 99, 100]
+        assert percentile([7.0], 99) == 7.0
+        assert percentile([], 50) == 0.0
+
+    @patch('akamai_apis.auth.requests.Session.request')
+    def test_session_records_every_request(self, mock_request):
+        mock_request.side_effect = [api_response(503), api_response(), api_response(404, b'{}')]
+        session = ScheduledSession(RequestScheduler(rate_limit=None, backoff_base=0))
+        session.get(f'{HOST}/cps/v2/enrollments/10/changes/20')
+        session.get(f'{HOST}/cps/v2/enrollments/11/changes/21')
+
+        samples = self.profiler.samples
+        assert [(sample['endpoint'], sample['status'], sample['attempts']) for sample in samples] == [
+            ('/cps/v2/enrollments/{id}/changes/{id}', 200, 2),
+            ('/cps/v2/enrollments/{id}/changes/{id}', 404, 1)]
+        assert samples[0]['bytes'] == len(b'{"enrollments": []}')
+
+        row, = self.profiler.summary()
+        assert row['endpoint'] == 'GET /cps/v2/enrollments/{id}/changes/{id}'
+        assert (row['calls'], row['retries'], row['errors']) == (2, 1, 1)
+        assert row['p50_ms'] <= row['p95_ms'] <= row['p99_ms']
+        assert '2 API calls, 1 retries' in self.profiler.format_summary()
+
+    @patch('akamai_apis.auth.requests.Session.request')
+    def test_failed_requests_are_recorded(self, mock_request):
+        mock_request.side_effect = requests.ConnectionError()
+        session = ScheduledSession(RequestScheduler(rate_limit=None, max_retries=0))
+        with self.assertRaises(requests.ConnectionError):
+            session.post(f'{HOST}/cps/v2/enrollments', data='{}')
+        assert self.profiler.samples[0]['status'] is None
+        assert self.profiler.summary()[0]['errors'] == 1
+
+    def test_dump(self):
+        profiler = Profiler()
+        for latency in (0.1, 0.2, 0.3):
+            profiler.record('get', f'{HOST}/cps/v2/enrollments/1', 200, 10, latency)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'profile.json')
+            profiler.dump(path, 'audit')
+            with open(path) as f:
+                dumped = json.load(f)
+        assert dumped['command'] == 'audit'
+        assert [sample['latency_ms'] for sample in dumped['samples']] == [100.0, 200.0, 300.0]
+        assert dumped['summary'][0]['p50_ms'] == 200.0
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import unittest
+
+from akamai_apis.models import Change
+from akamai_apis.models import Deployment
+from akamai_apis.models import Enrollment
+from fake_server import SyntheticAccount
+
+SUMMARY_FIELDS = ('cn', 'sans', 'validation_type', 'certificate_type', 'pending_changes')
+
+
+class TestModels(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.account = SyntheticAccount(contracts=2, enrollments=40, pending_ratio=0.5)
+
+    def test_enrollment(self):
+        data = self.account.enrollment(10002)
+        enrollment = Enrollment.from_json(data, 'K-0001')
+        assert not hasattr(enrollment, '__dict__')
+        assert (enrollment.id, enrollment.contract_id, enrollment.cn) == (10002, 'K-0001', data['csr']['cn'])
+        assert enrollment.sans == tuple(data['csr']['sans'])
+        assert enrollment.disallowed_tls_versions == ('TLSv1', 'TLSv1_1')
+        assert enrollment.admin_contact.name == 'Jane Doe'
+        assert enrollment.tech_contact.email == 'tech@example.com'
+
+    def test_only_requested_fields_are_decoded(self):
+        data = dict(self.account.enrollment(10003))
+        del data['networkConfiguration']
+        enrollment = Enrollment.from_json(data, fields=SUMMARY_FIELDS)
+        assert enrollment.cn == data['csr']['cn']
+        assert enrollment.geography is None and enrollment.admin_contact is None
+
+    def test_status_and_pending_change(self):
+        pending = [Enrollment.from_json(self.account.enrollment(enrollment_id), fields=SUMMARY_FIELDS)
+                   for enrollment_id in self.account.enrollment_ids]
+        in_progress = [enrollment for enrollment in pending if enrollment.status == 'IN-PROGRESS']
+        assert in_progress and len(in_progress) < len(pending)
+        assert in_progress[0].pending_change_id == self.account.change_id(in_progress[0].id)
+        assert Enrollment.from_json({'id': 1, 'csr': {'cn': 'a'}}, fields=('cn', 'pending_changes')).status == 'UNKNOWN'
+
+    def test_shared_strings(self):
+        first, second = (Enrollment.from_json(self.account.enrollment(enrollment_id)) for enrollment_id in (10000, 10002))
+        assert first.geography is second.geography
+        assert first.must_have_ciphers is second.must_have_ciphers
+
+    def test_deployment_decodes_on_demand(self):
+        deployment = Deployment.from_json(self.account.deployment(10001, 'staging'), 10001)
+        assert deployment.network == 'staging' and deployment._decoded is None
+        assert deployment.not_valid_after == self.account.not_valid_after(10001)
+        assert deployment.sans == tuple(self.account.enrollment(10001)['csr']['sans'])
+
+    def test_change(self):
+        enrollment = Enrollment.from_json(self.account.enrollment(10002))
+        location = enrollment.pending_changes[0]
+        change = Change.from_location(location, self.account.change_status(10002, enrollment.pending_change_id))
+        assert not hasattr(change, '__dict__')
+        assert (change.enrollment_id, change.change_id) == (10002, enrollment.pending_change_id)
+        assert change.state == 'wait-input' and change.input_required
+        assert change.next_input == 'post-verification-warnings-acknowledgement'
+
+    def test_change_input_required_to_proceed(self):
+        optional = {'type': 'change-management-info', 'requiredToProceed': False}
+        change = Change.from_json({'statusInfo': {'state': 'wait-review-cert-warning'}, 'allowedInput': [optional]})
+        # input that is only allowed does not hold the change up
+        assert change.allowed_input == ('change-management-info',) and not change.input_required
+        assert change.next_input == 'change-management-info'
+        change = Change.from_json({'statusInfo': {'state': 'wait-input'},
+                                   'allowedInput': [optional, {'type': 'lets-encrypt-challenges', 'requiredToProceed': True}]})
+        assert change.input_required and change.next_input == 'lets-encrypt-challenges'
+        error = Change.from_json({'statusInfo': {'state': 'error', 'description': 'failed', 'error': {'code': 'E1', 'description': 'bad'}}})
+        assert error.error_description == 'E1: bad' and not error.input_required
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import copy
+import os
+import subprocess
+import sys
+import unittest
+
+import pytest
+import utils.cli as cli
+from utils.parser import AkamaiParser
+
+BIN = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../bin'))
+
+
+class TestAkamaiParser(unittest.TestCase):
+    def test_command_definitions_are_not_consumed(self):
+        definitions = copy.deepcopy(cli.main_commands)
+        first = AkamaiParser.get_args(['audit', '--ndjson', '--concurrency', '4'])
+        second = AkamaiParser.get_args(['audit', '--concurrency', '3'])
+
+        assert cli.main_commands == definitions
+        assert first.ndjson and first.concurrency == 4
+        assert not second.ndjson and second.concurrency == 3
+
+    def test_only_the_selected_command_is_built(self):
+        assert AkamaiParser.selected_commands(['--section', 'default', 'list', '--show-expiration']) == {'list'}
+        args = AkamaiParser.get_args(['list', '--show-expiration'])
+        assert args.command == 'list' and args.show_expiration
+
+        # other commands are registered by name only, their options are unknown until selected
+        with pytest.raises(SystemExit):
+            AkamaiParser.get_args(['audit', '--show-expiration'])
+
+    def test_parsing_does_not_load_the_help_formatter(self):
+        code = ('import sys; from utils.parser import AkamaiParser; AkamaiParser.get_args(["audit", "--ndjson"]); '
+                'print("rich_argparse" in sys.modules)')
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                env=dict(os.environ, PYTHONPATH=BIN))
+        assert result.stdout.strip() == 'False'
+
+    def test_parsing_and_help_do_not_load_the_http_stack(self):
+        heavy = ['requests', 'akamai.edgegrid', 'asyncio', 'akamai_apis.auth']
+        for args in [['audit', '--ndjson'], ['--help']]:
+            code = ('import sys\n'
+                    'from utils.parser import AkamaiParser\n'
+                    f'try:\n    AkamaiParser.get_args({args!r})\nexcept SystemExit:\n    pass\n'
+                    f'print([module for module in {heavy!r} if module in sys.modules])')
+            result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                    env=dict(os.environ, PYTHONPATH=BIN))
+            assert result.stdout.strip().splitlines()[-1] == '[]', args
+
+
+if __name__ == '__main__':
+    unittest.main()
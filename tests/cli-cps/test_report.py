@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import contextlib
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+import unittest
+import zipfile
+
+from utils.report import CsvReport
+from utils.report import NdjsonReport
+from utils.report import XlsxReport
+
+
+class TestCsvReport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output_file = os.path.join(self.tmp.name, 'audit.csv')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_fields_with_commas_and_quotes_round_trip(self):
+        rows = [['A-1', 1, 'a.example.com', 'a.example.com www.example.com', 'Doe, Jane'],
+                ['A-1', 2, 'b.example.com', '', 'say "hi"']]
+        with CsvReport(self.output_file, ['Contract', 'Enrollment ID', 'CN', 'SANs', 'Admin']) as report:
+            for row in rows:
+                report.write(row)
+
+        with open(self.output_file, newline='') as f:
+            written = list(csv.reader(f))
+        assert written[0] == ['Contract', 'Enrollment ID', 'CN', 'SANs', 'Admin']
+        assert written[1:] == [[str(cell) for cell in row] for row in rows]
+        assert report.rows == 2
+
+    def test_flushes_periodically(self):
+        report = CsvReport(self.output_file, ['n'], flush_rows=2, flush_interval=3600).open()
+        report.write([1])
+        assert os.path.getsize(self.output_file) == 0
+        report.write([2])
+        with open(self.output_file) as f:
+            assert f.read().split() == ['n', '1', '2']
+        report.close()
+
+    def test_dash_streams_to_stdout(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            with CsvReport('-', ['n']) as report:
+                report.write([1])
+        assert stdout.getvalue().split() == ['n', '1']
+        assert not stdout.closed
+
+    def test_dates_are_rendered_in_utc(self):
+        with CsvReport(self.output_file, ['Expiration']) as report:
+            report.write([datetime.datetime(2024, 3, 1, 12, 30)])
+        with open(self.output_file, newline='') as f:
+            assert list(csv.reader(f))[1] == ['2024-03-01 12:30:00 UTC']
+
+
+class TestXlsxReport(unittest.TestCase):
+    def test_rows_are_typed_and_filtered(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = os.path.join(tmp, 'audit.xlsx')
+            with XlsxReport(output_file, ['Contract', 'Enrollment ID', 'Expiration', 'SANs']) as report:
+                report.write(['A-1', 10001, datetime.datetime(2024, 3, 1), 'a.example.com, b.example.com'])
+                report.write(['A-1', 10002, '', ''])
+
+            with zipfile.ZipFile(output_file) as workbook:
+                sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+
+        assert report.rows == 2
+        assert '<autoFilter ref="A1:D3"/>' in sheet
+        assert '<c r="B2"><v>10001</v></c>' in sheet
+        # 2024-03-01 as an Excel serial date with the date style applied
+        assert '<v>45352</v>' in sheet
+        # constant memory mode writes strings inline instead of through the shared string table
+        assert 'a.example.com, b.example.com' in sheet
+        assert 'C3' not in sheet
+
+
+class TestNdjsonReport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output_file = os.path.join(self.tmp.name, 'audit.ndjson')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_one_compact_object_per_line(self):
+        with NdjsonReport(self.output_file) as report:
+            report.write({'enrollmentId': 1, 'csr': {'cn': 'a.example.com'}})
+            report.write({'enrollmentId': 2, 'expires': datetime.datetime(2024, 3, 1)})
+
+        with open(self.output_file) as f:
+            lines = f.read().splitlines()
+        assert lines[0] == '{"enrollmentId":1,"csr":{"cn":"a.example.com"}}'
+        assert json.loads(lines[1]) == {'enrollmentId': 2, 'expires': '2024-03-01 00:00:00 UTC'}
+
+    def test_resume_skips_written_records_and_drops_partial_line(self):
+        with open(self.output_file, 'w') as f:
+            f.write('{"enrollmentId":1}\n{"enrollmentId":2}\n{"enrollmentId":3,"cs')
+
+        with NdjsonReport(self.output_file, resume=True) as report:
+            assert report.completed == {1, 2}
+            report.write({'enrollmentId': 3})
+
+        with open(self.output_file) as f:
+            assert [json.loads(line)['enrollmentId'] for line in f] == [1, 2, 3]
+
+    def test_without_resume_the_report_is_replaced(self):
+        with open(self.output_file, 'w') as f:
+            f.write('{"enrollmentId":1}\n')
+        with NdjsonReport(self.output_file) as report:
+            assert report.completed == set()
+        assert os.path.getsize(self.output_file) == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
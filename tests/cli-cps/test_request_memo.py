@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import requests
+from akamai_apis.auth import RequestScheduler
+from akamai_apis.auth import ScheduledSession
+from akamai_apis.request_memo import endpoint_template
+from akamai_apis.request_memo import RequestMemo
+
+HOST = 'https://akab-test.luna.akamaiapis.net'
+ENROLLMENT = f'{HOST}/cps/v2/enrollments/10'
+CHANGE = f'{HOST}/cps/v2/enrollments/10/changes/20'
+
+
+def api_response(status=200, body=b'{}'):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body
+    return response
+
+
+class TestRequestMemo(unittest.TestCase):
+    def setUp(self):
+        self.memo = RequestMemo()
+        self.session = ScheduledSession(RequestScheduler(rate_limit=None, max_retries=0), memo=self.memo)
+
+    @patch('akamai_apis.auth.requests.Session.request')
+    def test_each_resource_is_fetched_once(self, mock_request):
+        mock_request.return_value = api_response()
+        accept = {'Accept': 'application/vnd.akamai.cps.enrollment.v11+json'}
+        self.session.get(ENROLLMENT, headers=accept)
+        self.session.get(ENROLLMENT, headers=accept)
+        self.session.get(f'{ENROLLMENT}/deployments/production', headers=accept)
+        self.session.get(CHANGE)
+        self.session.get(CHANGE)
+
+        assert mock_request.call_count == 4
+        assert self.memo.hits == 1
+        assert self.memo.calls == {'GET /cps/v2/enrollments/{id}': 1, 'GET /cps/v2/enrollments/{id}/deployments/production': 1,
+                                   'GET /cps/v2/enrollments/{id}/changes/{id}': 2}
+        assert self.memo.summary().startswith('4 API calls, 1 answered from memo')
+
+    @patch('akamai_apis.auth.requests.Session.request')
+    def test_writes_and_errors_are_not_memoized(self, mock_request):
+        mock_request.return_value = api_response()
+        self.session.get(ENROLLMENT)
+        self.session.get(f'{HOST}/cps/v2/enrollments/11')
+        self.session.put(ENROLLMENT, data='{}')
+        self.session.get(ENROLLMENT)
+        self.session.get(f'{HOST}/cps/v2/enrollments/11')
+        assert self.memo.calls['GET /cps/v2/enrollments/{id}'] == 3
+
+        mock_request.return_value = api_response(503)
+        self.session.get(f'{HOST}/cps/v2/enrollments/12')
+        self.session.get(f'{HOST}/cps/v2/enrollments/12')
+        assert self.memo.calls['GET /cps/v2/enrollments/{id}'] == 5
+
+    @patch('akamai_apis.auth.requests.Session.request')
+    def test_no_cache_reads_the_live_resource(self, mock_request):
+        mock_request.side_effect = [api_response(body=b'{"v": 1}'), api_response(body=b'{"v": 2}')]
+        accept = {'Accept': 'application/vnd.akamai.cps.enrollment.v11+json'}
+        assert self.session.get(ENROLLMENT, headers=accept).json() == {'v': 1}
+        assert self.session.get(ENROLLMENT, headers={**accept, 'Cache-Control': 'no-cache'}).json() == {'v': 2}
+        # the live response replaces the memoized one
+        assert self.session.get(ENROLLMENT, headers=accept).json() == {'v': 2}
+        assert mock_request.call_count == 2
+
+    def test_memo_keeps_the_most_recently_used_responses(self):
+        memo = RequestMemo(max_entries=2)
+        calls = []
+
+        def send():
+            calls.append(1)
+            return api_response()
+
+        for enrollment_id in [1, 2, 1, 3, 1, 2]:
+            memo.get(f'{HOST}/cps/v2/enrollments/{enrollment_id}', {}, send)
+        # 2 was evicted by 3 since 1 was used more recently
+        assert len(calls) == 4 and memo.hits == 2
+        assert len(memo._responses) == 2
+
+    def test_concurrent_requests_share_one_call(self):
+        calls = []
+
+        def send():
+            calls.append(1)
+            time.sleep(0.05)
+            return api_response()
+
+        threads = [threading.Thread(target=self.memo.get, args=(ENROLLMENT, {}, send)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1 and self.memo.hits == 4
+
+    def test_endpoint_template(self):
+        assert endpoint_template(f'{CHANGE}?accountSwitchKey=1-ABC') == '/cps/v2/enrollments/{id}/changes/{id}'
+        assert endpoint_template(f'{HOST}/contract-api/v1/contracts/identifiers') == '/contract-api/v1/contracts/identifiers'
+
+
+if __name__ == '__main__':
+    unittest.main()
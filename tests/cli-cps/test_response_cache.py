@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import requests
+from akamai_apis.response_cache import ResponseCache
+
+BASE = 'https://akab-host.luna.akamaiapis.net'
+ENROLLMENT = f'{BASE}/cps/v2/enrollments/10001'
+DEPLOYMENT = f'{BASE}/cps/v2/enrollments/10001/deployments/production'
+HISTORY = f'{BASE}/cps/v2/enrollments/10001/history/changes'
+
+
+def make_response(status_code, body=None, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(body).encode() if body is not None else b''
+    response.headers.update(headers or {})
+    return response
+
+
+class FakeApi:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def __call__(self, kwargs):
+        self.calls.append(kwargs)
+        return self.responses.pop(0)
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_repeated_reads_hit_the_cache(self):
+        api = FakeApi(make_response(200, {'id': 10001}))
+        kwargs = {'headers': {'Accept': 'application/vnd.akamai.cps.change-history.v3+json'}}
+
+        first = self.cache.get(HISTORY, kwargs, api)
+        second = self.cache.get(HISTORY, kwargs, api)
+
+        assert first.json() == second.json() == {'id': 10001}
+        assert second.from_cache
+        assert len(api.calls) == 1
+        assert self.cache.hits == 1
+
+    def test_key_includes_accept_and_account_switch_key(self):
+        api = FakeApi(*[make_response(200, {'n': n}) for n in range(3)])
+        self.cache.get(DEPLOYMENT, {'headers': {'Accept': 'v3'}}, api)
+        self.cache.get(DEPLOYMENT, {'headers': {'Accept': 'v2'}}, api)
+        self.cache.get(DEPLOYMENT, {'headers': {'Accept': 'v3'}, 'params': {'accountSwitchKey': 'B-1'}}, api)
+        assert len(api.calls) == 3
+
+    def test_stale_entries_are_revalidated(self):
+        api = FakeApi(make_response(200, {'id': 10001}, {'ETag': '"abc"'}), make_response(304))
+        cache = ResponseCache(self.tmp.name, max_age=0)
+
+        cache.get(HISTORY, {}, api)
+        response = cache.get(HISTORY, {}, api)
+
+        assert api.calls[1]['headers']['If-None-Match'] == '"abc"'
+        assert response.status_code == 200
+        assert response.json() == {'id': 10001}
+        assert cache.revalidated == 1
+
+    def test_no_cache_requests_revalidate(self):
+        api = FakeApi(make_response(200, {'v': 1}, {'ETag': '"v1"'}), make_response(200, {'v': 2}, {'ETag': '"v2"'}))
+        self.cache.get(DEPLOYMENT, {}, api)
+        response = self.cache.get(DEPLOYMENT, {'headers': {'Cache-Control': 'no-cache'}}, api)
+
+        assert api.calls[1]['headers']['If-None-Match'] == '"v1"'
+        assert response.json() == {'v': 2}
+        assert self.cache.get(DEPLOYMENT, {}, api).json() == {'v': 2}
+        assert len(api.calls) == 2
+
+    def test_uncached_endpoints_and_errors_pass_through(self):
+        change_status = f'{ENROLLMENT}/changes/5'
+        api = FakeApi(*[make_response(200, {}) for _ in range(4)], make_response(404, {}), make_response(404, {}))
+        self.cache.get(change_status, {}, api)
+        self.cache.get(change_status, {}, api)
+        # pendingChanges of the enrollment must be live
+        self.cache.get(ENROLLMENT, {}, api)
+        self.cache.get(ENROLLMENT, {}, api)
+        self.cache.get(DEPLOYMENT, {}, api)
+        self.cache.get(DEPLOYMENT, {}, api)
+        assert len(api.calls) == 6
+
+    def test_write_invalidates_enrollment(self):
+        api = FakeApi(make_response(200, {'v': 1}), make_response(200, {'v': 2}))
+        self.cache.get(HISTORY, {}, api)
+        self.cache.invalidate(f'{ENROLLMENT}?allow-cancel-pending-changes=true')
+        assert self.cache.get(HISTORY, {}, api).json() == {'v': 2}
+
+    def test_least_recently_used_entries_are_evicted(self):
+        urls = [f'{BASE}/cps/v2/enrollments/{n}/history/changes' for n in range(6)]
+        api = FakeApi(*[make_response(200, {'payload': 'x' * 500}) for _ in urls])
+        self.cache.max_bytes = 3000
+
+        for age, url in enumerate(urls):
+            self.cache.get(url, {}, api)
+            entry_file = self.cache._entry_file(url, None, None)
+            if os.path.exists(entry_file):
+                os.utime(entry_file, (time.time() - 100 + age, time.time() - 100 + age))
+
+        remaining = {os.path.basename(root) for root, _, files in os.walk(self.tmp.name) if files}
+        assert '5' in remaining
+        assert '0' not in remaining
+        assert sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, files in os.walk(self.tmp.name) for name in files) <= 3000
+
+
+if __name__ == '__main__':
+    unittest.main()
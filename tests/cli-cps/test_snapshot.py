@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+
+from fake_server import SyntheticAccount
+from utils.audit import AUDIT_COLUMN_KEYS
+from utils.snapshot import Snapshot
+from utils.snapshot import SnapshotError
+from utils.snapshot import SnapshotWriter
+
+
+class TestSnapshot(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.account = SyntheticAccount(contracts=2, enrollments=40, pending_ratio=0.25)
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db_file = os.path.join(tmp.name, 'snapshot', 'snapshot.db')
+        self.write(self.account.enrollment_ids)
+
+    def write(self, enrollment_ids):
+        with SnapshotWriter(self.db_file) as writer:
+            for enrollment_id in enrollment_ids:
+                writer.add(self.account.enrollment(enrollment_id), self.account.contract_of(enrollment_id), enrollment_id,
+                           self.account.deployment(enrollment_id, 'production'))
+            writer.meta['section'] = 'default'
+
+    def test_rows_follow_the_audit_columns(self):
+        with Snapshot(self.db_file) as snapshot:
+            assert snapshot.columns()[:len(AUDIT_COLUMN_KEYS)] == AUDIT_COLUMN_KEYS
+            assert snapshot.meta()['enrollments'] == '40'
+            columns, rows = snapshot.select(['enrollment_id', 'cn', 'expiration', 'key_type', 'sni_only'], limit=1)
+        assert rows == [(10000, self.account.enrollment(10000)['csr']['cn'],
+                         f'{self.account.not_valid_after(10000):%Y-%m-%d %H:%M:%S}', 'EC', 1)]
+
+    def test_filter_sort_and_group(self):
+        with Snapshot(self.db_file) as snapshot:
+            _, rows = snapshot.select(['enrollment_id', 'days_left'], where='days_left < 30', sort=['days_left:desc'])
+            assert rows and all(days_left < 30 for _, days_left in rows)
+            assert [days_left for _, days_left in rows] == sorted((days_left for _, days_left in rows), reverse=True)
+
+            # every 20th enrollment has no production deployment
+            _, rows = snapshot.select(['enrollment_id'], where='expiration IS NULL')
+            assert rows == [(10019,), (10039,)]
+
+            columns, rows = snapshot.select(group_by=['contract'])
+            assert columns == ['contract', 'enrollments', 'earliest_expiration']
+            assert sorted(row[:2] for row in rows) == [('K-0001', 20), ('K-0002', 20)]
+
+            _, rows = snapshot.query("SELECT COUNT(*) FROM certificates WHERE json_extract(enrollment, '$.ra') = 'lets-encrypt'")
+            assert rows[0][0] > 0
+
+    def test_snapshot_is_read_only_and_checked(self):
+        with Snapshot(self.db_file) as snapshot:
+            with self.assertRaises(SnapshotError):
+                snapshot.query('DELETE FROM enrollments')
+            with self.assertRaises(SnapshotError):
+                snapshot.select(['cn; DROP TABLE enrollments'])
+            with self.assertRaises(SnapshotError):
+                snapshot.select(sort=['bogus'])
+        with self.assertRaises(SnapshotError):
+            Snapshot(self.db_file + '.missing').open()
+
+    def test_new_snapshot_replaces_the_previous_one_when_complete(self):
+        with self.assertRaises(RuntimeError):
+            with SnapshotWriter(self.db_file) as writer:
+                writer.add(self.account.enrollment(10000), 'K-0001', 10000)
+                raise RuntimeError()
+        assert not os.path.exists(self.db_file + '.tmp')
+        with Snapshot(self.db_file) as snapshot:
+            assert snapshot.meta()['enrollments'] == '40'
+
+        self.write(self.account.enrollment_ids[:5])
+        with Snapshot(self.db_file) as snapshot:
+            assert snapshot.meta()['enrollments'] == '5'
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import requests
+from rich.console import Console
+from utils.status_dashboard import fetch_change_summary
+from utils.status_dashboard import NO_PENDING_CHANGES
+from utils.status_dashboard import pending_change_id
+from utils.status_dashboard import read_enrollment_ids
+from utils.status_dashboard import StatusDashboard
+from utils.status_dashboard import summarize
+from utils.status_dashboard import UNAVAILABLE
+
+
+def change_status(state, *inputs):
+    return {'statusInfo': {'state': state, 'status': state.upper(), 'description': f'{state} description'},
+            'allowedInput': [{'type': input_type, 'requiredToProceed': required} for input_type, required in inputs]}
+
+
+class TestStatusDashboard(unittest.TestCase):
+    def test_read_enrollment_ids(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'ids.txt')
+            with open(path, 'w') as f:
+                f.write('101\n102, 103  # renewal batch\n\n# 999\n101 104\n')
+            assert read_enrollment_ids(path) == [101, 102, 103, 104]
+
+    def test_summarize_change_status(self):
+        assert pending_change_id([{'location': '/cps/v2/enrollments/1/changes/55', 'changeType': 'renewal'}]) == 55
+        assert pending_change_id(['/cps/v2/enrollments/1/changes/56']) == 56
+        assert pending_change_id([]) is None
+
+        status_json = change_status('wait-input', ('notification', False), ('lets-encrypt-challenges', True))
+        row = summarize(1, 'www.example.com', 55, status_json)
+        assert row['allowedInput'] == 'lets-encrypt-challenges'
+        assert row['state'] == 'wait-input' and row['status'] == 'WAIT-INPUT'
+
+        error_json = {'statusInfo': {'state': 'error', 'status': 'ERROR', 'error': {'code': 'E1', 'description': 'bad CSR'}},
+                      'allowedInput': []}
+        assert summarize(2, 'b.example.com', 56, error_json)['description'] == 'E1: bad CSR'
+        assert summarize(3, 'c.example.com')['state'] == NO_PENDING_CHANGES
+
+    def test_rows_are_grouped_by_state_and_input(self):
+        dashboard = StatusDashboard(total=5)
+        dashboard.add(summarize(5, 'e', None))
+        dashboard.add(summarize(4, 'd', 44, change_status('wait-input', ('third-party-certificate', True))))
+        dashboard.add(summarize(3, 'c', 33, change_status('running')))
+        dashboard.add(summarize(2, 'b', 22, change_status('wait-input', ('lets-encrypt-challenges', True))))
+        dashboard.add(summarize(1, 'a', 11, change_status('wait-input', ('lets-encrypt-challenges', True))))
+
+        groups = [(state, input_type, [row['enrollmentId'] for row in rows]) for state, input_type, rows in dashboard.grouped()]
+        assert groups == [('wait-input', 'lets-encrypt-challenges', [1, 2]),
+                          ('wait-input', 'third-party-certificate', [4]),
+                          ('running', '', [3]),
+                          (NO_PENDING_CHANGES, '', [5])]
+
+        console = Console(record=True, width=200)
+        console.print(dashboard)
+        output = console.export_text()
+        assert '5 of 5 enrollments' in output
+        assert output.index('lets-encrypt-challenges') < output.index('third-party-certificate') < output.index('running')
+
+        text = dashboard.text()
+        assert text.index('lets-encrypt-challenges') < text.index('third-party-certificate') < text.index('running')
+        assert text.endswith('5 of 5 enrollments (no pending changes: 1, running: 1, wait-input: 3)')
+
+    def test_failed_requests_are_rows(self):
+        cps = MagicMock()
+        cps.get_change_status.side_effect = requests.ReadTimeout('read timed out')
+        row = fetch_change_summary(cps, {'enrollmentId': 1, 'cn': 'a', 'pendingChanges': ['/cps/v2/enrollments/1/changes/5']})
+        assert (row['state'], row['changeId'], row['description']) == (UNAVAILABLE, 5, 'ReadTimeout: read timed out')
+        cps.get_enrollment.assert_not_called()
+
+        cps.get_enrollment.return_value = MagicMock(status_code=200, json=lambda: {'csr': {'cn': 'b'}, 'pendingChanges': []})
+        assert fetch_change_summary(cps, {'enrollmentId': 2})['cn'] == 'b'
+
+
+if __name__ == '__main__':
+    unittest.main()
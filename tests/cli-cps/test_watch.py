@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import unittest
+
+from utils.watch import AdaptiveInterval
+from utils.watch import ChangeWatcher
+from utils.watch import WATCH_CANCELLED
+from utils.watch import WATCH_COMPLETE
+from utils.watch import WATCH_ERROR
+from utils.watch import WATCH_INPUT_REQUIRED
+from utils.watch import WATCH_TIMEOUT
+
+
+def change(state, input_type=None):
+    allowed = [{'type': input_type, 'requiredToProceed': True}] if input_type else []
+    return {'statusInfo': {'state': state, 'status': state, 'description': ''}, 'allowedInput': allowed}
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestChangeWatcher(unittest.TestCase):
+    def watcher(self, statuses, **kwargs):
+        self.time = FakeTime()
+        statuses = iter(statuses)
+        return ChangeWatcher(lambda: next(statuses), clock=self.time.clock, sleep=self.time.sleep, **kwargs)
+
+    def test_interval_backs_off_and_resets_on_state_change(self):
+        interval = AdaptiveInterval({'running': (10.0, 40.0), 'wait': (5.0, 10.0)}, factor=2)
+        assert [interval.next('running') for _ in range(4)] == [10.0, 20.0, 40.0, 40.0]
+        assert interval.next('wait-review-third-party-cert') == 5.0
+        assert interval.next('unknown') == 30.0
+        assert interval.next('running') == 10.0
+
+    def test_terminal_states_have_distinct_exit_codes(self):
+        for final, code in [('complete', WATCH_COMPLETE), ('error', WATCH_ERROR), ('cancelled', WATCH_CANCELLED)]:
+            watcher = self.watcher([change('running'), change('running'), change(final)])
+            assert watcher.watch()[0] == code
+            assert watcher.polls == 3
+        assert len(set([WATCH_COMPLETE, WATCH_INPUT_REQUIRED, WATCH_ERROR, WATCH_CANCELLED, WATCH_TIMEOUT])) == 5
+
+    def test_input_given_before_the_watch_is_waited_for(self):
+        # the acknowledged warning is still listed until CPS processes it
+        acknowledged = change('wait-input', 'post-verification-warnings-acknowledgement')
+        statuses = [acknowledged, acknowledged, change('running'), change('wait-input', 'change-management')]
+        watcher = self.watcher(statuses)
+        assert watcher.watch()[0] == WATCH_INPUT_REQUIRED
+        assert watcher.polls == 4
+
+        watcher = self.watcher([change('wait-input', 'third-party-certificate')] * 100, grace_period=60)
+        assert watcher.watch()[0] == WATCH_INPUT_REQUIRED
+        assert self.time.now >= 60
+
+    def test_timeout(self):
+        updates = []
+        watcher = self.watcher([change('running')] * 100, timeout=100)
+        code, _ = watcher.watch(lambda status, next_poll_in: updates.append(next_poll_in))
+        assert code == WATCH_TIMEOUT
+        assert self.time.now == 100
+        assert updates[-1] is None and updates[0] == 30.0
+
+
+if __name__ == '__main__':
+    unittest.main()